@@ -73,6 +73,33 @@ def _get_marker_param(request):
     return request.GET['marker']
 
 
+def get_list_params(request, max_limit=CONF.osapi_max_limit):
+    """Return paging and sorting parameters of a list request.
+
+    The result holds 'limit', 'offset', 'marker', 'sort_key' and
+    'sort_dir', to be passed down to the DB so that it does the paging.
+    'limit' and 'offset' are validated as in limited().
+    """
+    try:
+        offset = int(request.GET.get('offset', 0))
+    except ValueError:
+        msg = _('offset param must be an integer')
+        raise webob.exc.HTTPBadRequest(explanation=msg)
+    if offset < 0:
+        msg = _('offset param must be positive')
+        raise webob.exc.HTTPBadRequest(explanation=msg)
+
+    limit = max_limit
+    if 'limit' in request.GET:
+        limit = min(max_limit, _get_limit_param(request) or max_limit)
+
+    return {'limit': limit,
+            'offset': offset,
+            'marker': request.GET.get('marker'),
+            'sort_key': request.GET.get('sort_key'),
+            'sort_dir': request.GET.get('sort_dir')}
+
+
 def limited(items, request, max_limit=CONF.osapi_max_limit):
     """Return a slice of items according to requested offset and limit.
 
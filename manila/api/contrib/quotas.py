@@ -209,6 +209,7 @@ class QuotaSetsController(object):
                                 user_id=user_id)
             except exception.AdminRequired:
                 raise webob.exc.HTTPForbidden()
+        QUOTAS.invalidate_cache()
         return {'quota_set': self._get_quotas(context, id, user_id=user_id)}
 
     @wsgi.serializers(xml=QuotaTemplate)
@@ -105,6 +105,9 @@ class ShareSnapshotsController(wsgi.Controller):
 
         search_opts = {}
         search_opts.update(req.GET)
+        list_params = common.get_list_params(req)
+        for key in list_params:
+            search_opts.pop(key, None)
 
         # NOTE(rushiagr): v2 API allows name instead of display_name
         if 'name' in search_opts:
@@ -114,13 +117,15 @@ class ShareSnapshotsController(wsgi.Controller):
         common.remove_invalid_options(context, search_opts,
                                       self._get_snapshots_search_options())
 
-        snapshots = self.share_api.get_all_snapshots(context,
-                                                     search_opts=search_opts)
-        limited_list = common.limited(snapshots, req)
+        try:
+            snapshots = self.share_api.get_all_snapshots(
+                context, search_opts=search_opts, **list_params)
+        except exception.InvalidInput as e:
+            raise exc.HTTPBadRequest(explanation=e.msg)
         if is_detail:
-            snapshots = self._view_builder.detail_list(req, limited_list)
+            snapshots = self._view_builder.detail_list(req, snapshots)
         else:
-            snapshots = self._view_builder.summary_list(req, limited_list)
+            snapshots = self._view_builder.summary_list(req, snapshots)
         return snapshots
 
     def _get_snapshots_search_options(self):
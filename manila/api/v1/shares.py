@@ -109,6 +109,9 @@ class ShareController(wsgi.Controller):
 
         search_opts = {}
         search_opts.update(req.GET)
+        list_params = common.get_list_params(req)
+        for key in list_params:
+            search_opts.pop(key, None)
 
         # NOTE(rushiagr): v2 API allows name instead of display_name
         if 'name' in search_opts:
@@ -118,14 +121,19 @@ class ShareController(wsgi.Controller):
         common.remove_invalid_options(
             context, search_opts, self._get_share_search_options())
 
-        shares = self.share_api.get_all(context, search_opts=search_opts)
-
-        limited_list = common.limited(shares, req)
+        # Only the detail view reads metadata; don't load it otherwise.
+        columns_to_join = ['share_metadata'] if is_detail else []
+        try:
+            shares = self.share_api.get_all(context, search_opts=search_opts,
+                                            columns_to_join=columns_to_join,
+                                            **list_params)
+        except exception.InvalidInput as e:
+            raise exc.HTTPBadRequest(explanation=e.msg)
 
         if is_detail:
-            shares = self._view_builder.detail_list(req, limited_list)
+            shares = self._view_builder.detail_list(req, shares)
         else:
-            shares = self._view_builder.summary_list(req, limited_list)
+            shares = self._view_builder.summary_list(req, shares)
         return shares
 
     def _get_share_search_options(self):
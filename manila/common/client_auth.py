@@ -0,0 +1,105 @@
+# Copyright 2014 Mirantis Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Process-wide cache of authenticated admin clients of other services."""
+
+import threading
+
+from oslo.config import cfg
+
+from manila.openstack.common import log as logging
+from manila.openstack.common import timeutils
+
+client_auth_opts = [
+    cfg.IntOpt('admin_client_token_expiry_window',
+               default=300,
+               help='Seconds before expiry of the keystone token of a '
+                    'cached admin client at which it is re-authenticated.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(client_auth_opts)
+
+LOG = logging.getLogger(__name__)
+
+
+class AdminClientCache(object):
+    """Keeps one authenticated admin client per credentials and endpoint.
+
+    Clients are built once and shared by all callers, so keystone is only
+    asked for a token when the client has none or its token is about to
+    expire. A client whose token was revoked earlier re-authenticates by
+    itself on the 401 response.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.auth_calls = 0
+        self.client_constructions = 0
+
+    @staticmethod
+    def _http_client(client):
+        # neutronclient keeps its HTTP client in 'httpclient', cinder and
+        # nova clients in 'client'.
+        return getattr(client, 'httpclient', None) or client.client
+
+    @staticmethod
+    def _token_expires(http):
+        try:
+            expires = http.service_catalog.catalog['access']['token']
+            return timeutils.normalize_time(
+                timeutils.parse_isotime(expires['expires']))
+        except Exception:
+            return None
+
+    def _needs_auth(self, client):
+        http = self._http_client(client)
+        if getattr(http, 'auth_strategy', 'keystone') != 'keystone':
+            return False
+        if not http.auth_token:
+            return True
+        expires = self._token_expires(http)
+        return (expires is not None and
+                timeutils.is_soon(expires,
+                                  CONF.admin_client_token_expiry_window))
+
+    def get(self, key, build, authenticate=True):
+        """Returns authenticated client for key, building it if needed.
+
+        :param key: tuple of service name, credentials and endpoint
+        :param build: callable returning a new unauthenticated client
+        :param authenticate: if False, the client is shared as is and left
+                             to fetch its token on first request
+        """
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = build()
+                self.client_constructions += 1
+                self._clients[key] = client
+            if authenticate and self._needs_auth(client):
+                LOG.debug(_('Authenticating admin client for %s'), key[0])
+                self._http_client(client).authenticate()
+                self.auth_calls += 1
+            return client
+
+    def clear(self):
+        """Drops all cached clients."""
+        with self._lock:
+            self._clients.clear()
+
+
+admin_clients = AdminClientCache()
@@ -161,6 +161,14 @@ global_opts = [
     cfg.IntOpt('sql_retry_interval',
                default=10,
                help='interval between retries of opening a sql connection'),
+    cfg.IntOpt('db_deadlock_max_retries',
+               default=5,
+               help='maximum retries of a quota transaction that hit a '
+                    'database deadlock'),
+    cfg.FloatOpt('db_deadlock_retry_interval',
+                 default=0.5,
+                 help='base interval in seconds between deadlock retries, '
+                      'multiplied by the attempt number'),
     cfg.StrOpt('scheduler_manager',
                default='manila.scheduler.manager.SchedulerManager',
                help='full class name for the Manager for scheduler'),
@@ -215,6 +223,11 @@ global_opts = [
                 help='A list of share backend names to use. These backend '
                      'names should be backed by a unique [CONFIG] group '
                      'with its options'),
+    cfg.BoolOpt('share_backends_in_one_process',
+                default=False,
+                help='Run all enabled share backends in one manila-share '
+                     'process instead of forking one per backend, so that '
+                     'their states are reported in a single heartbeat'),
     cfg.BoolOpt('no_snapshot_gb_quota',
                 default=False,
                 help='Whether snapshots count against GigaByte quota'), ]
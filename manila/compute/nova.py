@@ -26,6 +26,7 @@ from novaclient.v1_1.contrib import assisted_volume_snapshots
 from novaclient.v1_1 import servers as nova_servers
 from oslo.config import cfg
 
+from manila.common import client_auth
 from manila.db import base
 from manila import exception
 from manila.openstack.common import log as logging
@@ -70,12 +71,10 @@ LOG = logging.getLogger(__name__)
 
 def novaclient(context):
     if context.is_admin and context.project_id is None:
-        c = nova_client.Client(CONF.nova_admin_username,
-                               CONF.nova_admin_password,
-                               CONF.nova_admin_tenant_name,
-                               CONF.nova_admin_auth_url)
-        c.authenticate()
-        return c
+        key = ('nova', CONF.nova_admin_username, CONF.nova_admin_password,
+               CONF.nova_admin_tenant_name, CONF.nova_admin_auth_url)
+        return client_auth.admin_clients.get(
+            key, lambda: nova_client.Client(*key[1:]))
     compat_catalog = {
         'access': {'serviceCatalog': context.service_catalog or []}
     }
@@ -122,6 +122,15 @@ def service_create(context, values):
     return IMPL.service_create(context, values)
 
 
+def service_heartbeat(context, service_ids):
+    """Bump report count and update time of services in one statement.
+
+    :returns: ids of the given services which do not exist.
+
+    """
+    return IMPL.service_heartbeat(context, service_ids)
+
+
 def service_update(context, service_id, values):
     """Set the given properties on an service and update it.
 
@@ -326,9 +335,18 @@ def share_get(context, share_id):
     return IMPL.share_get(context, share_id)
 
 
-def share_get_all(context):
-    """Get all shares."""
-    return IMPL.share_get_all(context)
+def share_get_all(context, filters=None, sort_key=None, sort_dir=None,
+                  limit=None, offset=None, marker=None, columns_to_join=None):
+    """Get all shares, filtered, sorted and paginated in the DB.
+
+    :param filters: dict of column name to value (or list of values)
+    :param marker: id of the last share of the previous page
+    :param columns_to_join: relationships to load along with the shares,
+                            share_metadata if None
+    """
+    return IMPL.share_get_all(context, filters=filters, sort_key=sort_key,
+                              sort_dir=sort_dir, limit=limit, offset=offset,
+                              marker=marker, columns_to_join=columns_to_join)
 
 
 def share_get_all_by_host(context, host):
@@ -336,9 +354,19 @@ def share_get_all_by_host(context, host):
     return IMPL.share_get_all_by_host(context, host)
 
 
-def share_get_all_by_project(context, project_id):
-    """Returns all shares with given project ID."""
-    return IMPL.share_get_all_by_project(context, project_id)
+def share_get_all_by_project(context, project_id, filters=None,
+                             sort_key=None, sort_dir=None, limit=None,
+                             offset=None, marker=None, columns_to_join=None):
+    """Returns all shares with given project ID.
+
+    Takes the same filtering, pagination and loading arguments as
+    share_get_all().
+    """
+    return IMPL.share_get_all_by_project(context, project_id,
+                                         filters=filters, sort_key=sort_key,
+                                         sort_dir=sort_dir, limit=limit,
+                                         offset=offset, marker=marker,
+                                         columns_to_join=columns_to_join)
 
 
 def share_delete(context, share_id):
@@ -364,6 +392,11 @@ def share_access_get_all_for_share(context, share_id):
     return IMPL.share_access_get_all_for_share(context, share_id)
 
 
+def share_access_get_all_by_host(context, host):
+    """Returns access rules of all shares with given host."""
+    return IMPL.share_access_get_all_by_host(context, host)
+
+
 def share_access_get_all_by_type_and_access(context, share_id, access_type,
                                             access):
     """Returns share access by given type and access"""
@@ -404,14 +437,29 @@ def share_snapshot_get(context, snapshot_id):
     return IMPL.share_snapshot_get(context, snapshot_id)
 
 
-def share_snapshot_get_all(context):
-    """Get all snapshots."""
-    return IMPL.share_snapshot_get_all(context)
+def share_snapshot_get_all(context, filters=None, sort_key=None,
+                           sort_dir=None, limit=None, offset=None,
+                           marker=None):
+    """Get all snapshots, filtered, sorted and paginated in the DB.
+
+    Takes the same filtering and pagination arguments as share_get_all().
+    """
+    return IMPL.share_snapshot_get_all(context, filters=filters,
+                                       sort_key=sort_key, sort_dir=sort_dir,
+                                       limit=limit, offset=offset,
+                                       marker=marker)
 
 
-def share_snapshot_get_all_by_project(context, project_id):
+def share_snapshot_get_all_by_project(context, project_id, filters=None,
+                                      sort_key=None, sort_dir=None,
+                                      limit=None, offset=None, marker=None):
     """Get all snapshots belonging to a project."""
-    return IMPL.share_snapshot_get_all_by_project(context, project_id)
+    return IMPL.share_snapshot_get_all_by_project(context, project_id,
+                                                  filters=filters,
+                                                  sort_key=sort_key,
+                                                  sort_dir=sort_dir,
+                                                  limit=limit, offset=offset,
+                                                  marker=marker)
 
 
 def share_snapshot_get_all_for_share(context, share_id):
@@ -27,8 +27,10 @@ import warnings
 
 from oslo.config import cfg
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import OperationalError
 from sqlalchemy import or_
 from sqlalchemy.orm import joinedload
+from sqlalchemy.sql.expression import false
 from sqlalchemy.sql.expression import literal_column
 from sqlalchemy.sql import func
 
@@ -175,6 +177,50 @@ def model_query(context, model, *args, **kwargs):
     return query
 
 
+def _paginate_list_query(context, query, model, filters=None,
+                         sort_key=None, sort_dir=None, limit=None,
+                         offset=None, marker=None):
+    """Push filtering, sorting and pagination of a list query into SQL.
+
+    :param filters: dict of column name to value; list values are
+                    matched with IN.  Unknown columns match nothing.
+    :param sort_key: column to sort by, 'created_at' by default; 'id'
+                     is always added as a tie breaker.
+    :param sort_dir: 'asc' or 'desc' (the default)
+    :param marker: id of the last item of the previous page
+    """
+    if filters:
+        columns = model.__table__.columns.keys()
+        if [key for key in filters if key not in columns]:
+            return query.filter(false())
+        query = exact_filter(query, model, dict(filters), filters.keys())
+
+    sort_keys = [sort_key or 'created_at']
+    if 'id' not in sort_keys:
+        sort_keys.append('id')
+
+    sort_dir = sort_dir or 'desc'
+    if sort_dir not in ('asc', 'desc'):
+        raise exception.InvalidInput(
+            reason=_("sort_dir must be 'asc' or 'desc'"))
+
+    marker_ref = None
+    if marker is not None:
+        marker_ref = model_query(context, model, session=query.session,
+                                 project_only=True).\
+            filter_by(id=marker).first()
+        if marker_ref is None:
+            raise exception.InvalidInput(
+                reason=_('marker [%s] not found') % marker)
+
+    query = sqlalchemyutils.paginate_query(query, model, limit, sort_keys,
+                                           marker=marker_ref,
+                                           sort_dir=sort_dir)
+    if offset:
+        query = query.offset(offset)
+    return query
+
+
 def exact_filter(query, model, filters, legal_keys):
     """Applies exact match filtering to a query.
 
@@ -383,6 +429,27 @@ def service_create(context, values):
     return service_ref
 
 
+@require_admin_context
+def service_heartbeat(context, service_ids):
+    session = get_session()
+    with session.begin():
+        updated = model_query(
+            context, models.Service, session=session, read_deleted="no").\
+            filter(models.Service.id.in_(service_ids)).\
+            update({'report_count': models.Service.report_count + 1,
+                    'updated_at': timeutils.utcnow()},
+                   synchronize_session=False)
+        if updated == len(set(service_ids)):
+            return []
+        services = model_query(
+            context, models.Service, session=session, read_deleted="no").\
+            filter(models.Service.id.in_(service_ids)).\
+            all()
+        existing = set(service.id for service in services)
+        return [service_id for service_id in service_ids
+                if service_id not in existing]
+
+
 @require_admin_context
 def service_update(context, service_id, values):
     session = get_session()
@@ -644,15 +711,27 @@ def quota_usage_update(context, project_id, user_id, resource, **kwargs):
         if key in kwargs:
             updates[key] = kwargs[key]
 
-    result = model_query(context, models.QuotaUsage, read_deleted="no").\
-                     filter_by(project_id=project_id).\
-                     filter_by(resource=resource).\
-                     filter(or_(models.QuotaUsage.user_id == user_id,
-                                models.QuotaUsage.user_id == None)).\
-                     update(updates)
-
-    if not result:
-        raise exception.QuotaUsageNotFound(project_id=project_id)
+    session = get_session()
+    with session.begin():
+        usages = model_query(context, models.QuotaUsage, session=session,
+                             read_deleted="no").\
+                         filter_by(project_id=project_id).\
+                         filter_by(resource=resource).\
+                         filter(or_(models.QuotaUsage.user_id == user_id,
+                                    models.QuotaUsage.user_id == None)).\
+                         with_lockmode('update').all()
+
+        if not usages:
+            raise exception.QuotaUsageNotFound(project_id=project_id)
+
+        total = _get_project_quota_usages(context, session, project_id,
+                                          [resource])[resource]
+        for usage in usages:
+            for key in ('in_use', 'reserved'):
+                if key in updates:
+                    setattr(total, key, getattr(total, key) +
+                            updates[key] - getattr(usage, key))
+            usage.update(updates)
 
 
 ###################
@@ -697,43 +776,121 @@ def _reservation_create(context, uuid, usage, project_id, user_id, resource,
 # NOTE(johannes): The quota code uses SQL locking to ensure races don't
 # cause under or over counting of resources. To avoid deadlocks, this
 # code always acquires the lock on quota_usages before acquiring the lock
-# on reservations.
+# on project_quota_usages, and both before acquiring the lock on
+# reservations.
 
-def _get_user_quota_usages(context, session, project_id, user_id):
+def _get_user_quota_usages(context, session, project_id, user_id,
+                           resources=None):
     # Broken out for testability
-    rows = model_query(context, models.QuotaUsage,
-                       read_deleted="no",
-                       session=session).\
+    query = model_query(context, models.QuotaUsage,
+                        read_deleted="no",
+                        session=session).\
                    filter_by(project_id=project_id).\
                    filter(or_(models.QuotaUsage.user_id == user_id,
-                              models.QuotaUsage.user_id == None)).\
-                   with_lockmode('update').\
-                   all()
+                              models.QuotaUsage.user_id == None))
+    if resources is not None:
+        # Only lock the rows that are about to change.
+        query = query.filter(models.QuotaUsage.resource.in_(resources))
+    rows = query.with_lockmode('update').all()
     return dict((row.resource, row) for row in rows)
 
 
-def _get_project_quota_usages(context, session, project_id):
-    rows = model_query(context, models.QuotaUsage,
-                       read_deleted="no",
-                       session=session).\
+def _get_project_quota_usages(context, session, project_id, resources):
+    """Lock and return the project totals of the given resources.
+
+    Totals which do not exist yet are created from the per-user usages of
+    the project.
+    """
+    resources = set(resources)
+    rows = model_query(context, models.ProjectQuotaUsage,
+                       read_deleted="no", session=session).\
                    filter_by(project_id=project_id).\
-                   with_lockmode('update').\
-                   all()
-    result = dict()
-    # Get the total count of in_use,reserved
-    for row in rows:
-        if row.resource in result:
-            result[row.resource]['in_use'] += row.in_use
-            result[row.resource]['reserved'] += row.reserved
-            result[row.resource]['total'] += (row.in_use + row.reserved)
-        else:
-            result[row.resource] = dict(in_use=row.in_use,
-                                        reserved=row.reserved,
-                                        total=row.in_use + row.reserved)
+                   filter(models.ProjectQuotaUsage.resource.in_(resources)).\
+                   with_lockmode('update').all()
+    result = dict((row.resource, row) for row in rows)
+
+    missing = resources - set(result)
+    if missing:
+        sums = session.query(models.QuotaUsage.resource,
+                             func.sum(models.QuotaUsage.in_use),
+                             func.sum(models.QuotaUsage.reserved)).\
+                   filter(models.QuotaUsage.deleted == 0).\
+                   filter(models.QuotaUsage.project_id == project_id).\
+                   filter(models.QuotaUsage.resource.in_(missing)).\
+                   group_by(models.QuotaUsage.resource).all()
+        sums = dict((resource, (in_use, reserved))
+                    for resource, in_use, reserved in sums)
+        for resource in missing:
+            in_use, reserved = sums.get(resource, (0, 0))
+            total_ref = models.ProjectQuotaUsage()
+            total_ref.project_id = project_id
+            total_ref.resource = resource
+            total_ref.in_use = in_use or 0
+            total_ref.reserved = reserved or 0
+            session.add(total_ref)
+            result[resource] = total_ref
+        try:
+            session.flush()
+        except exception.DBError as e:
+            if not isinstance(e.inner_exception, IntegrityError):
+                raise
+            # A concurrent transaction created the same totals first.
+            raise _QuotaUsageRace()
     return result
 
 
+class _QuotaUsageRace(Exception):
+    """A concurrent transaction created the same quota usage rows."""
+
+
+# MySQL ER_LOCK_WAIT_TIMEOUT and ER_LOCK_DEADLOCK.
+_MYSQL_DEADLOCK_CODES = (1205, 1213)
+# PostgreSQL deadlock_detected and lock_not_available.
+_POSTGRESQL_DEADLOCK_CODES = ('40P01', '55P03')
+
+
+def _is_deadlock(exc):
+    """Return True if a DB error was caused by a deadlock or lock timeout.
+
+    Only the error codes of MySQL and PostgreSQL are recognised. SQLite
+    takes a database wide lock instead of row locks, so a 'database is
+    locked' error is not a lost race and retrying it would only sleep.
+    """
+    if isinstance(exc, exception.DBError):
+        exc = exc.inner_exception
+    if not isinstance(exc, OperationalError):
+        return False
+    orig = exc.orig
+    if getattr(orig, 'pgcode', None) is not None:
+        return orig.pgcode in _POSTGRESQL_DEADLOCK_CODES
+    args = getattr(orig, 'args', ())
+    return bool(args) and args[0] in _MYSQL_DEADLOCK_CODES
+
+
+def _retry_on_deadlock(f):
+    """Retry a transactional DB call that lost a row lock race."""
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return f(*args, **kwargs)
+            except (OperationalError, exception.DBError,
+                    _QuotaUsageRace) as e:
+                attempt += 1
+                if (not (isinstance(e, _QuotaUsageRace) or
+                         _is_deadlock(e)) or
+                        attempt > CONF.db_deadlock_max_retries):
+                    raise
+                LOG.warn(_("Lost a row lock race in %(func)s, retrying "
+                           "(attempt %(attempt)d)."),
+                         {'func': f.__name__, 'attempt': attempt})
+                time.sleep(CONF.db_deadlock_retry_interval * attempt)
+    return wrapper
+
+
 @require_context
+@_retry_on_deadlock
 def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
                   expire, until_refresh, max_age, project_id=None,
                   user_id=None):
@@ -746,11 +903,14 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
         if user_id is None:
             user_id = context.user_id
 
-        # Get the current usages
+        # Get the current usages, locking only the resources being
+        # reserved so that unrelated reservations do not serialize.
         user_usages = _get_user_quota_usages(context, session,
-                                             project_id, user_id)
+                                             project_id, user_id,
+                                             resources=deltas.keys())
         project_usages = _get_project_quota_usages(context, session,
-                                                   project_id)
+                                                   project_id,
+                                                   deltas.keys())
 
         # Handle usage refresh
         work = set(deltas.keys())
@@ -831,7 +991,12 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
                              'tracked_use': user_usages[res].in_use,
                              'in_use': in_use})
 
-                    # Update the usage
+                    # Update the usage and the project total with it
+                    if res not in project_usages:
+                        project_usages.update(_get_project_quota_usages(
+                            context, session, project_id, [res]))
+                    project_usages[res].in_use += (in_use -
+                                                   user_usages[res].in_use)
                     user_usages[res].in_use = in_use
                     user_usages[res].until_refresh = until_refresh or None
 
@@ -857,13 +1022,10 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
         #            If a project has gone over quota, we want them to
         #            be able to reduce their usage without any
         #            problems.
-        for key, value in user_usages.items():
-            if key not in project_usages:
-                project_usages[key] = value
         overs = [res for res, delta in deltas.items()
                  if user_quotas[res] >= 0 and delta >= 0 and
                  (project_quotas[res] < delta +
-                  project_usages[res]['total'] or
+                  project_usages[res].total or
                   user_quotas[res] < delta +
                   user_usages[res].total)]
 
@@ -901,10 +1063,13 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
                 #            reserved value if the delta is positive.
                 if delta > 0:
                     user_usages[res].reserved += delta
+                    project_usages[res].reserved += delta
 
-        # Apply updates to the usages table
+        # Apply updates to the usages tables
         for usage_ref in user_usages.values():
             session.add(usage_ref)
+        for total_ref in project_usages.values():
+            session.add(total_ref)
 
     if unders:
         LOG.warning(_("Change will make usage less than 0 for the following "
@@ -934,17 +1099,21 @@ def _quota_reservations_query(session, context, reservations):
 
 
 @require_context
+@_retry_on_deadlock
 def reservation_commit(context, reservations, project_id=None, user_id=None):
     session = get_session()
     with session.begin():
         usages = _get_user_quota_usages(context, session, project_id, user_id)
+        totals = _get_project_quota_usages(context, session, project_id,
+                                           usages.keys())
         reservation_query = _quota_reservations_query(session, context,
                                                       reservations)
         for reservation in reservation_query.all():
-            usage = usages[reservation.resource]
-            if reservation.delta >= 0:
-                usage.reserved -= reservation.delta
-            usage.in_use += reservation.delta
+            for usage in (usages[reservation.resource],
+                          totals[reservation.resource]):
+                if reservation.delta >= 0:
+                    usage.reserved -= reservation.delta
+                usage.in_use += reservation.delta
         reservation_query.update({'deleted': True,
                                   'deleted_at': timeutils.utcnow(),
                                   'updated_at': literal_column('updated_at')},
@@ -952,16 +1121,19 @@ def reservation_commit(context, reservations, project_id=None, user_id=None):
 
 
 @require_context
+@_retry_on_deadlock
 def reservation_rollback(context, reservations, project_id=None, user_id=None):
     session = get_session()
     with session.begin():
         usages = _get_user_quota_usages(context, session, project_id, user_id)
+        totals = _get_project_quota_usages(context, session, project_id,
+                                           usages.keys())
         reservation_query = _quota_reservations_query(session, context,
                                                       reservations)
         for reservation in reservation_query.all():
-            usage = usages[reservation.resource]
             if reservation.delta >= 0:
-                usage.reserved -= reservation.delta
+                usages[reservation.resource].reserved -= reservation.delta
+                totals[reservation.resource].reserved -= reservation.delta
         reservation_query.update({'deleted': True,
                                   'deleted_at': timeutils.utcnow(),
                                   'updated_at': literal_column('updated_at')},
@@ -981,6 +1153,19 @@ def quota_destroy_all_by_project_and_user(context, project_id, user_id):
                         'updated_at': literal_column('updated_at')},
                         synchronize_session=False)
 
+        # Take the usages of the user out of the project totals
+        usages = model_query(context, models.QuotaUsage,
+                             session=session, read_deleted="no").\
+                filter_by(project_id=project_id).\
+                filter_by(user_id=user_id).\
+                with_lockmode('update').all()
+        totals = _get_project_quota_usages(context, session, project_id,
+                                           [usage.resource
+                                            for usage in usages])
+        for usage in usages:
+            totals[usage.resource].in_use -= usage.in_use
+            totals[usage.resource].reserved -= usage.reserved
+
         model_query(context, models.QuotaUsage,
                     session=session, read_deleted="no").\
                 filter_by(project_id=project_id).\
@@ -1028,6 +1213,12 @@ def quota_destroy_all_by_project(context, project_id):
                         'updated_at': literal_column('updated_at')},
                         synchronize_session=False)
 
+        # The totals are derived from the usages, so they are not kept.
+        model_query(context, models.ProjectQuotaUsage,
+                    session=session, read_deleted="no").\
+                filter_by(project_id=project_id).\
+                delete(synchronize_session=False)
+
         model_query(context, models.Reservation,
                     session=session, read_deleted="no").\
                 filter_by(project_id=project_id).\
@@ -1046,10 +1237,17 @@ def reservation_expire(context):
                                         session=session, read_deleted="no").\
                             filter(models.Reservation.expire < current_time)
 
+        totals = {}
         for reservation in reservation_query.join(models.QuotaUsage).all():
             if reservation.delta >= 0:
                 reservation.usage.reserved -= reservation.delta
                 session.add(reservation.usage)
+                key = (reservation.project_id, reservation.resource)
+                if key not in totals:
+                    totals[key] = _get_project_quota_usages(
+                        context, session, reservation.project_id,
+                        [reservation.resource])[reservation.resource]
+                totals[key].reserved -= reservation.delta
 
         reservation_query.update({'deleted': True,
                         'deleted_at': timeutils.utcnow(),
@@ -1060,11 +1258,20 @@ def reservation_expire(context):
 ################
 
 
-def _share_get_query(context, session=None):
+def _share_get_query(context, session=None, columns_to_join=None):
+    """Return a share query eager loading the given relationships.
+
+    :param columns_to_join: relationships loaded with the shares rather
+                            than lazily per share; share_metadata if None.
+    """
     if session is None:
         session = get_session()
-    return model_query(context, models.Share, session=session).\
-            options(joinedload('share_metadata'))
+    if columns_to_join is None:
+        columns_to_join = ['share_metadata']
+    query = model_query(context, models.Share, session=session)
+    for column in columns_to_join:
+        query = query.options(joinedload(column))
+    return query
 
 
 def _metadata_refs(metadata_dict, meta_class):
@@ -1128,8 +1335,13 @@ def share_get(context, share_id, session=None):
 
 
 @require_admin_context
-def share_get_all(context):
-    return _share_get_query(context).all()
+def share_get_all(context, filters=None, sort_key=None, sort_dir=None,
+                  limit=None, offset=None, marker=None, columns_to_join=None):
+    query = _share_get_query(context, columns_to_join=columns_to_join)
+    return _paginate_list_query(context, query, models.Share,
+                                filters=filters, sort_key=sort_key,
+                                sort_dir=sort_dir, limit=limit,
+                                offset=offset, marker=marker).all()
 
 
 @require_admin_context
@@ -1139,9 +1351,16 @@ def share_get_all_by_host(context, host):
 
 
 @require_context
-def share_get_all_by_project(context, project_id):
+def share_get_all_by_project(context, project_id, filters=None,
+                             sort_key=None, sort_dir=None, limit=None,
+                             offset=None, marker=None, columns_to_join=None):
     """Returns list of shares with given project ID."""
-    return _share_get_query(context).filter_by(project_id=project_id).all()
+    query = _share_get_query(context, columns_to_join=columns_to_join).\
+        filter_by(project_id=project_id)
+    return _paginate_list_query(context, query, models.Share,
+                                filters=filters, sort_key=sort_key,
+                                sort_dir=sort_dir, limit=limit,
+                                offset=offset, marker=marker).all()
 
 
 @require_context
@@ -1205,6 +1424,19 @@ def share_access_get_all_for_share(context, share_id):
                                    {'share_id': share_id}).all()
 
 
+@require_admin_context
+def share_access_get_all_by_host(context, host):
+    """Returns access rules of all shares living on the given host."""
+    session = get_session()
+    default_deleted_value = models.Share.__mapper__.c.deleted.default.arg
+    query = model_query(context, models.ShareAccessMapping, session=session)
+    return query.join(models.Share,
+                      models.Share.id == models.ShareAccessMapping.share_id).\
+            filter(models.Share.host == host).\
+            filter(models.Share.deleted == default_deleted_value).\
+            all()
+
+
 @require_context
 def share_access_get_all_by_type_and_access(context, share_id, access_type,
                                             access):
@@ -1297,16 +1529,27 @@ def share_snapshot_get(context, snapshot_id, session=None):
 
 
 @require_admin_context
-def share_snapshot_get_all(context):
-    return model_query(context, models.ShareSnapshot).all()
+def share_snapshot_get_all(context, filters=None, sort_key=None,
+                           sort_dir=None, limit=None, offset=None,
+                           marker=None):
+    query = model_query(context, models.ShareSnapshot)
+    return _paginate_list_query(context, query, models.ShareSnapshot,
+                                filters=filters, sort_key=sort_key,
+                                sort_dir=sort_dir, limit=limit,
+                                offset=offset, marker=marker).all()
 
 
 @require_context
-def share_snapshot_get_all_by_project(context, project_id):
+def share_snapshot_get_all_by_project(context, project_id, filters=None,
+                                      sort_key=None, sort_dir=None,
+                                      limit=None, offset=None, marker=None):
     authorize_project_context(context, project_id)
-    return model_query(context, models.ShareSnapshot).\
-        filter_by(project_id=project_id).\
-        all()
+    query = model_query(context, models.ShareSnapshot).\
+        filter_by(project_id=project_id)
+    return _paginate_list_query(context, query, models.ShareSnapshot,
+                                filters=filters, sort_key=sort_key,
+                                sort_dir=sort_dir, limit=limit,
+                                offset=offset, marker=marker).all()
 
 
 @require_context
@@ -0,0 +1,64 @@
+# Copyright 2014 Mirantis Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table
+from sqlalchemy import UniqueConstraint
+from sqlalchemy import func, select
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    quota_usages = Table('quota_usages', meta, autoload=True)
+    project_quota_usages = Table(
+        'project_quota_usages', meta,
+        Column('created_at', DateTime(timezone=False)),
+        Column('updated_at', DateTime(timezone=False)),
+        Column('deleted_at', DateTime(timezone=False)),
+        Column('deleted', Integer, default=0),
+        Column('id', Integer(), primary_key=True),
+        Column('project_id', String(length=255), nullable=False),
+        Column('resource', String(length=255), nullable=False),
+        Column('in_use', Integer(), nullable=False),
+        Column('reserved', Integer(), nullable=False),
+        UniqueConstraint('project_id', 'resource',
+                         name='uniq_project_quota_usages0project_id0resource'),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8',
+        )
+    project_quota_usages.create()
+
+    # Start from the sums of the per-user usages.
+    totals = select([quota_usages.c.project_id,
+                     quota_usages.c.resource,
+                     func.sum(quota_usages.c.in_use),
+                     func.sum(quota_usages.c.reserved)]).\
+        where(quota_usages.c.deleted == 0).\
+        group_by(quota_usages.c.project_id, quota_usages.c.resource)
+    rows = [dict(project_id=project_id, resource=resource,
+                 in_use=in_use or 0, reserved=reserved or 0, deleted=0)
+            for project_id, resource, in_use, reserved
+            in migrate_engine.execute(totals)]
+    if rows:
+        migrate_engine.execute(project_quota_usages.insert(), rows)
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    project_quota_usages = Table('project_quota_usages', meta, autoload=True)
+    project_quota_usages.drop()
@@ -192,6 +192,29 @@ class QuotaUsage(BASE, ManilaBase):
     until_refresh = Column(Integer, nullable=True)
 
 
+class ProjectQuotaUsage(BASE, ManilaBase):
+    """Represents the usage of a resource summed over a whole project.
+
+    Kept equal to the sum of the quota_usages rows of the project, so that
+    quota_reserve() checks the project quota against a single row.
+    """
+
+    __tablename__ = 'project_quota_usages'
+    __table_args__ = (schema.UniqueConstraint('project_id', 'resource'),
+                      ManilaBase.__table_args__)
+    id = Column(Integer, primary_key=True)
+
+    project_id = Column(String(255), nullable=False)
+    resource = Column(String(255), nullable=False)
+
+    in_use = Column(Integer, nullable=False, default=0)
+    reserved = Column(Integer, nullable=False, default=0)
+
+    @property
+    def total(self):
+        return self.in_use + self.reserved
+
+
 class Reservation(BASE, ManilaBase):
     """Represents a resource reservation for quotas."""
 
@@ -259,6 +282,7 @@ class Share(BASE, ManilaBase):
     export_location = Column(String(255))
     share_network_id = Column(String(36), ForeignKey('share_networks.id'),
                               nullable=True)
+    progress = Column(String(255))
 
 
 class ShareMetadata(BASE, ManilaBase):
@@ -532,6 +532,11 @@ class VolumeNotFound(NotFound):
     message = _("Volume %(volume_id)s could not be found.")
 
 
+class VolumeWaitTimeout(ManilaException):
+    message = _("Volume %(volume_id)s did not reach expected state in "
+                "%(timeout)ss. Giving up.")
+
+
 class VolumeSnapshotNotFound(NotFound):
     message = _("Snapshot %(snapshot_id)s could not be found.")
 
@@ -0,0 +1,98 @@
+# Copyright 2014 Mirantis Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Drivers keeping heartbeats of services and telling which are up."""
+
+import errno
+import os
+import time
+
+from oslo.config import cfg
+
+from manila import db
+from manila.openstack.common import importutils
+from manila import utils
+
+liveness_opts = [
+    cfg.StrOpt('service_liveness_driver',
+               default='manila.liveness.DbLivenessDriver',
+               help='Driver keeping heartbeats of services and telling '
+                    'which services are up.'),
+    cfg.StrOpt('service_liveness_dir',
+               default='$state_path/heartbeats',
+               help='Directory FileLivenessDriver keeps a heartbeat file '
+                    'per service in. Services and schedulers have to '
+                    'share it.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(liveness_opts)
+
+_driver = None
+
+
+def get_driver():
+    """Returns the configured liveness driver."""
+    global _driver
+    if _driver is None:
+        _driver = importutils.import_object(CONF.service_liveness_driver)
+    return _driver
+
+
+class DbLivenessDriver(object):
+    """Keeps heartbeats in the update time of service records."""
+
+    def heartbeat(self, context, service_ids):
+        """Records a heartbeat of all given services at once.
+
+        :returns: ids of the services which have no record anymore.
+        """
+        return db.service_heartbeat(context, service_ids)
+
+    def is_up(self, service):
+        return utils.service_is_up(service)
+
+    def filter_up(self, services):
+        """Returns those of the given services which are up."""
+        return [service for service in services if self.is_up(service)]
+
+
+class FileLivenessDriver(DbLivenessDriver):
+    """Keeps heartbeats in modification times of files.
+
+    A heartbeat touches one file per service and does not go to the
+    database, so this suits deployments where services and schedulers
+    run on one host. Service records are not checked for existence.
+    """
+
+    def _path(self, service_id):
+        return os.path.join(CONF.service_liveness_dir, str(service_id))
+
+    def heartbeat(self, context, service_ids):
+        utils.ensure_tree(CONF.service_liveness_dir)
+        for service_id in service_ids:
+            path = self._path(service_id)
+            with open(path, 'a'):
+                os.utime(path, None)
+        return []
+
+    def is_up(self, service):
+        try:
+            last_heartbeat = os.stat(self._path(service['id'])).st_mtime
+        except OSError as exc:
+            if exc.errno != errno.ENOENT:
+                raise
+            return False
+        return abs(time.time() - last_heartbeat) <= CONF.service_down_time
@@ -53,6 +53,10 @@ This module provides Manager, a base class for managers.
 
 """
 
+import random
+import time
+
+import eventlet
 from oslo.config import cfg
 
 from manila.db import base
@@ -63,6 +67,7 @@ from manila import version
 
 
 CONF = cfg.CONF
+CONF.import_opt('periodic_task_timeout', 'manila.service')
 
 
 LOG = logging.getLogger(__name__)
@@ -78,10 +83,20 @@ def periodic_task(*args, **kwargs):
 
         2. With arguments, @periodic_task(ticks_between_runs=N), this will be
            run on every N ticks of the periodic scheduler.
+
+    Further arguments:
+
+        spacing: run at most every spacing seconds, checked on each tick
+        jitter: delay each next run by up to jitter random seconds
+        timeout: abort a run after timeout seconds, defaults to
+                 CONF.periodic_task_timeout
     """
     def decorator(f):
         f._periodic_task = True
         f._ticks_between_runs = kwargs.pop('ticks_between_runs', 0)
+        f._spacing = kwargs.pop('spacing', 0)
+        f._jitter = kwargs.pop('jitter', 0)
+        f._timeout = kwargs.pop('timeout', None)
         return f
 
     # NOTE(sirp): The `if` is necessary to allow the decorator to be used with
@@ -129,6 +144,30 @@ class ManagerMeta(type):
                 cls._ticks_to_skip[name] = task._ticks_between_runs
 
 
+class _PeriodicTaskState(object):
+    """Schedule and timing of the runs of one periodic task."""
+
+    def __init__(self):
+        self.next_run = None
+        self.thread = None
+        self.runs = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.last_start = None
+        self.last_duration = None
+        self.last_lateness = None
+
+    def stats(self):
+        return {'running': self.thread is not None,
+                'next_run': self.next_run,
+                'runs': self.runs,
+                'errors': self.errors,
+                'timeouts': self.timeouts,
+                'last_start': self.last_start,
+                'last_duration': self.last_duration,
+                'last_lateness': self.last_lateness}
+
+
 class Manager(base.Base):
     __metaclass__ = ManagerMeta
 
@@ -139,6 +178,7 @@ class Manager(base.Base):
         if not host:
             host = CONF.host
         self.host = host
+        self._periodic_state = {}
         super(Manager, self).__init__(db_driver)
 
     def create_rpc_dispatcher(self):
@@ -150,7 +190,14 @@ class Manager(base.Base):
         return rpc_dispatcher.RpcDispatcher([self])
 
     def periodic_tasks(self, context, raise_on_error=False):
-        """Tasks to be run at a periodic interval."""
+        """Tasks to be run at a periodic interval.
+
+        Each task which is due is started on its own greenthread, so a
+        slow task holds up neither the other tasks nor the next tick. A
+        task is not started again while its previous run is in progress.
+        With raise_on_error tasks are run in the calling thread instead,
+        so that their errors propagate.
+        """
         for task_name, task in self._periodic_tasks:
             full_task_name = '.'.join([self.__class__.__name__, task_name])
 
@@ -161,16 +208,69 @@ class Manager(base.Base):
                 self._ticks_to_skip[task_name] -= 1
                 continue
 
-            self._ticks_to_skip[task_name] = task._ticks_between_runs
-            LOG.debug(_("Running periodic task %(full_task_name)s"), locals())
+            state = self._periodic_state.setdefault(task_name,
+                                                    _PeriodicTaskState())
+            now = time.time()
+            if state.next_run is not None and now < state.next_run:
+                continue
+            if state.thread is not None:
+                LOG.warn(_("Skipping %s, its previous run is still in "
+                           "progress"), full_task_name)
+                continue
 
-            try:
-                task(self, context)
-            except Exception as e:
-                if raise_on_error:
-                    raise
-                LOG.exception(_("Error during %(full_task_name)s: %(e)s"),
-                              locals())
+            self._ticks_to_skip[task_name] = task._ticks_between_runs
+            state.last_lateness = (now - state.next_run
+                                   if state.next_run is not None else 0)
+            if task._spacing:
+                state.next_run = (now + task._spacing +
+                                  random.uniform(0, task._jitter))
+
+            if raise_on_error:
+                self._run_periodic_task(context, full_task_name, task,
+                                        state, raise_on_error=True)
+            else:
+                state.thread = eventlet.spawn(self._run_periodic_task,
+                                              context, full_task_name, task,
+                                              state)
+
+    def _run_periodic_task(self, context, full_task_name, task, state,
+                           raise_on_error=False):
+        LOG.debug(_("Running periodic task %(full_task_name)s"), locals())
+        if task._timeout is not None:
+            timeout = task._timeout
+        else:
+            timeout = CONF.periodic_task_timeout
+        state.last_start = time.time()
+        timer = eventlet.Timeout(timeout or None)
+        try:
+            task(self, context)
+        except eventlet.Timeout as e:
+            if e is not timer:
+                raise
+            state.timeouts += 1
+            LOG.error(_("%(full_task_name)s timed out after %(timeout)s "
+                        "seconds"), locals())
+            if raise_on_error:
+                raise
+        except Exception as e:
+            state.errors += 1
+            if raise_on_error:
+                raise
+            LOG.exception(_("Error during %(full_task_name)s: %(e)s"),
+                          locals())
+        finally:
+            timer.cancel()
+            state.runs += 1
+            state.last_duration = time.time() - state.last_start
+            state.thread = None
+
+    def periodic_task_stats(self, context):
+        """Returns schedule and timing of the runs of periodic tasks."""
+        stats = {}
+        for task_name, task in self._periodic_tasks:
+            state = self._periodic_state.get(task_name, _PeriodicTaskState())
+            stats[task_name] = state.stats()
+        return stats
 
     def init_host(self):
         """Handle initialization if this is a standalone service.
@@ -202,6 +302,8 @@ class SchedulerDependentManager(Manager):
 
     def __init__(self, host=None, db_driver=None, service_name='undefined'):
         self.last_capabilities = None
+        self.capabilities_version = 0
+        self._published_capabilities = None
         self.service_name = service_name
         self.scheduler_rpcapi = scheduler_rpcapi.SchedulerAPI()
         super(SchedulerDependentManager, self).__init__(host, db_driver)
@@ -210,13 +312,41 @@ class SchedulerDependentManager(Manager):
         """Remember these capabilities to send on next periodic update."""
         self.last_capabilities = capabilities
 
+    def resync_service_capabilities(self):
+        """Makes the next update send all capabilities."""
+        self._published_capabilities = None
+
     @periodic_task
     def _publish_service_capabilities(self, context):
-        """Pass data back to the scheduler at a periodic interval."""
-        if self.last_capabilities:
-            LOG.debug(_('Notifying Schedulers of capabilities ...'))
-            self.scheduler_rpcapi.update_service_capabilities(
-                context,
-                self.service_name,
-                self.host,
-                self.last_capabilities)
+        """Pass data back to the scheduler at a periodic interval.
+
+        Updates are versioned. All capabilities are sent with the first
+        update, after a resync and when some capability went away. Later
+        updates send only the changed capabilities along with the version
+        they apply to, or nothing but the version if none changed.
+        """
+        if not self.last_capabilities:
+            return
+        capabilities = dict(self.last_capabilities)
+        published = self._published_capabilities
+        if published is None or set(published) - set(capabilities):
+            self.capabilities_version += 1
+            base_version = None
+            update = capabilities
+        else:
+            update = dict((key, value)
+                          for key, value in capabilities.iteritems()
+                          if key not in published or
+                          published[key] != value)
+            base_version = self.capabilities_version
+            if update:
+                self.capabilities_version += 1
+        LOG.debug(_('Notifying Schedulers of capabilities ...'))
+        self.scheduler_rpcapi.update_service_capabilities(
+            context,
+            self.service_name,
+            self.host,
+            update,
+            capabilities_version=self.capabilities_version,
+            base_version=base_version)
+        self._published_capabilities = capabilities
@@ -19,6 +19,8 @@ from neutronclient.common import exceptions
 from neutronclient.v2_0 import client as clientv20
 from oslo.config import cfg
 
+from manila.common import client_auth
+
 CONF = cfg.CONF
 
 
@@ -44,10 +46,14 @@ def _get_client(token=None):
 
 def get_client(context):
     if context.is_admin:
-        token = None
+        # neutronclient authenticates on first request and again when its
+        # token is rejected, so the admin client is just shared.
+        key = ('neutron', CONF.neutron_admin_username,
+               CONF.neutron_admin_password, CONF.neutron_admin_tenant_name,
+               CONF.neutron_admin_auth_url, CONF.neutron_url)
+        return client_auth.admin_clients.get(key, _get_client,
+                                             authenticate=False)
     elif not context.auth_token:
         raise exceptions.Unauthorized()
-    else:
-        token = context.auth_token
 
-    return _get_client(token=token)
+    return _get_client(token=context.auth_token)
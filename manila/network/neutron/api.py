@@ -228,6 +228,15 @@ class API(base.Base):
             raise exception.NetworkException(code=e.status_code,
                                              message=e.message)
 
+    def update_subnet(self, subnet_id, name):
+        try:
+            subnet_req_body = {'subnet': {'name': name}}
+            return self.client.update_subnet(subnet_id, subnet_req_body).\
+                                                        get('subnet', {})
+        except neutron_client_exc.NeutronClientException as e:
+            raise exception.NetworkException(code=e.status_code,
+                                             message=e.message)
+
     def router_add_interface(self, router_id, subnet_id, port_id=None):
         body = {}
         if subnet_id:
@@ -19,6 +19,7 @@
 """Quotas for shares."""
 
 import datetime
+import time
 
 from oslo.config import cfg
 
@@ -55,7 +56,11 @@ quota_opts = [
                help='number of seconds between subsequent usage refreshes'),
     cfg.StrOpt('quota_driver',
                default='manila.quota.DbQuotaDriver',
-               help='default driver to use for quota checks'), ]
+               help='default driver to use for quota checks'),
+    cfg.IntOpt('quota_cache_ttl',
+               default=2,
+               help='number of seconds quota limits are cached in-process '
+                    '(0 disables the cache)'), ]
 
 CONF = cfg.CONF
 CONF.register_opts(quota_opts)
@@ -67,6 +72,57 @@ class DbQuotaDriver(object):
     quota information.  The default driver utilizes the local
     database.
     """
+    def __init__(self):
+        # Resolved limits keyed by lookup, as (timestamp, limits) tuples.
+        # Usages are never cached.
+        self._limit_cache = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _get_cached_limits(self, key, fetch, *args):
+        """Return fetch(*args), cached for quota_cache_ttl seconds."""
+        ttl = CONF.quota_cache_ttl
+        if ttl <= 0:
+            return fetch(*args)
+        now = time.time()
+        entry = self._limit_cache.get(key)
+        if entry is not None and now - entry[0] < ttl:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+            entry = (now, fetch(*args))
+            self._limit_cache[key] = entry
+        # Callers merge into the result, so never hand out the cached dict.
+        return dict(entry[1])
+
+    def invalidate_cache(self):
+        """Drop all cached limits, e.g. after a limit has been changed."""
+        self._limit_cache.clear()
+
+    def _get_project_limits(self, context, project_id):
+        if not (context.is_admin or context.project_id == project_id):
+            # Let the DB layer do its authorization checks.
+            return db.quota_get_all_by_project(context, project_id)
+        return self._get_cached_limits(('project', project_id),
+                                       db.quota_get_all_by_project,
+                                       context, project_id)
+
+    def _get_user_limits(self, context, project_id, user_id):
+        if not (context.is_admin or context.project_id == project_id):
+            return db.quota_get_all_by_project_and_user(context, project_id,
+                                                        user_id)
+        return self._get_cached_limits(
+            ('user', project_id, user_id),
+            db.quota_get_all_by_project_and_user,
+            context, project_id, user_id)
+
+    def _get_class_limits(self, context, quota_class):
+        if not (context.is_admin or context.quota_class == quota_class):
+            return db.quota_class_get_all_by_name(context, quota_class)
+        return self._get_cached_limits(('class', quota_class),
+                                       db.quota_class_get_all_by_name,
+                                       context, quota_class)
+
     def get_by_project_and_user(self, context, project_id, user_id, resource):
         """Get a specific quota by project and user."""
 
@@ -90,7 +146,9 @@ class DbQuotaDriver(object):
         """
 
         quotas = {}
-        default_quotas = db.quota_class_get_default(context)
+        default_quotas = self._get_cached_limits(('default',),
+                                                 db.quota_class_get_default,
+                                                 context)
         for resource in resources.values():
             quotas[resource.name] = default_quotas.get(resource.name,
                                                        resource.default)
@@ -132,7 +190,7 @@ class DbQuotaDriver(object):
         if project_id == context.project_id:
             quota_class = context.quota_class
         if quota_class:
-            class_quotas = db.quota_class_get_all_by_name(context, quota_class)
+            class_quotas = self._get_class_limits(context, quota_class)
         else:
             class_quotas = {}
 
@@ -193,7 +251,7 @@ class DbQuotaDriver(object):
         :param remains: If True, the current remains of the project will
                         will be returned.
         """
-        project_quotas = db.quota_get_all_by_project(context, project_id)
+        project_quotas = self._get_project_limits(context, project_id)
         project_usages = None
         if usages:
             project_usages = db.quota_usage_get_all_by_project(context,
@@ -226,10 +284,9 @@ class DbQuotaDriver(object):
         :param usages: If True, the current in_use and reserved counts
                        will also be returned.
         """
-        user_quotas = db.quota_get_all_by_project_and_user(context,
-                                                           project_id, user_id)
+        user_quotas = self._get_user_limits(context, project_id, user_id)
         # Use the project quota for default user quota.
-        proj_quotas = db.quota_get_all_by_project(context, project_id)
+        proj_quotas = self._get_project_limits(context, project_id)
         for key, value in proj_quotas.iteritems():
             if key not in user_quotas.keys():
                 user_quotas[key] = value
@@ -545,6 +602,7 @@ class DbQuotaDriver(object):
         """
 
         db.quota_destroy_all_by_project(context, project_id)
+        self.invalidate_cache()
 
     def destroy_all_by_project_and_user(self, context, project_id, user_id):
         """
@@ -557,6 +615,7 @@ class DbQuotaDriver(object):
         """
 
         db.quota_destroy_all_by_project_and_user(context, project_id, user_id)
+        self.invalidate_cache()
 
     def expire(self, context):
         """Expire reservations.
@@ -1053,6 +1112,12 @@ class QuotaEngine(object):
 
         self._driver.expire(context)
 
+    def invalidate_cache(self):
+        """Drop limits cached by the quota driver, if it caches any."""
+        invalidate = getattr(self._driver, 'invalidate_cache', None)
+        if invalidate:
+            invalidate()
+
     @property
     def resources(self):
         return sorted(self._resources.keys())
@@ -21,14 +21,17 @@
 Scheduler base class that all Schedulers should inherit from
 """
 
+import copy
+
 from oslo.config import cfg
 
 from manila import db
+from manila import exception
+from manila import liveness
 
 from manila.openstack.common import importutils
 from manila.openstack.common import timeutils
 from manila.share import rpcapi as share_rpcapi
-from manila import utils
 
 scheduler_driver_opts = [
     cfg.StrOpt('scheduler_host_manager',
@@ -70,19 +73,22 @@ class Scheduler(object):
         """
         return self.host_manager.get_service_capabilities()
 
-    def update_service_capabilities(self, service_name, host, capabilities):
-        """Process a capability update from a service node."""
-        self.host_manager.update_service_capabilities(service_name,
-                                                      host,
-                                                      capabilities)
+    def update_service_capabilities(self, service_name, host, capabilities,
+                                    version=None, base_version=None):
+        """Process a capability update from a service node.
+
+        Returns True if the service node should send a full report.
+        """
+        return self.host_manager.update_service_capabilities(
+            service_name, host, capabilities,
+            version=version, base_version=base_version)
 
     def hosts_up(self, context, topic):
         """Return the list of hosts that have a running service for topic."""
 
         services = db.service_get_all_by_topic(context, topic)
         return [service['host']
-                for service in services
-                if utils.service_is_up(service)]
+                for service in liveness.get_driver().filter_up(services)]
 
     def schedule(self, context, topic, method, *_args, **_kwargs):
         """Must override schedule method for scheduler to work."""
@@ -91,3 +97,21 @@ class Scheduler(object):
     def schedule_create_share(self, context, request_spec, filter_properties):
         """Must override schedule method for scheduler to work."""
         raise NotImplementedError(_("Must implement schedule_create_share"))
+
+    def schedule_create_shares(self, context, request_specs,
+                               filter_properties):
+        """Schedule a batch of shares one by one.
+
+        Schedulers able to place several shares at once should override
+        this.
+
+        :returns: list of (request_spec, exception) for unplaced shares.
+        """
+        failed = []
+        for request_spec in request_specs:
+            try:
+                self.schedule_create_share(context, request_spec,
+                                           copy.deepcopy(filter_properties))
+            except exception.NoValidHost as ex:
+                failed.append((request_spec, ex))
+        return failed
@@ -20,6 +20,7 @@ You can customize this scheduler by specifying your own share Filters and
 Weighing Functions.
 """
 
+import copy
 import operator
 
 from manila import exception
@@ -104,12 +105,88 @@ class FilterScheduler(driver.Scheduler):
                                        filter_properties=filter_properties,
                                        snapshot_id=snapshot_id)
 
-    def _schedule_share(self, context, request_spec, filter_properties=None):
-        """Returns a list of hosts that meet the required specs,
-        ordered by their fitness.
+    def schedule_create_shares(self, context, request_specs,
+                               filter_properties):
+        """Place a batch of shares with a single pass over the host list.
+
+        Host states are fetched once and the filters run once per distinct
+        share type/size/availability zone class.  Shares are then placed
+        greedily, largest first, consuming capacity on the chosen host so
+        later placements see it.  Each chosen host gets one create_shares
+        cast carrying all of its shares.
+
+        :returns: list of (request_spec, exception) for unplaced shares.
         """
         elevated = context.elevated()
+        hosts = self.host_manager.get_all_host_states_share(elevated)
 
+        classes = {}
+        failed = []
+        for request_spec in request_specs:
+            try:
+                spec_filter_properties = self._prepare_filter_properties(
+                    context, request_spec, copy.deepcopy(filter_properties))
+            except exception.NoValidHost as ex:
+                failed.append((request_spec, ex))
+                continue
+            share_type = request_spec.get('share_type') or {}
+            key = (share_type.get('id'), share_type.get('name'),
+                   spec_filter_properties['size'],
+                   spec_filter_properties['availability_zone'])
+            classes.setdefault(key, []).append((request_spec,
+                                                spec_filter_properties))
+
+        placements = {}
+        for key in sorted(classes, key=operator.itemgetter(2), reverse=True):
+            requests = classes[key]
+            # Retry history is per share and is checked below.
+            class_filter_properties = dict(requests[0][1])
+            class_filter_properties.pop('retry', None)
+            # Filter when the class comes up so that capacity consumed by
+            # earlier classes is taken into account.
+            class_hosts = self.host_manager.get_filtered_hosts(
+                hosts, class_filter_properties)
+            for request_spec, spec_filter_properties in requests:
+                candidates = [
+                    host for host in class_hosts
+                    if host.host not in
+                    spec_filter_properties.get('retry', {}).get('hosts', [])]
+                if not candidates:
+                    failed.append((request_spec,
+                                   exception.NoValidHost(reason="")))
+                    continue
+                best_host = self.host_manager.get_weighed_hosts(
+                    candidates, spec_filter_properties)[0]
+                host_state = best_host.obj
+                host_state.consume_from_share(
+                    request_spec['share_properties'])
+                # Drop the host from this class once it no longer fits.
+                if not self.host_manager.get_filtered_hosts(
+                        [host_state], class_filter_properties):
+                    class_hosts.remove(host_state)
+
+                updated_share = driver.share_update_db(
+                    context, request_spec['share_id'], host_state.host)
+                self._post_select_populate_filter_properties(
+                    spec_filter_properties, host_state)
+                # context is not serializable
+                spec_filter_properties.pop('context', None)
+                placements.setdefault(host_state.host, []).append({
+                    'share_id': updated_share['id'],
+                    'request_spec': request_spec,
+                    'filter_properties': spec_filter_properties,
+                    'snapshot_id': request_spec.get('snapshot_id'),
+                })
+
+        for host, shares in placements.iteritems():
+            LOG.debug(_("Sending %(count)d shares to %(host)s")
+                      % {'count': len(shares), 'host': host})
+            self.share_rpcapi.create_shares(context, host, shares)
+        return failed
+
+    def _prepare_filter_properties(self, context, request_spec,
+                                   filter_properties=None):
+        """Populate filter properties for a single share request."""
         share_properties = request_spec['share_properties']
         # Since Manila is using mixed filters from Oslo and it's own, which
         # takes 'resource_XX' and 'volume_XX' as input respectively, copying
@@ -133,6 +210,16 @@ class FilterScheduler(driver.Scheduler):
                                   })
 
         self.populate_filter_properties_share(request_spec, filter_properties)
+        return filter_properties
+
+    def _schedule_share(self, context, request_spec, filter_properties=None):
+        """Returns a list of hosts that meet the required specs,
+        ordered by their fitness.
+        """
+        elevated = context.elevated()
+        share_properties = request_spec['share_properties']
+        filter_properties = self._prepare_filter_properties(
+            context, request_spec, filter_properties)
 
         # Find our local list of acceptable hosts by filtering and
         # weighing our options. we virtually consume resources on
@@ -12,3 +12,75 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+
+"""
+Scheduler host filters
+"""
+
+import numpy
+
+from manila.openstack.common.scheduler import filters
+from manila.scheduler import host_columns
+
+
+class BaseColumnHostFilter(filters.BaseHostFilter):
+    """Base class for host filters which decide for all hosts at once.
+
+    Subclasses implement _filter_columns(), which gets the capacities and
+    update times of the hosts as NumPy arrays. host_passes() is answered
+    by _filter_columns() too, so the filter has a single implementation.
+    If a subclass overrides host_passes(), hosts are filtered one by one
+    through it.
+    """
+
+    def _filter_columns(self, columns, filter_properties):
+        """Return a boolean array, True for each host which passes.
+
+        :param columns: HostStateColumns of the hosts.
+        """
+        raise NotImplementedError()
+
+    def _filters_columns(self):
+        """Return whether hosts can be filtered by _filter_columns()."""
+        return (self.host_passes.__func__ is
+                BaseColumnHostFilter.host_passes.__func__)
+
+    def host_passes(self, host_state, filter_properties):
+        columns = host_columns.HostStateColumns([host_state])
+        return bool(self._filter_columns(columns, filter_properties)[0])
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        if not self._filters_columns():
+            return super(BaseColumnHostFilter, self).filter_all(
+                filter_obj_list, filter_properties)
+        columns = host_columns.get_columns(filter_obj_list)
+        passes = self._filter_columns(columns, filter_properties)
+        return (columns.hosts[index] for index in numpy.flatnonzero(passes))
+
+
+class HostFilterHandler(filters.HostFilterHandler):
+    """Filter handler evaluating column filters on arrays of all hosts.
+
+    Column filters narrow down a mask over the hosts, other filters get
+    the hosts which passed so far.
+    """
+
+    def get_filtered_objects(self, filter_classes, objs,
+                             filter_properties):
+        hosts = list(objs)
+        columns = None
+        passes = numpy.ones(len(hosts), dtype=bool)
+        for filter_cls in filter_classes:
+            filt = filter_cls()
+            if (isinstance(filt, BaseColumnHostFilter) and
+                    filt._filters_columns()):
+                if columns is None:
+                    columns = host_columns.get_columns(hosts)
+                passes &= filt._filter_columns(columns, filter_properties)
+                continue
+            indexes = numpy.flatnonzero(passes)
+            passed = set(id(host) for host in filt.filter_all(
+                [hosts[index] for index in indexes], filter_properties))
+            passes[indexes] = [id(hosts[index]) in passed
+                               for index in indexes]
+        return [hosts[index] for index in numpy.flatnonzero(passes)]
@@ -16,42 +16,45 @@
 #    under the License.
 
 
-import math
+import numpy
 
 from manila.openstack.common import log as logging
-from manila.openstack.common.scheduler import filters
+from manila.scheduler import filters
 
 
 LOG = logging.getLogger(__name__)
 
 
-class CapacityFilter(filters.BaseHostFilter):
+class CapacityFilter(filters.BaseColumnHostFilter):
     """CapacityFilter filters based on volume host's capacity utilization."""
 
-    def host_passes(self, host_state, filter_properties):
-        """Return True if host has sufficient capacity."""
+    def _filter_columns(self, columns, filter_properties):
+        """Return which hosts have sufficient capacity."""
         volume_size = filter_properties.get('size')
+        free_space = columns.free_capacity_gb
 
-        if host_state.free_capacity_gb is None:
+        not_set = numpy.isnan(free_space)
+        if not_set.any():
             # Fail Safe
             LOG.error(_("Free capacity not set: "
                         "volume node info collection broken."))
-            return False
-
-        free_space = host_state.free_capacity_gb
-        if free_space == 'infinite' or free_space == 'unknown':
-            # NOTE(zhiteng) for those back-ends cannot report actual
-            # available capacity, we assume it is able to serve the
-            # request.  Even if it was not, the retry mechanism is
-            # able to handle the failure by rescheduling
-            return True
-        reserved = float(host_state.reserved_percentage) / 100
-        free = math.floor(free_space * (1 - reserved))
-        if free < volume_size:
-            LOG.warning(_("Insufficient free space for volume creation "
-                        "(requested / avail): "
-                        "%(requested)s/%(available)s")
-                        % {'requested': volume_size,
-                           'available': free})
 
-        return free >= volume_size
+        # NOTE(zhiteng) for those back-ends cannot report actual
+        # available capacity, we assume it is able to serve the
+        # request.  Even if it was not, the retry mechanism is
+        # able to handle the failure by rescheduling
+        unlimited = numpy.isinf(free_space)
+        with numpy.errstate(invalid='ignore'):
+            reserved = columns.reserved_percentage / 100
+            free = numpy.floor(free_space * (1 - reserved))
+            passes = unlimited | (free >= volume_size)
+
+        insufficient = ~(passes | not_set)
+        if insufficient.any():
+            LOG.warning(_("Insufficient free space for volume creation "
+                          "on %(hosts)d hosts (requested / max avail): "
+                          "%(requested)s/%(available)s")
+                        % {'hosts': insufficient.sum(),
+                           'requested': volume_size,
+                           'available': free[insufficient].max()})
+        return passes
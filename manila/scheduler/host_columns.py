@@ -0,0 +1,108 @@
+# Copyright 2014 Mirantis Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Columnar representation of host states for filters and weighers."""
+
+import datetime
+
+import numpy
+
+from manila.openstack.common import timeutils
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _capacity(value):
+    if value is None:
+        return numpy.nan
+    if value == 'infinite' or value == 'unknown':
+        return numpy.inf
+    return value
+
+
+def _timestamp(value):
+    if value is None:
+        return numpy.nan
+    if isinstance(value, datetime.datetime):
+        return timeutils.delta_seconds(_EPOCH,
+                                       timeutils.normalize_time(value))
+    return value
+
+
+class HostStateColumns(object):
+    """Capacities and update times of hosts as NumPy arrays.
+
+    Element i of every array belongs to hosts[i]. 'infinite' and 'unknown'
+    capacities are stored as inf, capacities and update times which are not
+    set as nan.
+    """
+
+    def __init__(self, host_states=(), attach=False):
+        """Builds the arrays from the given host states.
+
+        If attach is set, the host states keep their elements up to date
+        when their capacities change.
+        """
+        self.hosts = tuple(host_states)
+        count = len(self.hosts)
+        self.free_capacity_gb = numpy.empty(count)
+        self.total_capacity_gb = numpy.empty(count)
+        self.reserved_percentage = numpy.empty(count)
+        self.updated = numpy.empty(count)
+        for index, host_state in enumerate(self.hosts):
+            self.update(index, host_state)
+            if attach:
+                host_state.columns = self
+                host_state.column_index = index
+
+    def update(self, index, host_state):
+        """Copies the values of host_state into element index."""
+        self.free_capacity_gb[index] = _capacity(host_state.free_capacity_gb)
+        self.total_capacity_gb[index] = _capacity(
+            host_state.total_capacity_gb)
+        self.reserved_percentage[index] = host_state.reserved_percentage
+        self.updated[index] = _timestamp(host_state.updated)
+
+    def take(self, indexes, host_states):
+        """Returns columns of host_states, found at indexes of these."""
+        columns = HostStateColumns()
+        columns.hosts = tuple(host_states)
+        columns.free_capacity_gb = self.free_capacity_gb[indexes]
+        columns.total_capacity_gb = self.total_capacity_gb[indexes]
+        columns.reserved_percentage = self.reserved_percentage[indexes]
+        columns.updated = self.updated[indexes]
+        return columns
+
+    def __len__(self):
+        return len(self.hosts)
+
+
+def get_columns(host_states):
+    """Returns HostStateColumns of the given host states, in their order.
+
+    Arrays the host states are attached to are reused, so the values are
+    not collected from the host states again.
+    """
+    host_states = list(host_states)
+    columns = getattr(host_states[0], 'columns', None) if host_states else None
+    if columns is not None:
+        indexes = numpy.fromiter(
+            (host_state.column_index
+             if getattr(host_state, 'columns', None) is columns else -1
+             for host_state in host_states),
+            int, len(host_states))
+        if (indexes >= 0).all():
+            return columns.take(indexes, host_states)
+    return HostStateColumns(host_states)
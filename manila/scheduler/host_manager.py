@@ -17,18 +17,20 @@
 Manage hosts in the current zone.
 """
 
+import time
 import UserDict
 
 from oslo.config import cfg
 
 from manila import db
 from manila import exception
+from manila import liveness
 
 from manila.openstack.common import log as logging
-from manila.openstack.common.scheduler import filters
-from manila.openstack.common.scheduler import weights
 from manila.openstack.common import timeutils
-from manila import utils
+from manila.scheduler import filters
+from manila.scheduler import host_columns
+from manila.scheduler import weights
 
 host_manager_opts = [
     cfg.ListOpt('scheduler_default_filters',
@@ -43,7 +45,13 @@ host_manager_opts = [
                 default=[
                     'CapacityWeigher'
                 ],
-                help='Which weigher class names to use for weighing hosts.')
+                help='Which weigher class names to use for weighing hosts.'),
+    cfg.IntOpt('scheduler_host_state_cache_ttl',
+               default=10,
+               help='Seconds the scheduler keeps share service records '
+                    'before reading them from the database again to check '
+                    'service liveness. Should be less than service_down_time '
+                    'minus report_interval, 0 disables caching.'),
 ]
 
 CONF = cfg.CONF
@@ -104,6 +112,11 @@ class HostState(object):
 
         self.updated = None
 
+        # HostStateColumns this host state keeps its capacities in sync
+        # with, and its element there.
+        self.columns = None
+        self.column_index = None
+
     def update_capabilities(self, capabilities=None, service=None):
         # Read-only capability dicts
 
@@ -131,6 +144,7 @@ class HostState(object):
             self.reserved_percentage = capability['reserved_percentage']
 
             self.updated = capability['timestamp']
+            self._update_columns()
 
     def consume_from_share(self, share):
         """Incrementally update host state from an share"""
@@ -144,6 +158,11 @@ class HostState(object):
         else:
             self.free_capacity_gb -= share_gb
         self.updated = timeutils.utcnow()
+        self._update_columns()
+
+    def _update_columns(self):
+        if self.columns is not None:
+            self.columns.update(self.column_index, self)
 
 
 class HostManager(object):
@@ -160,6 +179,10 @@ class HostManager(object):
         self.weight_handler = weights.HostWeightHandler('manila.scheduler.'
                                                         'weights')
         self.weight_classes = self.weight_handler.get_all_classes()
+        self._host_states_snapshot = None
+        self._host_states_refreshed_at = 0
+        self._capability_versions = {}
+        self._resync_requested = {}
 
     def _choose_host_filters(self, filter_cls_names):
         """Since the caller may specify which filters to use we need
@@ -230,35 +253,92 @@ class HostManager(object):
                                                        hosts,
                                                        weight_properties)
 
-    def update_service_capabilities(self, service_name, host, capabilities):
-        """Update the per-service capabilities based on this notification."""
+    def update_service_capabilities(self, service_name, host, capabilities,
+                                    version=None, base_version=None):
+        """Update the per-service capabilities based on this notification.
+
+        A report with a base_version carries only the capabilities changed
+        since that version, or none at all if nothing changed. Returns True
+        if such a report does not follow the last known version of the
+        host, the caller should then ask the host for a full report. The
+        request is repeated every service_down_time seconds until the full
+        report arrives.
+        """
         if service_name not in ('share'):
             LOG.debug(_('Ignoring %(service_name)s service update '
                         'from %(host)s'), locals())
-            return
+            return False
 
         LOG.debug(_("Received %(service_name)s service update from "
                     "%(host)s.") % locals())
 
-        # Copy the capabilities, so we don't modify the original dict
-        capab_copy = dict(capabilities)
+        if base_version is None:
+            # Copy the capabilities, so we don't modify the original dict
+            capab_copy = dict(capabilities)
+            self._resync_requested.pop(host, None)
+        elif (host not in self.service_states or
+                self._capability_versions.get(host) != base_version):
+            requested_at = self._resync_requested.get(host)
+            if (requested_at is not None and
+                    time.time() - requested_at < CONF.service_down_time):
+                return False
+            LOG.debug(_("Capabilities of %(host)s are not at version "
+                        "%(base_version)s, requesting full report."),
+                      locals())
+            self._resync_requested[host] = time.time()
+            return True
+        elif not capabilities and version == base_version:
+            # Nothing changed, just mark the capabilities as fresh.
+            capab = self.service_states[host]
+            capab["timestamp"] = timeutils.utcnow()
+            host_state = self.host_state_map.get(host)
+            if host_state:
+                host_state.update_from_share_capability(capab)
+            return False
+        else:
+            capab_copy = dict(self.service_states[host])
+            capab_copy.update(capabilities)
+
         capab_copy["timestamp"] = timeutils.utcnow()  # Reported time
         self.service_states[host] = capab_copy
+        self._capability_versions[host] = version
+
+        # Keep cached host state up to date, service record is not changed.
+        host_state = self.host_state_map.get(host)
+        if host_state:
+            host_state.update_capabilities(capab_copy, host_state.service)
+            host_state.update_from_share_capability(capab_copy)
+        return False
 
     def get_all_host_states_share(self, context):
-        """Returns a dict of all the hosts the HostManager
+        """Returns a tuple of all the hosts the HostManager
           knows about. Also, each of the consumable resources in HostState
           are pre-populated and adjusted based on data in the db.
 
+          Service records are re-read from the db only once per
+          scheduler_host_state_cache_ttl seconds, capabilities are kept
+          up to date by update_service_capabilities.
+
           For example:
-          {'192.168.1.100': HostState(), ...}
+          (HostState(), ...)
         """
-
+        ttl = CONF.scheduler_host_state_cache_ttl
+        if (self._host_states_snapshot is None or
+                time.time() - self._host_states_refreshed_at >= ttl):
+            self._refresh_host_states(context)
+        return self._host_states_snapshot
+
+    def _refresh_host_states(self, context):
+        """Rebuild the snapshot of host states of the running services."""
         # Get resource usage across the available share nodes:
         topic = CONF.share_topic
         share_services = db.service_get_all_by_topic(context, topic)
+        up_service_ids = set(
+            service['id']
+            for service in liveness.get_driver().filter_up(share_services))
+        host_states = []
         for service in share_services:
-            if not utils.service_is_up(service) or service['disabled']:
+            if service['id'] not in up_service_ids or service['disabled']:
                 LOG.warn(_("service is down or disabled."))
                 continue
             host = service['host']
@@ -276,5 +356,8 @@ class HostManager(object):
                 self.host_state_map[host] = host_state
             # update host_state
             host_state.update_from_share_capability(capabilities)
+            host_states.append(host_state)
 
-        return self.host_state_map.itervalues()
+        host_columns.HostStateColumns(host_states, attach=True)
+        self._host_states_snapshot = tuple(host_states)
+        self._host_states_refreshed_at = time.time()
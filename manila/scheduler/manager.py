@@ -48,7 +48,7 @@ CONF.register_opt(scheduler_driver_opt)
 class SchedulerManager(manager.Manager):
     """Chooses a host to create shares."""
 
-    RPC_API_VERSION = '1.3'
+    RPC_API_VERSION = '1.5'
 
     def __init__(self, scheduler_driver=None, service_name=None,
                  *args, **kwargs):
@@ -70,13 +70,18 @@ class SchedulerManager(manager.Manager):
         return self.driver.get_service_capabilities()
 
     def update_service_capabilities(self, context, service_name=None,
-                                    host=None, capabilities=None, **kwargs):
+                                    host=None, capabilities=None,
+                                    capabilities_version=None,
+                                    base_version=None, **kwargs):
         """Process a capability update from a service node."""
         if capabilities is None:
             capabilities = {}
-        self.driver.update_service_capabilities(service_name,
-                                                host,
-                                                capabilities)
+        resync = self.driver.update_service_capabilities(
+            service_name, host, capabilities,
+            version=capabilities_version, base_version=base_version)
+        if resync:
+            share_rpcapi.ShareAPI().publish_service_capabilities(context,
+                                                                 host=host)
 
     def create_share(self, context, topic, share_id, snapshot_id=None,
                      request_spec=None, filter_properties=None):
@@ -92,6 +97,22 @@ class SchedulerManager(manager.Manager):
                                                        context, ex,
                                                        request_spec)
 
+    def create_shares(self, context, topic, request_specs,
+                      filter_properties=None):
+        try:
+            failed = self.driver.schedule_create_shares(context,
+                                                        request_specs,
+                                                        filter_properties)
+        except Exception as ex:
+            with excutils.save_and_reraise_exception():
+                for request_spec in request_specs:
+                    self._set_share_error_state_and_notify('create_share',
+                                                           context, ex,
+                                                           request_spec)
+        for request_spec, ex in failed:
+            self._set_share_error_state_and_notify('create_share',
+                                                   context, ex, request_spec)
+
     def _set_share_error_state_and_notify(self, method, context, ex,
                                           request_spec):
         LOG.warning(_("Failed to schedule_%(method)s: %(ex)s") % locals())
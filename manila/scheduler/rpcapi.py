@@ -37,6 +37,9 @@ class SchedulerAPI(manila.openstack.common.rpc.proxy.RpcProxy):
         1.2 - Add request_spec, filter_properties arguments
               to create_volume()
         1.3 - Add create_share() method
+        1.4 - Add create_shares() method
+        1.5 - Add capabilities_version, base_version arguments
+              to update_service_capabilities()
     '''
 
     RPC_API_VERSION = '1.0'
@@ -58,9 +61,23 @@ class SchedulerAPI(manila.openstack.common.rpc.proxy.RpcProxy):
             filter_properties=filter_properties),
             version='1.3')
 
+    def create_shares(self, ctxt, topic, request_specs,
+                      filter_properties=None):
+        request_specs_p = jsonutils.to_primitive(request_specs)
+        return self.cast(ctxt, self.make_msg(
+            'create_shares',
+            topic=topic,
+            request_specs=request_specs_p,
+            filter_properties=filter_properties),
+            version='1.4')
+
     def update_service_capabilities(self, ctxt,
                                     service_name, host,
-                                    capabilities):
+                                    capabilities, capabilities_version=None,
+                                    base_version=None):
         self.fanout_cast(ctxt, self.make_msg('update_service_capabilities',
                          service_name=service_name, host=host,
-                         capabilities=capabilities))
+                         capabilities=capabilities,
+                         capabilities_version=capabilities_version,
+                         base_version=base_version),
+                         version='1.5')
@@ -25,10 +25,10 @@ from oslo.config import cfg
 
 from manila import db
 from manila import exception
+from manila import liveness
 
 from manila.scheduler import chance
 from manila.scheduler import driver
-from manila import utils
 
 simple_scheduler_opts = [
     cfg.IntOpt("max_gigabytes",
@@ -58,7 +58,7 @@ class SimpleScheduler(chance.ChanceScheduler):
             zone, _x, host = availability_zone.partition(':')
         if host and context.is_admin:
             service = db.service_get_by_args(elevated, host, CONF.share_topic)
-            if not utils.service_is_up(service):
+            if not liveness.get_driver().is_up(service):
                 raise exception.WillNotSchedule(host=host)
             updated_share = driver.share_update_db(context, share_id, host)
             self.share_rpcapi.create_share(context,
@@ -79,7 +79,8 @@ class SimpleScheduler(chance.ChanceScheduler):
             if share_gigabytes + share_size > CONF.max_gigabytes:
                 msg = _("Not enough allocatable share gigabytes remaining")
                 raise exception.NoValidHost(reason=msg)
-            if utils.service_is_up(service) and not service['disabled']:
+            if (liveness.get_driver().is_up(service) and
+                    not service['disabled']):
                 updated_share = driver.share_update_db(context, share_id,
                                                        service['host'])
                 self.share_rpcapi.create_share(context,
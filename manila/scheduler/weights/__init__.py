@@ -12,3 +12,87 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+
+"""
+Scheduler host weights
+"""
+
+import numpy
+
+from manila.openstack.common.scheduler import weights
+from manila.scheduler import host_columns
+
+
+class BaseColumnHostWeigher(weights.BaseHostWeigher):
+    """Base class for host weighers which weigh all hosts at once.
+
+    Subclasses implement _weigh_columns(), which gets the capacities and
+    update times of the hosts as NumPy arrays. _weigh_object() is answered
+    by _weigh_columns() too, so the weigher has a single implementation.
+    If a subclass overrides _weigh_object(), hosts are weighed one by one
+    through it.
+    """
+
+    def _weigh_columns(self, columns, weight_properties):
+        """Return an array of weights, one per host.
+
+        :param columns: HostStateColumns of the hosts.
+        """
+        raise NotImplementedError()
+
+    def _weighs_columns(self):
+        """Return whether hosts can be weighed by _weigh_columns()."""
+        return (self._weigh_object.__func__ is
+                BaseColumnHostWeigher._weigh_object.__func__)
+
+    def _weigh_object(self, host_state, weight_properties):
+        columns = host_columns.HostStateColumns([host_state])
+        return self._weigh_columns(columns, weight_properties)[0]
+
+    def weigh_objects(self, weighed_obj_list, weight_properties):
+        if not self._weighs_columns():
+            return super(BaseColumnHostWeigher, self).weigh_objects(
+                weighed_obj_list, weight_properties)
+        columns = host_columns.get_columns(obj.obj
+                                           for obj in weighed_obj_list)
+        host_weights = (self._weight_multiplier() *
+                        self._weigh_columns(columns, weight_properties))
+        for obj, weight in zip(weighed_obj_list, host_weights):
+            obj.weight += weight
+
+
+class HostWeightHandler(weights.HostWeightHandler):
+    """Weight handler summing up weights of all hosts in an array.
+
+    Column weighers add their weights to the array at once, other weighers
+    weigh the hosts one by one.
+    """
+
+    def get_weighed_objects(self, weigher_classes, obj_list,
+                            weighing_properties):
+        """Return a sorted (highest score first) list of WeighedHosts."""
+        hosts = list(obj_list)
+        if not hosts:
+            return []
+
+        columns = None
+        host_weights = numpy.zeros(len(hosts))
+        for weigher_cls in weigher_classes:
+            weigher = weigher_cls()
+            if (isinstance(weigher, BaseColumnHostWeigher) and
+                    weigher._weighs_columns()):
+                if columns is None:
+                    columns = host_columns.get_columns(hosts)
+                host_weights += (weigher._weight_multiplier() *
+                                 weigher._weigh_columns(columns,
+                                                        weighing_properties))
+                continue
+            weighed_objs = [self.object_class(host, float(weight))
+                            for host, weight in zip(hosts, host_weights)]
+            weigher.weigh_objects(weighed_objs, weighing_properties)
+            host_weights = numpy.array([obj.weight for obj in weighed_objs])
+
+        # Stable, so hosts of equal weight keep their order.
+        order = numpy.argsort(-host_weights, kind='mergesort')
+        return [self.object_class(hosts[index], float(host_weights[index]))
+                for index in order]
@@ -20,12 +20,12 @@ stacking, you can set the 'capacity_weight_multiplier' option to a negative
 number and the weighing has the opposite effect of the default.
 """
 
-import math
+import numpy
 
 from oslo.config import cfg
 
 
-from manila.openstack.common.scheduler import weights
+from manila.scheduler import weights
 
 capacity_weight_opts = [
         cfg.FloatOpt('capacity_weight_multiplier',
@@ -38,19 +38,17 @@ CONF = cfg.CONF
 CONF.register_opts(capacity_weight_opts)
 
 
-class CapacityWeigher(weights.BaseHostWeigher):
+class CapacityWeigher(weights.BaseColumnHostWeigher):
     def _weight_multiplier(self):
         """Override the weight multiplier."""
         return CONF.capacity_weight_multiplier
 
-    def _weigh_object(self, host_state, weight_properties):
+    def _weigh_columns(self, columns, weight_properties):
         """Higher weights win.  We want spreading to be the default."""
-        reserved = float(host_state.reserved_percentage) / 100
-        free_space = host_state.free_capacity_gb
-        if free_space == 'infinite' or free_space == 'unknown':
-            #(zhiteng) 'infinite' and 'unknown' are treated the same
-            # here, for sorting purpose.
-            free = float('inf')
-        else:
-            free = math.floor(host_state.free_capacity_gb * (1 - reserved))
-        return free
+        reserved = columns.reserved_percentage / 100
+        free_space = columns.free_capacity_gb
+        #(zhiteng) 'infinite' and 'unknown' are treated the same
+        # here, for sorting purpose.
+        with numpy.errstate(invalid='ignore'):
+            free = numpy.floor(free_space * (1 - reserved))
+        return numpy.where(numpy.isinf(free_space), numpy.inf, free)
@@ -34,6 +34,7 @@ from oslo.config import cfg
 from manila import context
 from manila import db
 from manila import exception
+from manila import liveness
 
 from manila.openstack.common import importutils
 from manila.openstack.common import log as logging
@@ -51,6 +52,11 @@ service_opts = [
     cfg.IntOpt('periodic_interval',
                default=60,
                help='seconds between running periodic tasks'),
+    cfg.IntOpt('periodic_task_timeout',
+               default=300,
+               help='seconds after which a run of a periodic task that sets'
+                    ' no timeout of its own is aborted.'
+                    ' (Disable by setting to 0)'),
     cfg.IntOpt('periodic_fuzzy_delay',
                default=60,
                help='range of seconds to randomly delay when starting the'
@@ -323,6 +329,71 @@ class ProcessLauncher(object):
                 self._wait_child()
 
 
+def _report_states(services):
+    """Update the state of the given services in the datastore at once."""
+    ctxt = context.get_admin_context()
+    try:
+        missing = liveness.get_driver().heartbeat(
+            ctxt, [service.service_id for service in services])
+        for service in services:
+            if service.service_id in missing:
+                LOG.debug(_('The service database object disappeared, '
+                            'Recreating it.'))
+                service._create_service_ref(ctxt)
+
+    # TODO(vish): this should probably only catch connection errors
+    except Exception:  # pylint: disable=W0702
+        disconnected = [service for service in services
+                        if not getattr(service, 'model_disconnected', False)]
+        for service in disconnected:
+            service.model_disconnected = True
+        if disconnected:
+            LOG.exception(_('model server went away'))
+        return
+
+    # TODO(termie): make this pattern be more elegant.
+    for service in services:
+        if getattr(service, 'model_disconnected', False):
+            service.model_disconnected = False
+            LOG.error(_('Recovered model server connection!'))
+
+
+class _HeartbeatBatch(object):
+    """Reports the state of all services running in this process at once.
+
+    The first service added sets the report interval. Services forked into
+    processes of their own by ProcessLauncher report separately, which is
+    why manila-share can run its backends in one process instead.
+    """
+
+    def __init__(self):
+        self._services = []
+        self._timer = None
+
+    def add(self, service):
+        """Adds service and returns the timer reporting its state."""
+        self._services.append(service)
+        if self._timer is None:
+            self._timer = utils.LoopingCall(self.report)
+            self._timer.start(interval=service.report_interval,
+                              initial_delay=service.report_interval)
+        return self._timer
+
+    def remove(self, service):
+        if service in self._services:
+            self._services.remove(service)
+        if not self._services and self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+
+    def report(self):
+        if self._services:
+            _report_states(list(self._services))
+
+
+_heartbeats = _HeartbeatBatch()
+
+
 class Service(object):
     """Service object for binaries running on hosts.
 
@@ -347,6 +418,7 @@ class Service(object):
         super(Service, self).__init__(*args, **kwargs)
         self.saved_args, self.saved_kwargs = args, kwargs
         self.timers = []
+        self._heartbeat = None
 
     def start(self):
         version_string = version.version_string()
@@ -360,6 +432,10 @@ class Service(object):
                                                  self.host,
                                                  self.binary)
             self.service_id = service_ref['id']
+            zone = CONF.storage_availability_zone
+            if zone != service_ref['availability_zone']:
+                db.service_update(ctxt, self.service_id,
+                                  {'availability_zone': zone})
         except exception.NotFound:
             self._create_service_ref(ctxt)
 
@@ -381,10 +457,7 @@ class Service(object):
         self.conn.consume_in_thread()
 
         if self.report_interval:
-            pulse = utils.LoopingCall(self.report_state)
-            pulse.start(interval=self.report_interval,
-                        initial_delay=self.report_interval)
-            self.timers.append(pulse)
+            self._heartbeat = _heartbeats.add(self)
 
         if self.periodic_interval:
             if self.periodic_fuzzy_delay:
@@ -470,9 +543,15 @@ class Service(object):
             except Exception:
                 pass
         self.timers = []
+        if self._heartbeat:
+            _heartbeats.remove(self)
+            self._heartbeat = None
 
     def wait(self):
-        for x in self.timers:
+        timers = self.timers
+        if self._heartbeat:
+            timers = timers + [self._heartbeat]
+        for x in timers:
             try:
                 x.wait()
             except Exception:
@@ -485,35 +564,7 @@ class Service(object):
 
     def report_state(self):
         """Update the state of this service in the datastore."""
-        ctxt = context.get_admin_context()
-        zone = CONF.storage_availability_zone
-        state_catalog = {}
-        try:
-            try:
-                service_ref = db.service_get(ctxt, self.service_id)
-            except exception.NotFound:
-                LOG.debug(_('The service database object disappeared, '
-                            'Recreating it.'))
-                self._create_service_ref(ctxt)
-                service_ref = db.service_get(ctxt, self.service_id)
-
-            state_catalog['report_count'] = service_ref['report_count'] + 1
-            if zone != service_ref['availability_zone']:
-                state_catalog['availability_zone'] = zone
-
-            db.service_update(ctxt,
-                              self.service_id, state_catalog)
-
-            # TODO(termie): make this pattern be more elegant.
-            if getattr(self, 'model_disconnected', False):
-                self.model_disconnected = False
-                LOG.error(_('Recovered model server connection!'))
-
-        # TODO(vish): this should probably only catch connection errors
-        except Exception:  # pylint: disable=W0702
-            if not getattr(self, 'model_disconnected', False):
-                self.model_disconnected = True
-                LOG.exception(_('model server went away'))
+        _report_states([self])
 
 
 class WSGIService(object):
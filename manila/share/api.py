@@ -52,6 +52,46 @@ class API(base.Base):
                snapshot=None, availability_zone=None, metadata=None,
                share_network_id=None):
         """Create new share."""
+        return self.create_shares(context, [{
+            'share_proto': share_proto,
+            'size': size,
+            'name': name,
+            'description': description,
+            'snapshot': snapshot,
+            'availability_zone': availability_zone,
+            'metadata': metadata,
+            'share_network_id': share_network_id}])[0]
+
+    def create_shares(self, context, shares):
+        """Create a batch of new shares.
+
+        :param shares: list of dicts with create() arguments of one share
+                       each.
+
+        All shares are passed to the scheduler in one message, so it can
+        place them at once. If a share can't be created, the ones created
+        before it are still scheduled and the error is raised.
+        """
+        created = []
+        request_specs = []
+        try:
+            for kwargs in shares:
+                share, request_spec = self._create_share(context, **kwargs)
+                created.append(share)
+                request_specs.append(request_spec)
+        finally:
+            if request_specs:
+                self.scheduler_rpcapi.create_shares(
+                    context,
+                    CONF.share_topic,
+                    request_specs,
+                    filter_properties={})
+        return created
+
+    def _create_share(self, context, share_proto, size, name, description,
+                      snapshot=None, availability_zone=None, metadata=None,
+                      share_network_id=None):
+        """Creates share record, returns it with its request spec."""
         policy.check_policy(context, 'share', 'create')
 
         self._check_metadata_properties(context, metadata)
@@ -151,18 +191,7 @@ class API(base.Base):
                         'share_id': share['id'],
                         'snapshot_id': share['snapshot_id'],
                         }
-
-        filter_properties = {}
-
-        self.scheduler_rpcapi.create_share(
-            context,
-            CONF.share_topic,
-            share['id'],
-            snapshot_id,
-            request_spec=request_spec,
-            filter_properties=filter_properties)
-
-        return share
+        return share, request_spec
 
     @policy.wrap_check_policy('share')
     def delete(self, context, share):
@@ -289,64 +318,64 @@ class API(base.Base):
         policy.check_policy(context, 'share', 'get', rv)
         return rv
 
-    def get_all(self, context, search_opts={}):
-        policy.check_policy(context, 'share', 'get_all')
+    def get_all(self, context, search_opts=None, sort_key=None,
+                sort_dir=None, limit=None, offset=None, marker=None,
+                columns_to_join=None):
+        """Return shares matching search_opts, filtered and paged in the DB.
 
-        search_opts = search_opts or {}
-
-        if (context.is_admin and 'all_tenants' in search_opts):
-            # Need to remove all_tenants to pass the filtering below.
-            del search_opts['all_tenants']
-            shares = self.db.share_get_all(context)
-        else:
-            shares = self.db.share_get_all_by_project(context,
-                                                      context.project_id)
+        :param search_opts: dict of share field to expected value
+        :param marker: id of the last share of the previous page
+        :param columns_to_join: share relationships the caller will read,
+                                share_metadata if None
+        """
+        policy.check_policy(context, 'share', 'get_all')
 
+        search_opts = dict(search_opts or {})
         if search_opts:
             LOG.debug(_("Searching by: %s") % str(search_opts))
 
-            results = []
-            not_found = object()
-            for share in shares:
-                for opt, value in search_opts.iteritems():
-                    if share.get(opt, not_found) != value:
-                        break
-                else:
-                    results.append(share)
-            shares = results
-        return shares
+        kwargs = dict(sort_key=sort_key, sort_dir=sort_dir, limit=limit,
+                      offset=offset, marker=marker,
+                      columns_to_join=columns_to_join)
+        if (context.is_admin and 'all_tenants' in search_opts):
+            # all_tenants is a scope, not a filter.
+            del search_opts['all_tenants']
+            return self.db.share_get_all(context, filters=search_opts,
+                                         **kwargs)
+        return self.db.share_get_all_by_project(context,
+                                                context.project_id,
+                                                filters=search_opts,
+                                                **kwargs)
 
     def get_snapshot(self, context, snapshot_id):
         policy.check_policy(context, 'share', 'get_snapshot')
         rv = self.db.share_snapshot_get(context, snapshot_id)
         return dict(rv.iteritems())
 
-    def get_all_snapshots(self, context, search_opts=None):
+    def get_all_snapshots(self, context, search_opts=None, sort_key=None,
+                          sort_dir=None, limit=None, offset=None,
+                          marker=None):
+        """Return snapshots matching search_opts, filtered and paged in
+        the DB.
+        """
         policy.check_policy(context, 'share', 'get_all_snapshots')
 
-        search_opts = search_opts or {}
-
-        if (context.is_admin and 'all_tenants' in search_opts):
-            # Need to remove all_tenants to pass the filtering below.
-            del search_opts['all_tenants']
-            snapshots = self.db.share_snapshot_get_all(context)
-        else:
-            snapshots = self.db.share_snapshot_get_all_by_project(
-                context, context.project_id)
-
+        search_opts = dict(search_opts or {})
         if search_opts:
             LOG.debug(_("Searching by: %s") % str(search_opts))
 
-            results = []
-            not_found = object()
-            for snapshot in snapshots:
-                for opt, value in search_opts.iteritems():
-                    if snapshot.get(opt, not_found) != value:
-                        break
-                else:
-                    results.append(snapshot)
-            snapshots = results
-        return snapshots
+        kwargs = dict(sort_key=sort_key, sort_dir=sort_dir, limit=limit,
+                      offset=offset, marker=marker)
+        if (context.is_admin and 'all_tenants' in search_opts):
+            # all_tenants is a scope, not a filter.
+            del search_opts['all_tenants']
+            return self.db.share_snapshot_get_all(context,
+                                                  filters=search_opts,
+                                                  **kwargs)
+        return self.db.share_snapshot_get_all_by_project(context,
+                                                         context.project_id,
+                                                         filters=search_opts,
+                                                         **kwargs)
 
     def allow_access(self, ctx, share, access_type, access_to):
         """Allow access to share."""
@@ -115,6 +115,32 @@ class ShareDriver(object):
         """Invoked to sure that share is exported."""
         raise NotImplementedError()
 
+    def ensure_shares(self, context, shares, access_rules):
+        """Invoked to re-export a batch of shares on service start.
+
+        :param shares: list of shares to be ensured.
+        :param access_rules: dict mapping share id to the list of active
+                             access rules which should be applied to it.
+
+        :returns: dict mapping the id of every share which could not be
+                  ensured to its error; an exception raised by this method
+                  fails the whole batch.
+
+        Drivers which are able to restore many exports at once should
+        override this, by default shares are ensured one by one.
+        """
+        failures = {}
+        for share in shares:
+            try:
+                self.ensure_share(context, share)
+                self.update_access(context, share,
+                                   access_rules.get(share['id'], []), [])
+            except Exception as e:
+                LOG.exception(_("Failed to re-export share %s"),
+                              share['name'])
+                failures[share['id']] = e
+        return failures
+
     def allow_access(self, context, share, access):
         """Allow access to the share."""
         raise NotImplementedError()
@@ -123,6 +149,24 @@ class ShareDriver(object):
         """Deny access to the share."""
         raise NotImplementedError()
 
+    def update_access(self, context, share, add_rules, delete_rules):
+        """Update access rules of the share.
+
+        :param add_rules: list of access rules to be granted, rules which
+                          are already granted are skipped.
+        :param delete_rules: list of access rules to be revoked.
+
+        Drivers which are able to apply many rules at once should override
+        this, by default rules are applied one by one.
+        """
+        for access in delete_rules:
+            self.deny_access(context, share, access)
+        for access in add_rules:
+            try:
+                self.allow_access(context, share, access)
+            except exception.ShareAccessExists:
+                pass
+
     def check_for_setup_error(self):
         """Check for setup error."""
         pass
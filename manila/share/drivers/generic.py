@@ -17,8 +17,9 @@
 
 import ConfigParser
 import os
-import re
+import pipes
 import shutil
+import threading
 import time
 
 from oslo.config import cfg
@@ -30,8 +31,10 @@ from manila import exception
 from manila.openstack.common import importutils
 from manila.openstack.common import log as logging
 from manila.share import driver
+from manila.share.drivers import nfs_exports
 from manila.share.drivers import service_instance
 from manila import volume
+from manila.volume import waiter
 
 
 LOG = logging.getLogger(__name__)
@@ -59,6 +62,14 @@ share_opts = [
     cfg.IntOpt('max_time_to_attach',
                default=120,
                help="Maximum time to wait for attaching cinder volume."),
+    cfg.IntOpt('volume_status_poll_interval',
+               default=1,
+               help="Interval in seconds between checks of cinder volumes "
+               "the driver waits for."),
+    cfg.IntOpt('volume_status_poll_max_interval',
+               default=8,
+               help="Upper bound the volume status poll interval backs off "
+               "to while no volume changes state."),
     cfg.StrOpt('service_instance_smb_config_path',
                default='$share_mount_path/smb.conf',
                help="Path to smb config in service instance."),
@@ -67,16 +78,75 @@ share_opts = [
                     'CIFS=manila.share.drivers.generic.CIFSHelper',
                     'NFS=manila.share.drivers.generic.NFSHelper',
                 ],
-                help='Specify list of share export helpers.'),
+                help='Specify list of share export helpers. Use '
+                     'manila.share.drivers.generic.CIFSNetConfHelper for '
+                     'CIFS to keep shares in the samba registry instead of '
+                     'uploading smb.conf.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(share_opts)
 
 _ssh_exec = service_instance._ssh_exec
+_ssh_exec_script = service_instance._ssh_exec_script
 synchronized = service_instance.synchronized
 
 
+def _volume_settled(volume):
+    return volume['status'] in ('available', 'error')
+
+
+def _existing_volume(volume_id, predicate):
+    """Wraps a volume waiter predicate for a volume which must not vanish.
+
+    The waiter passes None once the volume is gone, VolumeNotFound is then
+    raised to the waiting caller.
+    """
+    def check(volume):
+        if volume is None:
+            raise exception.VolumeNotFound(volume_id=volume_id)
+        return predicate(volume)
+    return check
+
+
+class DeviceSlots(object):
+    """Reserves names of virtio block devices of one service vm.
+
+    A name stays reserved from the moment it is handed out for an attach
+    until the attach completes, so concurrent attaches to the same vm do
+    not request the same device even before nova lists it as used. Used
+    devices are listed under the same lock, so a listing never predates
+    the release of a name that has been attached meanwhile.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reserved = set()
+
+    def reserve(self, list_used_devices):
+        """Returns free device path, reserving it until release().
+
+        :param list_used_devices: callable returning device paths nova
+                                  reports as used on the vm.
+        """
+        with self._lock:
+            used_devices = list_used_devices()
+            taken = self._reserved.union(device[-1] for device in used_devices
+                                         if '/dev/vd' in device)
+            lit = 'b'
+            while lit in taken:
+                lit = chr(ord(lit) + 1)
+            if lit > 'z':
+                raise exception.ManilaException(
+                    _('No free device names left on service vm.'))
+            self._reserved.add(lit)
+            return '/dev/vd%s' % lit
+
+    def release(self, device_path):
+        with self._lock:
+            self._reserved.discard(device_path[-1])
+
+
 class GenericShareDriver(driver.ExecuteMixin, driver.ShareDriver):
     """Executes commands relating to Shares."""
 
@@ -87,6 +157,7 @@ class GenericShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         self.db = db
         self.configuration.append_config_values(share_opts)
         self._helpers = {}
+        self._device_slots = {}
 
     def check_for_setup_error(self):
         """Returns an error if prerequisites aren't met."""
@@ -97,6 +168,10 @@ class GenericShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         super(GenericShareDriver, self).do_setup(context)
         self.compute_api = compute.API()
         self.volume_api = volume.API()
+        self.volume_waiter = waiter.VolumeStatusWaiter(
+            self.volume_api,
+            interval=self.configuration.volume_status_poll_interval,
+            max_interval=self.configuration.volume_status_poll_max_interval)
         self.service_instance_manager = service_instance.\
                                 ServiceInstanceManager(self.db, self._helpers)
         self.get_service_instance = self.service_instance_manager.\
@@ -140,16 +215,18 @@ class GenericShareDriver(driver.ExecuteMixin, driver.ShareDriver):
     def _mount_device(self, context, share, server, volume):
         """Mounts attached and formatted block device to the directory."""
         mount_path = self._get_mount_path(share)
-        command = ['sudo', 'mkdir', '-p', mount_path, ';']
-        command.extend(['sudo', 'mount', volume['mountpoint'], mount_path])
+        chmod = ['sudo', 'chmod', '777', mount_path]
         try:
-            _ssh_exec(server, command)
+            _ssh_exec_script(server, [
+                ['sudo', 'mkdir', '-p', mount_path],
+                ['sudo', 'mount', volume['mountpoint'], mount_path],
+                chmod,
+            ])
         except exception.ProcessExecutionError as e:
             if 'already mounted' not in e.stderr:
                 raise
             LOG.debug(_('Share %s is already mounted') % share['name'])
-        command = ['sudo', 'chmod', '777', mount_path]
-        _ssh_exec(server, command)
+            _ssh_exec(server, chmod)
 
     def _unmount_device(self, context, share, server):
         """Unmounts device from directory on service vm."""
@@ -168,7 +245,6 @@ class GenericShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         """
         return os.path.join(self.configuration.share_mount_path, share['name'])
 
-    @synchronized
     def _attach_volume(self, context, share, server, volume):
         """Attaches cinder volume to service vm."""
         if volume['status'] == 'in-use':
@@ -181,25 +257,22 @@ class GenericShareDriver(driver.ExecuteMixin, driver.ShareDriver):
                 raise exception.ManilaException(_('Volume %s is already '
                         'attached to another instance') % volume['id'])
         device_path = self._get_device_path(self.admin_context, server)
-        self.compute_api.instance_volume_attach(self.admin_context,
-                                                server['id'],
-                                                volume['id'],
-                                                device_path)
-
-        t = time.time()
-        while time.time() - t < self.configuration.max_time_to_attach:
-            volume = self.volume_api.get(context, volume['id'])
-            if volume['status'] == 'in-use':
-                break
-            elif volume['status'] != 'attaching':
-                raise exception.ManilaException(_('Failed to attach volume %s')
-                                                % volume['id'])
-            time.sleep(1)
-        else:
-            raise exception.ManilaException(_('Volume have not been attached '
-                                              'in %ss. Giving up') %
-                                      self.configuration.max_time_to_attach)
-
+        try:
+            self.compute_api.instance_volume_attach(self.admin_context,
+                                                    server['id'],
+                                                    volume['id'],
+                                                    device_path)
+
+            volume = self.volume_waiter.wait(
+                context, volume['id'],
+                _existing_volume(volume['id'],
+                                 lambda v: v['status'] != 'attaching'),
+                self.configuration.max_time_to_attach)
+        finally:
+            self._release_device_path(server, device_path)
+        if volume['status'] != 'in-use':
+            raise exception.ManilaException(_('Failed to attach volume %s')
+                                            % volume['id'])
         return volume
 
     def _get_volume(self, context, share_id):
@@ -230,7 +303,6 @@ class GenericShareDriver(driver.ExecuteMixin, driver.ShareDriver):
                     _('Error. Ambiguous volume snaphots'))
         return volume_snapshot
 
-    @synchronized
     def _detach_volume(self, context, share, server):
         """Detaches cinder volume from service vm."""
         attached_volumes = [vol.id for vol in
@@ -241,27 +313,29 @@ class GenericShareDriver(driver.ExecuteMixin, driver.ShareDriver):
             self.compute_api.instance_volume_detach(self.admin_context,
                                                     server['id'],
                                                     volume['id'])
-            t = time.time()
-            while time.time() - t < self.configuration.max_time_to_attach:
-                volume = self.volume_api.get(context, volume['id'])
-                if volume['status'] in ('available', 'error'):
-                    break
-                time.sleep(1)
-            else:
-                raise exception.ManilaException(_('Volume have not been '
-                                                  'detached in %ss. Giving up')
-                                       % self.configuration.max_time_to_attach)
+            self.volume_waiter.wait(
+                context, volume['id'],
+                _existing_volume(volume['id'], _volume_settled),
+                self.configuration.max_time_to_attach)
 
     def _get_device_path(self, context, server):
-        """Returns device path for cinder volume attaching."""
-        volumes = self.compute_api.instance_volumes_list(context, server['id'])
-        used_literals = set(volume.device[-1] for volume in volumes
-                            if '/dev/vd' in volume.device)
-        lit = 'b'
-        while lit in used_literals:
-            lit = chr(ord(lit) + 1)
-        device_name = '/dev/vd%s' % lit
-        return device_name
+        """Reserves device path for cinder volume attaching.
+
+        The path must be given back with _release_device_path() once the
+        attach is over.
+        """
+        def list_used_devices():
+            volumes = self.compute_api.instance_volumes_list(context,
+                                                             server['id'])
+            return [volume.device for volume in volumes]
+
+        slots = self._device_slots.setdefault(server['id'], DeviceSlots())
+        return slots.reserve(list_used_devices)
+
+    def _release_device_path(self, server, device_path):
+        slots = self._device_slots.get(server['id'])
+        if slots:
+            slots.release(device_path)
 
     def _allocate_container(self, context, share, snapshot=None):
         """Creates cinder volume, associated to share by name."""
@@ -273,19 +347,13 @@ class GenericShareDriver(driver.ExecuteMixin, driver.ShareDriver):
                      self.configuration.volume_name_template % share['id'], '',
                      snapshot=volume_snapshot)
 
-        t = time.time()
-        while time.time() - t < self.configuration.max_time_to_create_volume:
-            if volume['status'] == 'available':
-                break
-            if volume['status'] == 'error':
-                raise exception.ManilaException(_('Failed to create volume'))
-            time.sleep(1)
-            volume = self.volume_api.get(context, volume['id'])
-        else:
-            raise exception.ManilaException(_('Volume have not been created '
-                                              'in %ss. Giving up') %
-                                 self.configuration.max_time_to_create_volume)
-
+        if volume['status'] not in ('available', 'error'):
+            volume = self.volume_waiter.wait(
+                context, volume['id'],
+                _existing_volume(volume['id'], _volume_settled),
+                self.configuration.max_time_to_create_volume)
+        if volume['status'] == 'error':
+            raise exception.ManilaException(_('Failed to create volume'))
         return volume
 
     def _deallocate_container(self, context, share):
@@ -293,19 +361,10 @@ class GenericShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         volume = self._get_volume(context, share['id'])
         if volume:
             self.volume_api.delete(context, volume['id'])
-            t = time.time()
-            while (time.time() - t <
-                   self.configuration.max_time_to_create_volume):
-                try:
-                    volume = self.volume_api.get(context, volume['id'])
-                except exception.VolumeNotFound:
-                    LOG.debug(_('Volume was deleted succesfully'))
-                    break
-                time.sleep(1)
-            else:
-                raise exception.ManilaException(_('Volume have not been '
-                                                  'deleted in %ss. Giving up')
-                               % self.configuration.max_time_to_create_volume)
+            self.volume_waiter.wait(
+                context, volume['id'], lambda v: v is None,
+                self.configuration.max_time_to_create_volume)
+            LOG.debug(_('Volume was deleted succesfully'))
 
     def get_share_stats(self, refresh=False):
         """Get share status.
@@ -438,6 +497,21 @@ class GenericShareDriver(driver.ExecuteMixin, driver.ShareDriver):
                                                 access['access_type'],
                                                 access['access_to'])
 
+    def update_access(self, context, share, add_rules, delete_rules):
+        """Update access rules of the share within one helper call."""
+        if not share['share_network_id'] and not add_rules:
+            return
+        server = self.get_service_instance(self.admin_context,
+                                    share_network_id=share['share_network_id'],
+                                    create=False)
+        if not server:
+            if not add_rules:
+                return
+            raise exception.ManilaException('Server not found. Try to '
+                                            'restart manila share service')
+        self._get_helper(share).update_access(server, share['name'],
+                                              add_rules, delete_rules)
+
     def _get_helper(self, share):
         if share['share_proto'].startswith('NFS'):
             return self._helpers['NFS']
@@ -465,6 +539,9 @@ class GenericShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         sn_id = share_network["id"]
         msg = _("Removing share infrastructure for share network '%s'.")
         LOG.debug(msg % sn_id)
+        server = self.service_instance_manager.share_networks_servers.get(
+            sn_id, {})
+        self._device_slots.pop(server.get('id'), None)
         try:
             self.delete_service_instance(self.admin_context, sn_id)
         except Exception as e:
@@ -499,16 +576,51 @@ class NASHelperBase(object):
         """Deny access to the host."""
         raise NotImplementedError()
 
+    def update_access(self, server, share_name, add_rules, delete_rules):
+        """Allow and deny access to the hosts of given access rules."""
+        for access in delete_rules:
+            self.deny_access(server, share_name, access['access_type'],
+                             access['access_to'])
+        for access in add_rules:
+            try:
+                self.allow_access(server, share_name, access['access_type'],
+                                  access['access_to'])
+            except exception.ShareAccessExists:
+                pass
+
+    @staticmethod
+    def _validate_access_rules(rules):
+        for access in rules:
+            if access['access_type'] != 'ip':
+                reason = _('only ip access type allowed')
+                raise exception.InvalidShareAccess(reason=reason)
+
 
 class NFSHelper(NASHelperBase):
     """Interface to work with share."""
 
+    def __init__(self, *args):
+        super(NFSHelper, self).__init__(*args)
+        self.configuration.append_config_values(
+            nfs_exports.nfs_exports_opts)
+        self._export_tables = {}
+
+    def _get_exports(self, server):
+        """Returns export table of service vm, loading it on first use."""
+        exports = self._export_tables.get(server['id'])
+        if exports is None:
+            exports = nfs_exports.ExportTable(
+                lambda: _ssh_exec(server, ['sudo', 'exportfs', '-v'])[0])
+            self._export_tables[server['id']] = exports
+        return exports
+
     def create_export(self, server, share_name, recreate=False):
         """Create new export, delete old one if exists."""
         return ':'.join([server['ip'],
             os.path.join(self.configuration.share_mount_path, share_name)])
 
     def init_helper(self, server):
+        self._export_tables.pop(server['id'], None)
         try:
             _ssh_exec(server, ['sudo', 'exportfs'])
         except exception.ProcessExecutionError as e:
@@ -528,28 +640,69 @@ class NFSHelper(NASHelperBase):
         if access_type != 'ip':
             reason = 'only ip access type allowed'
             raise exception.InvalidShareAccess(reason)
-        #check if presents in export
-        out, _ = _ssh_exec(server, ['sudo', 'exportfs'])
-        out = re.search(re.escape(local_path) + '[\s\n]*' + re.escape(access),
-                        out)
-        if out is not None:
+        if self._get_exports(server).has_client(local_path, access):
             raise exception.ShareAccessExists(access_type=access_type,
                                               access=access)
-        _ssh_exec(server, ['sudo', 'exportfs', '-o', 'rw,no_subtree_check',
-                  ':'.join([access, local_path])])
+        self._change_exports(server, local_path, [access], [])
 
     def deny_access(self, server, share_name, access_type, access,
                     force=False):
         """Deny access to the host."""
         local_path = os.path.join(self.configuration.share_mount_path,
                                   share_name)
-        _ssh_exec(server, ['sudo', 'exportfs', '-u',
-                           ':'.join([access, local_path])])
+        self._change_exports(server, local_path, [], [access])
+
+    def update_access(self, server, share_name, add_rules, delete_rules):
+        """Change exports of all given hosts with single exportfs calls."""
+        self._validate_access_rules(add_rules)
+        local_path = os.path.join(self.configuration.share_mount_path,
+                                  share_name)
+        delete = [access['access_to'] for access in delete_rules]
+        clients = self._get_exports(server).clients(local_path)
+        clients.difference_update(delete)
+        add = []
+        for access in add_rules:
+            if access['access_to'] not in clients:
+                clients.add(access['access_to'])
+                add.append(access['access_to'])
+        self._change_exports(server, local_path, add, delete)
+
+    def _change_exports(self, server, local_path, add, delete):
+        """Applies changes of clients of the export and records them."""
+        exports = self._get_exports(server)
+        exports_file = self.configuration.nfs_exports_file
+        if exports_file:
+            if not (add or delete):
+                return
+            exports.update(local_path, add, delete)
+            content = exports.render(self.configuration.share_mount_path)
+            try:
+                _ssh_exec_script(server, [
+                    ['sudo', 'mkdir', '-p', os.path.dirname(exports_file)],
+                    ['echo', pipes.quote(content), '|', 'sudo', 'tee',
+                     exports_file, '>', '/dev/null'],
+                    ['sudo', 'exportfs', '-ra'],
+                ])
+            except exception.ProcessExecutionError:
+                exports.invalidate()
+                raise
+            return
+        if delete:
+            _ssh_exec(server, ['sudo', 'exportfs', '-u'] +
+                      [':'.join([access, local_path]) for access in delete])
+            exports.update(local_path, remove=delete)
+        if add:
+            _ssh_exec(server, ['sudo', 'exportfs', '-o',
+                               nfs_exports.EXPORT_OPTIONS] +
+                      [':'.join([access, local_path]) for access in add])
+            exports.update(local_path, add=add)
 
 
 class CIFSHelper(NASHelperBase):
     """Class provides functionality to operate with cifs shares"""
 
+    _restart_command = ['sudo', 'pkill', '-HUP', 'smbd']
+
     def __init__(self, *args):
         """Store executor and configuration path."""
         super(CIFSHelper, self).__init__(*args)
@@ -575,25 +728,23 @@ class CIFSHelper(NASHelperBase):
         self._recreate_template_config()
         local_config = self._create_local_config(server['share_network_id'])
         config_dir = os.path.dirname(self.config_path)
-        try:
-            _ssh_exec(server, ['sudo', 'mkdir', config_dir])
-        except exception.ProcessExecutionError as e:
-            if 'File exists' not in e.stderr:
-                raise
-            LOG.debug(_('Directory %s already exists') % config_dir)
-        _ssh_exec(server, ['sudo', 'chown',
-                           self.configuration.service_instance_user,
-                           config_dir])
-        _ssh_exec(server, ['touch', self.config_path])
+        _ssh_exec_script(server, [
+            ['sudo', 'mkdir', '-p', config_dir],
+            ['sudo', 'chown', self.configuration.service_instance_user,
+             config_dir],
+            ['touch', self.config_path],
+        ])
         try:
             _ssh_exec(server, ['sudo', 'stop', 'smbd'])
         except exception.ProcessExecutionError as e:
             if 'Unknown instance' not in e.stderr:
                 raise
             LOG.debug(_('Samba service is not running'))
-        self._write_remote_config(local_config, server)
-        _ssh_exec(server, ['sudo', 'smbd', '-s', self.config_path])
-        self._restart_service(server)
+        self._write_remote_config(local_config, server, reload=False)
+        _ssh_exec_script(server, [
+            ['sudo', 'smbd', '-s', self.config_path],
+            self._restart_command,
+        ])
 
     def create_export(self, server, share_name, recreate=False):
         """Create new export, delete old one if exists."""
@@ -620,7 +771,6 @@ class CIFSHelper(NASHelperBase):
         parser.set(share_name, 'hosts allow', '127.0.0.1')
         self._update_config(parser, config)
         self._write_remote_config(config, server)
-        self._restart_service(server)
         return '//%s/%s' % (server['ip'], share_name)
 
     def remove_export(self, server, share_name):
@@ -632,15 +782,19 @@ class CIFSHelper(NASHelperBase):
         if parser.has_section(share_name):
             parser.remove_section(share_name)
         self._update_config(parser, config)
-        self._write_remote_config(config, server)
+        self._write_remote_config(config, server, reload=False)
         _ssh_exec(server, ['sudo', 'smbcontrol', 'all', 'close-share',
                   share_name])
 
     @synchronized
-    def _write_remote_config(self, config, server):
+    def _write_remote_config(self, config, server, reload=True):
+        """Upload config to service vm, reloading smbd in the same exec."""
         with open(config, 'r') as f:
             cfg = "'%s'" % f.read()
-        _ssh_exec(server, ['echo %s > %s' % (cfg, self.config_path)])
+        commands = [['echo %s > %s' % (cfg, self.config_path)]]
+        if reload:
+            commands.append(self._restart_command)
+        _ssh_exec_script(server, commands)
 
     def allow_access(self, server, share_name, access_type, access):
         """Allow access to the host."""
@@ -660,7 +814,6 @@ class CIFSHelper(NASHelperBase):
         parser.set(share_name, 'hosts allow', hosts)
         self._update_config(parser, config)
         self._write_remote_config(config, server)
-        self._restart_service(server)
 
     def deny_access(self, server, share_name, access_type, access,
                     force=False):
@@ -677,7 +830,23 @@ class CIFSHelper(NASHelperBase):
             if not force:
                 raise
         self._write_remote_config(config, server)
-        self._restart_service(server)
+
+    def update_access(self, server, share_name, add_rules, delete_rules):
+        """Change allowed hosts of the share with one config upload."""
+        self._validate_access_rules(add_rules)
+        config = self._get_local_config(server['share_network_id'])
+        parser = ConfigParser.ConfigParser()
+        parser.read(config)
+        hosts = parser.get(share_name, 'hosts allow').split()
+        for access in delete_rules:
+            if access['access_to'] in hosts:
+                hosts.remove(access['access_to'])
+        for access in add_rules:
+            if access['access_to'] not in hosts:
+                hosts.append(access['access_to'])
+        parser.set(share_name, 'hosts allow', ' '.join(hosts))
+        self._update_config(parser, config)
+        self._write_remote_config(config, server)
 
     def _recreate_template_config(self):
         """Create new SAMBA configuration file."""
@@ -689,9 +858,6 @@ class CIFSHelper(NASHelperBase):
         parser.set('global', 'server string', '%h server (Samba, Openstack)')
         self._update_config(parser, self.smb_template_config)
 
-    def _restart_service(self, server):
-        _ssh_exec(server, 'sudo pkill -HUP smbd'.split())
-
     def _update_config(self, parser, config):
         """Check if new configuration is correct and save it."""
         #Check that configuration is correct
@@ -701,3 +867,132 @@ class CIFSHelper(NASHelperBase):
         #save it
         with open(config, 'w') as fp:
             parser.write(fp)
+
+
+class CIFSNetConfHelper(NASHelperBase):
+    """Manages CIFS shares in samba registry of service vm by net conf.
+
+    Unlike CIFSHelper, no local copy of smb.conf is kept and uploaded:
+    each change touches only keys of one share and smbd picks it up from
+    the registry without being reloaded. Several net conf calls needed
+    for one change are sent in a single ssh exec.
+    """
+
+    _share_parameters = (
+        ('browseable', 'yes'),
+        ('read only', 'no'),
+        ('create mask', '0755'),
+        ('hosts deny', '0.0.0.0/0'),  # denying all ips
+        ('hosts allow', '127.0.0.1'),
+    )
+
+    def __init__(self, *args):
+        super(CIFSNetConfHelper, self).__init__(*args)
+        self.config_path = self.configuration.service_instance_smb_config_path
+
+    @staticmethod
+    def _net_conf(*args):
+        return ['sudo', 'net', 'conf'] + [pipes.quote(arg) for arg in args]
+
+    def init_helper(self, server):
+        config_dir = os.path.dirname(self.config_path)
+        _ssh_exec_script(server, [
+            ['sudo', 'mkdir', '-p', config_dir],
+            ['sudo', 'chown', self.configuration.service_instance_user,
+             config_dir],
+            ['echo', pipes.quote('[global]\ninclude = registry'), '>',
+             self.config_path],
+            self._net_conf('setparm', 'global', 'security', 'user'),
+            self._net_conf('setparm', 'global', 'server string',
+                           '%h server (Samba, Openstack)'),
+        ])
+        try:
+            _ssh_exec(server, ['sudo', 'stop', 'smbd'])
+        except exception.ProcessExecutionError as e:
+            if 'Unknown instance' not in e.stderr:
+                raise
+            LOG.debug(_('Samba service is not running'))
+        _ssh_exec(server, ['sudo', 'smbd', '-s', self.config_path])
+
+    def create_export(self, server, share_name, recreate=False):
+        """Create share in samba registry with all its parameters."""
+        local_path = os.path.join(self.configuration.share_mount_path,
+                                  share_name)
+        commands = []
+        if recreate:
+            commands.append(self._net_conf('delshare', share_name) +
+                            ['||', 'true'])
+        commands.append(self._net_conf('addshare', share_name, local_path,
+                                       'writeable=y', 'guest_ok=y'))
+        for name, value in self._share_parameters:
+            commands.append(self._net_conf('setparm', share_name, name,
+                                           value))
+        try:
+            _ssh_exec_script(server, commands)
+        except exception.ProcessExecutionError as e:
+            if 'already exists' not in e.stderr:
+                raise
+            msg = _('Share section %r already defined.') % share_name
+            raise exception.ShareBackendException(msg=msg)
+        return '//%s/%s' % (server['ip'], share_name)
+
+    def remove_export(self, server, share_name):
+        """Remove share definition from samba registry."""
+        close_share = ['sudo', 'smbcontrol', 'all', 'close-share',
+                       pipes.quote(share_name)]
+        try:
+            _ssh_exec_script(server, [self._net_conf('delshare', share_name),
+                                      close_share])
+        except exception.ProcessExecutionError as e:
+            if 'SBC_ERR_NO_SUCH_SERVICE' not in e.stderr:
+                raise
+            _ssh_exec(server, close_share)
+
+    @synchronized
+    def allow_access(self, server, share_name, access_type, access):
+        """Add to allow hosts additional access rule."""
+        if access_type != 'ip':
+            reason = _('only ip access type allowed')
+            raise exception.InvalidShareAccess(reason=reason)
+        hosts = self._get_allow_hosts(server, share_name)
+        if access in hosts:
+            raise exception.ShareAccessExists(access_type=access_type,
+                                              access=access)
+        hosts.append(access)
+        self._set_allow_hosts(server, share_name, hosts)
+
+    @synchronized
+    def deny_access(self, server, share_name, access_type, access,
+                    force=False):
+        """Remove from allow hosts permit rule."""
+        try:
+            hosts = self._get_allow_hosts(server, share_name)
+        except exception.ProcessExecutionError as e:
+            if not ('does not exist' in e.stdout and force):
+                raise
+            return
+        if access in hosts:
+            hosts.remove(access)
+            self._set_allow_hosts(server, share_name, hosts)
+
+    @synchronized
+    def update_access(self, server, share_name, add_rules, delete_rules):
+        """Change allowed hosts of the share with one setparm call."""
+        self._validate_access_rules(add_rules)
+        hosts = self._get_allow_hosts(server, share_name)
+        deleted = [access['access_to'] for access in delete_rules]
+        new_hosts = [host for host in hosts if host not in deleted]
+        for access in add_rules:
+            if access['access_to'] not in new_hosts:
+                new_hosts.append(access['access_to'])
+        if new_hosts != hosts:
+            self._set_allow_hosts(server, share_name, new_hosts)
+
+    def _get_allow_hosts(self, server, share_name):
+        out, _ = _ssh_exec(server, self._net_conf('getparm', share_name,
+                                                  'hosts allow'))
+        return out.split()
+
+    def _set_allow_hosts(self, server, share_name, hosts):
+        _ssh_exec(server, self._net_conf('setparm', share_name,
+                                         'hosts allow', ' '.join(hosts)))
@@ -25,6 +25,9 @@ from pipes import quote as shellquote
 import re
 import xml.etree.cElementTree as etree
 
+import eventlet
+from eventlet import event
+
 from manila import exception
 from manila.openstack.common import log as logging
 from manila.share import driver
@@ -42,12 +45,24 @@ GlusterfsManilaShare_opts = [
     cfg.StrOpt('glusterfs_mount_point_base',
                default='$state_path/mnt',
                help='Base dir containing mount points for Gluster volumes.'),
+    cfg.FloatOpt('glusterfs_export_dir_flush_interval',
+                 default=0.5,
+                 help='Seconds during which access rule changes are '
+                      'collected before they are applied to the Gluster '
+                      'volume with a single "gluster volume set".'),
+    cfg.BoolOpt('glusterfs_share_quota',
+                default=False,
+                help='Limit the size of shares with Gluster directory '
+                     'quotas and report free capacity net of the limits. '
+                     'Quota has to be enabled on the Gluster volume.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(GlusterfsManilaShare_opts)
 
 _nfs_export_dir = 'nfs.export-dir'
+_glusterd_vol_info = '/var/lib/glusterd/vols/%s/info'
+_GiB = 1024 ** 3
 
 
 class GlusterAddress(object):
@@ -68,7 +83,10 @@ class GlusterAddress(object):
         self.export = ':/'.join([self.host, self.volume])
 
     def make_gluster_args(self, *args):
-        args = ('gluster',) + args
+        return self.make_remote_args('gluster', *args)
+
+    def make_remote_args(self, *args):
+        """Returns execute args to run args on the host of the volume."""
         kw = {}
         if self.remote_user:
             args = ('ssh', '@'.join([self.remote_user, self.host]),
@@ -78,6 +96,79 @@ class GlusterAddress(object):
         return args, kw
 
 
+class ExportDirQueue(object):
+    """Cached export dir list of a Gluster volume with queued changes.
+
+    Changes are callables which take the export dir list, modify it in
+    place and return True if they left it intact. A single greenthread
+    collects them for interval seconds and applies all of them with one
+    store of the list. The list is kept between flushes along with the
+    version of the volume options it was read at, and is read again only
+    when that version changes.
+    """
+
+    def __init__(self, load, store, get_version, interval):
+        self._load = load
+        self._store = store
+        self._get_version = get_version
+        self.interval = interval
+        self._export_dirs = None
+        self._version = None
+        self._pending = []
+        self._flusher = None
+
+    def change(self, cbk):
+        """Queues cbk and blocks until the volume is updated."""
+        done = event.Event()
+        self._pending.append((cbk, done))
+        if self._flusher is None:
+            self._flusher = eventlet.spawn(self._flush_loop)
+        return done.wait()
+
+    def invalidate(self):
+        """Drops the cached list, it is read again on next flush."""
+        self._export_dirs = None
+        self._version = None
+
+    def _flush_loop(self):
+        try:
+            while self._pending:
+                eventlet.sleep(self.interval)
+                pending, self._pending = self._pending, []
+                self._flush(pending)
+        finally:
+            self._flusher = None
+
+    def _get_export_dirs(self):
+        version = self._get_version()
+        if (self._export_dirs is None or version is None or
+                version != self._version):
+            self._export_dirs = self._load()
+            self._version = version
+        return self._export_dirs
+
+    def _flush(self, pending):
+        try:
+            export_dirs = self._get_export_dirs()[:]
+            changed = False
+            for cbk, done in pending:
+                if not cbk(export_dirs):
+                    changed = True
+            if changed:
+                self._store(export_dirs)
+                self._export_dirs = export_dirs
+                if self._version is not None:
+                    # glusterd bumps the version once per volume set.
+                    self._version += 1
+        except Exception as exc:
+            self.invalidate()
+            for cbk, done in pending:
+                done.send_exception(exc)
+        else:
+            for cbk, done in pending:
+                done.send()
+
+
 class GlusterfsShareDriver(driver.ExecuteMixin, driver.ShareDriver):
     """
     Glusterfs Specific driver
@@ -88,7 +179,14 @@ class GlusterfsShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         self.db = db
         self._helpers = None
         self.gluster_address = None
+        self._quotas = None
         self.configuration.append_config_values(GlusterfsManilaShare_opts)
+        self._export_dir_queue = ExportDirQueue(
+            lambda: self._get_export_dir_list(),
+            lambda export_dir_list: self._set_export_dir_list(
+                export_dir_list),
+            lambda: self._get_volume_version(),
+            self.configuration.glusterfs_export_dir_flush_interval)
 
     def do_setup(self, context):
         """Native mount the Gluster volume."""
@@ -108,8 +206,14 @@ class GlusterfsShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         self._ensure_gluster_vol_mounted()
 
     def check_for_setup_error(self):
-        """Is called after do_setup method. Nothing to do."""
-        pass
+        """Checks that directory quotas can be listed if they are used."""
+        if self.configuration.glusterfs_share_quota:
+            try:
+                self._quotas = self._get_quota_list()
+            except exception.ProcessExecutionError:
+                raise exception.GlusterfsException(
+                    _('Unable to list quotas of Gluster volume %s, is quota '
+                      'enabled on it?') % self.gluster_address.volume)
 
     def _get_mount_point_for_gluster_vol(self):
         """Return mount point for gluster volume."""
@@ -185,6 +289,78 @@ class GlusterfsShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         else:
             return []
 
+    def _get_volume_version(self):
+        """Returns version of the volume options kept by glusterd.
+
+        Returns None if it can't be read, the export dir list is then read
+        from the volume info on every flush.
+        """
+        args, kw = self.gluster_address.make_remote_args(
+            'cat', _glusterd_vol_info % self.gluster_address.volume)
+        try:
+            out, err = self._execute(*args, **kw)
+        except exception.ProcessExecutionError as exc:
+            LOG.warn(_("Unable to read version of Gluster volume: %s"),
+                     exc.stderr)
+            return None
+        for line in out.splitlines():
+            if line.startswith('version='):
+                try:
+                    return int(line.split('=', 1)[1])
+                except ValueError:
+                    break
+        return None
+
+    def _get_quota_list(self):
+        """Returns dict of share paths to their hard limit and used bytes.
+
+        All directory quotas of the volume are listed with a single call.
+        """
+        args, kw = self.gluster_address.make_gluster_args(
+            '--xml', 'volume', 'quota', self.gluster_address.volume, 'list')
+        try:
+            out, err = self._execute(*args, **kw)
+        except exception.ProcessExecutionError as exc:
+            LOG.error(_("Error retrieving quota list: %s") % exc.stderr)
+            raise
+
+        if not out:
+            raise exception.GlusterfsException(
+                      'Empty answer from gluster command'
+                  )
+
+        quotas = {}
+        for limit in etree.fromstring(out).findall('.//volQuota/limit'):
+            try:
+                quotas[limit.find('path').text] = (
+                    int(limit.find('hard_limit').text),
+                    int(limit.find('used_space').text))
+            except (AttributeError, TypeError, ValueError):
+                LOG.warn(_("Skipping unparsable quota entry of %s"),
+                         limit.findtext('path'))
+        return quotas
+
+    def _set_share_quota(self, share):
+        args, kw = self.gluster_address.make_gluster_args(
+            'volume', 'quota', self.gluster_address.volume, 'limit-usage',
+            '/' + share['name'], '%dGB' % share['size'])
+        self._execute(*args, **kw)
+        if self._quotas is not None:
+            self._quotas['/' + share['name']] = (share['size'] * _GiB, 0)
+
+    def _remove_share_quota(self, share):
+        args, kw = self.gluster_address.make_gluster_args(
+            'volume', 'quota', self.gluster_address.volume, 'remove',
+            '/' + share['name'])
+        try:
+            self._execute(*args, **kw)
+        except exception.ProcessExecutionError as exc:
+            LOG.warn(_("Unable to remove quota of share %(share)s: "
+                       "%(err)s"), {'share': share['name'],
+                                    'err': exc.stderr})
+        if self._quotas is not None:
+            self._quotas.pop('/' + share['name'], None)
+
     def _ensure_gluster_vol_mounted(self):
         """Ensure that a Gluster volume is native-mounted on Manila host.
         """
@@ -216,6 +392,17 @@ class GlusterfsShareDriver(driver.ExecuteMixin, driver.ShareDriver):
             LOG.error('Unable to create share %s', share['name'])
             raise
 
+        if self.configuration.glusterfs_share_quota:
+            try:
+                self._set_share_quota(share)
+            except exception.ProcessExecutionError as exc:
+                LOG.error(_('Unable to set quota of share %(share)s: '
+                            '%(err)s'), {'share': share['name'],
+                                         'err': exc.stderr})
+                self._execute('rm', '-rf', local_share_path,
+                              run_as_root=True)
+                raise
+
         export_location = os.path.join(self.gluster_address.qualified,
                                        share['name'])
         return export_location
@@ -223,6 +410,8 @@ class GlusterfsShareDriver(driver.ExecuteMixin, driver.ShareDriver):
     def delete_share(self, context, share):
         """Remove a directory that served as a share in a Gluster volume."""
         local_share_path = self._get_local_share_path(share)
+        if self.configuration.glusterfs_share_quota:
+            self._remove_share_quota(share)
         cmd = ['rm', '-rf', local_share_path]
         try:
             self._execute(*cmd, run_as_root=True)
@@ -255,16 +444,20 @@ class GlusterfsShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         reduct False) if it makes a change on dl
 
         cbk will be called with dl being  list of currently exported dirs and
-        acc being a textual specification derived from access.
+        acc being a textual specification derived from access. Changes of
+        concurrent calls are applied to the volume together.
         """
 
         if access['access_type'] != 'ip':
             raise exception.InvalidShareAccess('only ip access type allowed')
-        export_dir_list = self._get_export_dir_list()
-        access_spec = "/%s(%s)" % (share['name'], access['access_to'])
-        if cbk(export_dir_list, access_spec):
-            return
+        access_spec = self._get_access_spec(share, access)
+        self._export_dir_queue.change(lambda dl: cbk(dl, access_spec))
 
+    @staticmethod
+    def _get_access_spec(share, access):
+        return "/%s(%s)" % (share['name'], access['access_to'])
+
+    def _set_export_dir_list(self, export_dir_list):
         export_dir_new = ",".join(export_dir_list)
         try:
             args, kw = self.gluster_address.make_gluster_args(
@@ -287,6 +480,66 @@ class GlusterfsShareDriver(driver.ExecuteMixin, driver.ShareDriver):
                             lambda dl, acc:
                                 True if acc not in dl else dl.remove(acc))
 
+    def update_access(self, context, share, add_rules, delete_rules):
+        """Apply all given rules with a single export list update."""
+        for access in add_rules + delete_rules:
+            if access['access_type'] != 'ip':
+                raise exception.InvalidShareAccess(
+                    'only ip access type allowed')
+
+        def apply_rules(export_dir_list):
+            export_dir_old = export_dir_list[:]
+            for access in delete_rules:
+                access_spec = self._get_access_spec(share, access)
+                if access_spec in export_dir_list:
+                    export_dir_list.remove(access_spec)
+            for access in add_rules:
+                access_spec = self._get_access_spec(share, access)
+                if access_spec not in export_dir_list:
+                    export_dir_list.append(access_spec)
+            return export_dir_list == export_dir_old
+
+        self._export_dir_queue.change(apply_rules)
+
+    def _update_share_status(self):
+        """Retrieve capacity of the Gluster volume and its shares."""
+
+        LOG.debug(_("Updating share status"))
+        data = {}
+        backend_name = self.configuration.safe_get('share_backend_name')
+        data["share_backend_name"] = backend_name or 'GlusterFS'
+        data["vendor_name"] = 'Red Hat'
+        data["driver_version"] = '1.0'
+        data["storage_protocol"] = 'NFS'
+        data['reserved_percentage'] = \
+            self.configuration.reserved_share_percentage
+        data['QoS_support'] = False
+
+        data['total_capacity_gb'] = 0
+        data['free_capacity_gb'] = 0
+        try:
+            stat = os.statvfs(self._get_mount_point_for_gluster_vol())
+        except OSError as exc:
+            LOG.error(_("Error retrieving volume status: %s") % exc)
+            self._stats = data
+            return
+        total = stat.f_blocks * stat.f_frsize
+        free = stat.f_bavail * stat.f_frsize
+
+        if self.configuration.glusterfs_share_quota:
+            try:
+                self._quotas = self._get_quota_list()
+            except Exception:
+                LOG.exception(_("Using quota list of last status update."))
+            if self._quotas is not None:
+                allocated = sum(hard_limit for hard_limit, used
+                                in self._quotas.values())
+                free = min(free, max(total - allocated, 0))
+
+        data['total_capacity_gb'] = float(total) / _GiB
+        data['free_capacity_gb'] = float(free) / _GiB
+        self._stats = data
+
     def get_network_allocations_number(self):
         """GlusterFS driver does not need to create VIFS"""
         return 0
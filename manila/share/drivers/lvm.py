@@ -22,12 +22,13 @@ LVM Driver for shares.
 import ConfigParser
 import math
 import os
-import re
+import time
 
 from manila import exception
 from manila.openstack.common import importutils
 from manila.openstack.common import log as logging
 from manila.share import driver
+from manila.share.drivers import nfs_exports
 from manila import utils
 
 from oslo.config import cfg
@@ -58,12 +59,59 @@ share_opts = [
                     'NFS=manila.share.drivers.lvm.NFSHelper',
                 ],
                 help='Specify list of share export helpers.'),
+    cfg.StrOpt('share_lvm_thin_pool',
+               default=None,
+               help='Name of thin pool LV in the share volume group. If set, '
+                    'shares and snapshots are thin provisioned in it and '
+                    'shares are created from snapshots as writable thin '
+                    'snapshots, without copying data. share_lvm_mirrors is '
+                    'ignored in this mode.'),
+    cfg.IntOpt('share_lvm_copy_chunk_mb',
+               default=1024,
+               help='Size in MiB of chunks volumes are copied in when shares '
+                    'are created from snapshots. Chunks holding no blocks '
+                    'used by the filesystem of the snapshot are skipped.'),
+    cfg.IntOpt('share_lvm_copy_bps_limit',
+               default=0,
+               help='Limit in bytes per second of bandwidth of all volume '
+                    'copies of the backend together. 0 means no limit.'),
+    cfg.StrOpt('share_lvm_copy_ionice',
+               default=None,
+               help='Arguments of ionice to run volume copies with, e.g. '
+                    '"-c3" to copy only when disks are otherwise idle.'),
+    cfg.FloatOpt('share_lvm_max_over_subscription_ratio',
+                 default=20.0,
+                 help='Ratio of provisioned size of thin shares to size of '
+                      'the thin pool up to which the backend is reported '
+                      'to have free capacity.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(share_opts)
 
 
+class CopyThrottle(object):
+    """Paces chunks of concurrent copies to stay under a bandwidth limit.
+
+    Each chunk reserves the next slot of nbytes / rate seconds and waits
+    until it begins, so copies sharing the throttle split the bandwidth
+    between them.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._next = time.time()
+
+    def consume(self, nbytes):
+        if not self.rate:
+            return
+        now = time.time()
+        start = max(now, self._next)
+        self._next = start + float(nbytes) / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
 class LVMShareDriver(driver.ExecuteMixin, driver.ShareDriver):
     """Executes commands relating to Shares."""
 
@@ -73,6 +121,8 @@ class LVMShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         self.db = db
         self.configuration.append_config_values(share_opts)
         self._helpers = None
+        self._copy_throttle = CopyThrottle(
+            self.configuration.share_lvm_copy_bps_limit)
 
     def check_for_setup_error(self):
         """Returns an error if prerequisites aren't met."""
@@ -86,6 +136,14 @@ class LVMShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         if not self.configuration.share_export_ip:
             msg = (_("share_export_ip doesn't specified"))
             raise exception.InvalidParameterValue(err=msg)
+        if self.configuration.share_lvm_thin_pool:
+            try:
+                self._execute('lvs', '--noheadings', '-o', 'name',
+                              self._thin_pool_path(), run_as_root=True)
+            except exception.ProcessExecutionError:
+                msg = (_("thin pool %s doesn't exist")
+                       % self._thin_pool_path())
+                raise exception.InvalidParameterValue(err=msg)
 
     def do_setup(self, context):
         """Any initialization the volume driver does while starting."""
@@ -112,11 +170,20 @@ class LVMShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         escaped_name = share['name'].replace('-', '--')
         return "/dev/mapper/%s-%s" % (escaped_group, escaped_name)
 
+    def _thin_pool_path(self):
+        return '%s/%s' % (self.configuration.share_volume_group,
+                          self.configuration.share_lvm_thin_pool)
+
     def _allocate_container(self, share):
         sizestr = '%sG' % share['size']
-        cmd = ['lvcreate', '-L', sizestr, '-n', share['name'],
-               self.configuration.share_volume_group]
-        if self.configuration.share_lvm_mirrors:
+        if self.configuration.share_lvm_thin_pool:
+            cmd = ['lvcreate', '-V', sizestr, '-T', self._thin_pool_path(),
+                   '-n', share['name']]
+        else:
+            cmd = ['lvcreate', '-L', sizestr, '-n', share['name'],
+                   self.configuration.share_volume_group]
+        if (self.configuration.share_lvm_mirrors and
+                not self.configuration.share_lvm_thin_pool):
             cmd += ['-m', self.configuration.share_lvm_mirrors, '--nosync']
             terras = int(sizestr[:-1]) / 1024.0
             if terras >= 1.5:
@@ -188,8 +255,56 @@ class LVMShareDriver(driver.ExecuteMixin, driver.ShareDriver):
             data['total_capacity_gb'] = float(share[1])
             data['free_capacity_gb'] = float(share[2])
 
+        if self.configuration.share_lvm_thin_pool:
+            data.update(self._get_thin_pool_stats())
+
         self._stats = data
 
+    def _get_thin_pool_stats(self):
+        """Returns capacity of thin pool and its over-subscription.
+
+        Free capacity is what can still be provisioned before the ratio of
+        provisioned size to pool size reaches the configured maximum.
+        """
+        try:
+            out, err = self._execute(
+                'lvs', '--noheadings', '--nosuffix', '--unit=G',
+                '--separator', ':',
+                '-o', 'lv_name,lv_size,pool_lv,data_percent,metadata_percent',
+                self.configuration.share_volume_group, run_as_root=True)
+        except exception.ProcessExecutionError as exc:
+            LOG.error(_("Error retrieving thin pool status: %s") % exc.stderr)
+            return {}
+
+        pool = self.configuration.share_lvm_thin_pool
+        ratio = self.configuration.share_lvm_max_over_subscription_ratio
+        data = {}
+        provisioned = 0.0
+        for line in out.splitlines():
+            fields = [field.strip() for field in line.split(':')]
+            if len(fields) != 5:
+                continue
+            name, size, pool_lv, data_percent, metadata_percent = fields
+            if name == pool:
+                data['total_capacity_gb'] = float(size)
+                data['thin_pool_data_percent'] = float(data_percent or 0)
+                data['thin_pool_metadata_percent'] = float(
+                    metadata_percent or 0)
+            elif pool_lv == pool:
+                provisioned += float(size)
+        if 'total_capacity_gb' not in data:
+            LOG.error(_("Thin pool %s not found.") % self._thin_pool_path())
+            return {}
+        data['thin_provisioning_support'] = True
+        data['provisioned_capacity_gb'] = provisioned
+        data['max_over_subscription_ratio'] = ratio
+        data['over_subscription_ratio'] = (
+            provisioned / data['total_capacity_gb']
+            if data['total_capacity_gb'] else 0.0)
+        data['free_capacity_gb'] = max(
+            0.0, data['total_capacity_gb'] * ratio - provisioned)
+        return data
+
     def create_share(self, context, share):
         self._allocate_container(share)
         #create file system
@@ -203,10 +318,18 @@ class LVMShareDriver(driver.ExecuteMixin, driver.ShareDriver):
 
     def create_share_from_snapshot(self, context, share, snapshot):
         """Is called to create share from snapshot."""
+        if self.configuration.share_lvm_thin_pool:
+            return self._clone_thin_snapshot(share, snapshot)
         self._allocate_container(share)
         device_name = self._local_path(snapshot)
+
+        def report_progress(percent):
+            self.db.share_update(context, share['id'],
+                                 {'progress': '%d%%' % percent})
+
         self._copy_volume(device_name, self._local_path(share),
-                          snapshot['share_size'])
+                          snapshot['share_size'],
+                          report_progress=report_progress)
         mount_path = self._get_mount_path(share)
         location = self._get_helper(share).create_export(mount_path,
                                                          share['name'])
@@ -214,6 +337,28 @@ class LVMShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         #TODO(rushiagr): what is the provider_location? realy needed?
         return location
 
+    def _clone_thin_snapshot(self, share, snapshot):
+        """Creates share as writable thin snapshot of the snapshot."""
+        self._try_execute('lvcreate', '-kn', '--name', share['name'],
+                          '--snapshot', '%s/%s' % (
+                              self.configuration.share_volume_group,
+                              snapshot['name']),
+                          run_as_root=True)
+        device_name = self._local_path(share)
+        if share['size'] > snapshot['share_size']:
+            self._try_execute('lvextend', '-L', '%sG' % share['size'],
+                              '%s/%s' % (self.configuration.share_volume_group,
+                                         share['name']),
+                              run_as_root=True)
+            self._execute('e2fsck', '-f', '-y', device_name,
+                          run_as_root=True, check_exit_code=[0, 1])
+            self._execute('resize2fs', device_name, run_as_root=True)
+        mount_path = self._get_mount_path(share)
+        location = self._get_helper(share).create_export(mount_path,
+                                                         share['name'])
+        self._mount_device(share, device_name)
+        return location
+
     def delete_share(self, context, share):
         self._remove_export(context, share)
         self._delete_share(context, share)
@@ -241,9 +386,31 @@ class LVMShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         """Creates a snapshot."""
         orig_lv_name = "%s/%s" % (self.configuration.share_volume_group,
                                   snapshot['share_name'])
-        self._try_execute('lvcreate', '-L', '%sG' % snapshot['share_size'],
-                          '--name', snapshot['name'],
-                          '--snapshot', orig_lv_name, run_as_root=True)
+        if self.configuration.share_lvm_thin_pool:
+            # NOTE: thin snapshots share blocks of the pool with their
+            # origin, so they need no size.
+            self._try_execute('lvcreate', '--name', snapshot['name'],
+                              '--snapshot', orig_lv_name, run_as_root=True)
+            return
+        # NOTE: freezing flushes the journal of the filesystem, so the
+        # snapshot needs no recovery and _copy_volume can skip chunks of
+        # it by its block bitmaps.
+        mount_path = self._get_mount_path({'name': snapshot['share_name']})
+        try:
+            self._execute('fsfreeze', '-f', mount_path, run_as_root=True)
+        except exception.ProcessExecutionError as exc:
+            LOG.warn(_("Unable to freeze %(path)s, snapshotting it as it "
+                       "is: %(err)s") % {'path': mount_path,
+                                         'err': exc.stderr})
+            mount_path = None
+        try:
+            self._try_execute('lvcreate', '-L',
+                              '%sG' % snapshot['share_size'],
+                              '--name', snapshot['name'],
+                              '--snapshot', orig_lv_name, run_as_root=True)
+        finally:
+            if mount_path:
+                self._execute('fsfreeze', '-u', mount_path, run_as_root=True)
 
     def ensure_share(self, ctx, share):
         """Ensure that storage are mounted and exported."""
@@ -280,6 +447,12 @@ class LVMShareDriver(driver.ExecuteMixin, driver.ShareDriver):
                                             access['access_type'],
                                             access['access_to'])
 
+    def update_access(self, ctx, share, add_rules, delete_rules):
+        """Update access rules of the share in one helper call."""
+        location = self._get_mount_path(share)
+        self._get_helper(share).update_access(location, share['name'],
+                                              add_rules, delete_rules)
+
     def _get_helper(self, share):
         if share['share_proto'].startswith('NFS'):
             return self._helpers['NFS']
@@ -309,7 +482,13 @@ class LVMShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         return os.path.join(self.configuration.share_export_root,
                             share['name'])
 
-    def _copy_volume(self, srcstr, deststr, size_in_g):
+    def _copy_volume(self, srcstr, deststr, size_in_g, report_progress=None):
+        """Copies volume in chunks, skipping ones unused by its filesystem.
+
+        Chunks are copied with dd under the bandwidth limit and ionice
+        class of the backend. Progress is logged and, if given, passed to
+        report_progress() as percentage after each of them.
+        """
         # Use O_DIRECT to avoid thrashing the system buffer cache
         extra_flags = ['iflag=direct', 'oflag=direct']
 
@@ -320,10 +499,101 @@ class LVMShareDriver(driver.ExecuteMixin, driver.ShareDriver):
         except exception.ProcessExecutionError:
             extra_flags = []
 
-        # Perform the copy
-        self._execute('dd', 'if=%s' % srcstr, 'of=%s' % deststr,
-                      'count=%d' % (size_in_g * 1024), 'bs=1M',
-                      *extra_flags, run_as_root=True)
+        prefix = []
+        if self.configuration.share_lvm_copy_ionice:
+            prefix = (['ionice'] +
+                      self.configuration.share_lvm_copy_ionice.split())
+        chunk_mb = self.configuration.share_lvm_copy_chunk_mb
+        total_mb = size_in_g * 1024
+        free_chunks = self._get_free_chunks(srcstr, chunk_mb, total_mb)
+        skipped = 0
+        reported = None
+        for offset in range(0, total_mb, chunk_mb):
+            count = min(chunk_mb, total_mb - offset)
+            if offset / chunk_mb in free_chunks:
+                skipped += count
+            else:
+                self._copy_throttle.consume(count * 1024 * 1024)
+                cmd = prefix + ['dd', 'if=%s' % srcstr, 'of=%s' % deststr,
+                                'count=%d' % count, 'bs=1M',
+                                'skip=%d' % offset, 'seek=%d' % offset]
+                self._execute(*(cmd + extra_flags), run_as_root=True)
+            percent = (offset + count) * 100 / total_mb
+            LOG.debug(_("Copied %(percent)d%% of %(src)s to %(dest)s.") %
+                      {'percent': percent, 'src': srcstr, 'dest': deststr})
+            if report_progress and percent != reported:
+                report_progress(percent)
+                reported = percent
+        LOG.info(_("Copied %(src)s to %(dest)s, skipped %(skipped)d of "
+                   "%(total)d MiB unused by the filesystem.") %
+                 {'src': srcstr, 'dest': deststr, 'skipped': skipped,
+                  'total': total_mb})
+
+    def _get_free_chunks(self, device, chunk_mb, total_mb):
+        """Returns indexes of chunks of device with no used ext4 blocks.
+
+        Free blocks are taken from the block bitmaps listed by dumpe2fs.
+        Nothing is skipped if they can not be read, or if the filesystem
+        is not clean or needs journal recovery: blocks allocated by
+        journal transactions not yet checkpointed show as free in the
+        on-disk bitmaps, and skipping them would lose their data.
+        """
+        try:
+            out, err = self._execute('dumpe2fs', device, run_as_root=True)
+        except exception.ProcessExecutionError as exc:
+            LOG.warn(_("Unable to read block bitmaps of %(device)s, copying "
+                       "it as a whole: %(err)s") %
+                     {'device': device, 'err': exc.stderr})
+            return set()
+        block_size = block_count = None
+        clean = False
+        free_ranges = []
+        in_groups = False
+        for line in out.splitlines():
+            line = line.strip()
+            if line.startswith('Group '):
+                in_groups = True
+            elif in_groups:
+                if line.startswith('Free blocks:'):
+                    for blocks in line.split(':', 1)[1].split(','):
+                        if blocks.strip():
+                            first, _sep, last = blocks.strip().partition('-')
+                            free_ranges.append((int(first),
+                                                int(last or first)))
+            elif line.startswith('Filesystem state:'):
+                clean = line.split(':', 1)[1].strip() == 'clean'
+            elif line.startswith('Filesystem features:'):
+                if 'needs_recovery' in line.split(':', 1)[1].split():
+                    LOG.debug(_("%s needs journal recovery, copying it as "
+                                "a whole."), device)
+                    return set()
+            elif line.startswith('Block size:'):
+                block_size = int(line.split(':')[1])
+            elif line.startswith('Block count:'):
+                block_count = int(line.split(':')[1])
+        if not clean:
+            LOG.debug(_("%s is not clean, copying it as a whole."), device)
+            return set()
+        if not (block_size and block_count):
+            return set()
+
+        chunk = chunk_mb * 1024 * 1024
+        total = total_mb * 1024 * 1024
+        free_bytes = {}
+
+        def add_free(start, end):
+            while start < end:
+                index = start / chunk
+                stop = min(end, (index + 1) * chunk)
+                free_bytes[index] = free_bytes.get(index, 0) + stop - start
+                start = stop
+
+        for first, last in free_ranges:
+            add_free(first * block_size, (last + 1) * block_size)
+        # Blocks past the end of the filesystem are not used by it either.
+        add_free(block_count * block_size, total)
+        return set(index for index, size in free_bytes.items()
+                   if size >= min(chunk, total - index * chunk))
 
     def get_network_allocations_number(self):
         """LVM driver does not need to create VIFS"""
@@ -361,6 +631,25 @@ class NASHelperBase(object):
         """Deny access to the host."""
         raise NotImplementedError()
 
+    def update_access(self, local_path, share_name, add_rules, delete_rules):
+        """Allow and deny access to the hosts of given access rules."""
+        for access in delete_rules:
+            self.deny_access(local_path, share_name, access['access_type'],
+                             access['access_to'])
+        for access in add_rules:
+            try:
+                self.allow_access(local_path, share_name,
+                                  access['access_type'], access['access_to'])
+            except exception.ShareAccessExists:
+                pass
+
+    @staticmethod
+    def _validate_access_rules(rules):
+        for access in rules:
+            if access['access_type'] != 'ip':
+                reason = _('only ip access type allowed')
+                raise exception.InvalidShareAccess(reason=reason)
+
 
 class NFSHelper(NASHelperBase):
     """Interface to work with share."""
@@ -372,6 +661,13 @@ class NFSHelper(NASHelperBase):
                           run_as_root=True)
         except exception.ProcessExecutionError:
             raise exception.Error('NFS server not found')
+        self.configuration.append_config_values(
+            nfs_exports.nfs_exports_opts)
+        self.exports = nfs_exports.ExportTable(self._list_exports)
+
+    def _list_exports(self):
+        out, _ = self._execute('exportfs', '-v', run_as_root=True)
+        return out
 
     def create_export(self, local_path, share_name, recreate=False):
         """Create new export, delete old one if exists."""
@@ -386,23 +682,57 @@ class NFSHelper(NASHelperBase):
         if access_type != 'ip':
             reason = 'only ip access type allowed'
             raise exception.InvalidShareAccess(reason)
-        #check if presents in export
-        out, _ = self._execute('exportfs', run_as_root=True)
-        out = re.search(re.escape(local_path) + '[\s\n]*' + re.escape(access),
-                        out)
-        if out is not None:
+        if self.exports.has_client(local_path, access):
             raise exception.ShareAccessExists(access_type=access_type,
                                               access=access)
-
-        self._execute('exportfs', '-o', 'rw,no_subtree_check',
-                      ':'.join([access, local_path]), run_as_root=True,
-                      check_exit_code=True)
+        self._change_exports(local_path, [access], [])
 
     def deny_access(self, local_path, share_name, access_type, access,
                     force=False):
         """Deny access to the host."""
-        self._execute('exportfs', '-u', ':'.join([access, local_path]),
-                      run_as_root=True, check_exit_code=False)
+        self._change_exports(local_path, [], [access])
+
+    def update_access(self, local_path, share_name, add_rules, delete_rules):
+        """Change exports of all given hosts with single exportfs calls."""
+        self._validate_access_rules(add_rules)
+        delete = [access['access_to'] for access in delete_rules]
+        clients = self.exports.clients(local_path).difference(delete)
+        add = []
+        for access in add_rules:
+            if access['access_to'] not in clients:
+                clients.add(access['access_to'])
+                add.append(access['access_to'])
+        self._change_exports(local_path, add, delete)
+
+    def _change_exports(self, local_path, add, delete):
+        """Applies changes of clients of the export and records them."""
+        exports_file = self.configuration.nfs_exports_file
+        if exports_file:
+            if not (add or delete):
+                return
+            self.exports.update(local_path, add, delete)
+            try:
+                self._execute('tee', exports_file,
+                              process_input=self.exports.render(
+                                  self.configuration.share_export_root),
+                              run_as_root=True, check_exit_code=True)
+                self._execute('exportfs', '-ra', run_as_root=True,
+                              check_exit_code=True)
+            except exception.ProcessExecutionError:
+                self.exports.invalidate()
+                raise
+            return
+        if delete:
+            self._execute('exportfs', '-u',
+                          *[':'.join([access, local_path])
+                            for access in delete],
+                          run_as_root=True, check_exit_code=False)
+            self.exports.update(local_path, remove=delete)
+        if add:
+            self._execute('exportfs', '-o', nfs_exports.EXPORT_OPTIONS,
+                          *[':'.join([access, local_path]) for access in add],
+                          run_as_root=True, check_exit_code=True)
+            self.exports.update(local_path, add=add)
 
 
 class CIFSHelper(NASHelperBase):
@@ -487,6 +817,21 @@ class CIFSHelper(NASHelperBase):
             if not force:
                 raise
 
+    def update_access(self, local_path, share_name, add_rules, delete_rules):
+        """Change allowed hosts of the share with one config update."""
+        self._validate_access_rules(add_rules)
+        parser = ConfigParser.ConfigParser()
+        parser.read(self.config)
+        hosts = parser.get(share_name, 'hosts allow').split()
+        for access in delete_rules:
+            if access['access_to'] in hosts:
+                hosts.remove(access['access_to'])
+        for access in add_rules:
+            if access['access_to'] not in hosts:
+                hosts.append(access['access_to'])
+        parser.set(share_name, 'hosts allow', ' '.join(hosts))
+        self._update_config(parser)
+
     def _ensure_daemon_started(self):
         """
         FYI: smbd starts at least two processes.
@@ -613,6 +958,19 @@ class CIFSNetConfHelper(NASHelperBase):
             if not ('does not exist' in e.stdout and force):
                 raise
 
+    def update_access(self, local_path, share_name, add_rules, delete_rules):
+        """Change allowed hosts of the share with one setparm call."""
+        self._validate_access_rules(add_rules)
+        hosts = self._get_allow_hosts(share_name)
+        new_hosts = [host for host in hosts
+                     if host not in [access['access_to']
+                                     for access in delete_rules]]
+        for access in add_rules:
+            if access['access_to'] not in new_hosts:
+                new_hosts.append(access['access_to'])
+        if new_hosts != hosts:
+            self._set_allow_hosts(new_hosts, share_name)
+
     def _get_allow_hosts(self, share_name):
         (out, _) = self._execute('net', 'conf', 'getparm', share_name,
                                  'hosts allow', run_as_root=True)
@@ -18,8 +18,16 @@ NetApp api for ONTAP and OnCommand DFM.
 Contains classes required to issue api calls to ONTAP and OnCommand DFM.
 """
 
+import base64
+import errno
+import httplib
+import socket
+import threading
+import time
+
+import eventlet
+from eventlet import pools
 from lxml import etree
-import urllib2
 
 from manila.openstack.common import log
 
@@ -29,6 +37,54 @@ LOG = log.getLogger(__name__)
 URL_FILER = 'servlets/netapp.servlets.admin.XMLrequest_filer'
 NETAPP_NS = 'http://www.netapp.com/filer/admin'
 
+DEFAULT_POOL_SIZE = 4
+
+# Stands for the api element in envelopes serialized in advance.
+_PLACEHOLDER = 'manila-api-placeholder'
+
+
+class HTTPConnectionPool(pools.Pool):
+    """A simple eventlet pool to hold keep-alive connections to a filer."""
+
+    def __init__(self, protocol, host, port, *args, **kwargs):
+        self.protocol = protocol
+        self.host = host
+        self.port = int(port)
+        super(HTTPConnectionPool, self).__init__(*args, **kwargs)
+
+    def create(self):
+        if self.protocol == NaServer.TRANSPORT_TYPE_HTTPS:
+            return httplib.HTTPSConnection(self.host, self.port)
+        return httplib.HTTPConnection(self.host, self.port)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_connection_pool(protocol, host, port, size):
+    """Returns connection pool of the filer shared by all its clients."""
+    key = (protocol, host, str(port))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = HTTPConnectionPool(protocol, host, port, min_size=0,
+                                      max_size=size)
+            _pools[key] = pool
+        return pool
+
+
+def _closed_before_response(error, sent):
+    """Checks if error means that an idle connection had been closed.
+
+    The filer answers no request on such a connection: it either resets
+    it while the request is being sent, or closes it without a status line.
+    """
+    if isinstance(error, httplib.BadStatusLine):
+        return True
+    return (not sent and isinstance(error, socket.error) and
+            error.errno in (errno.ECONNRESET, errno.EPIPE))
+
 
 class NaServer(object):
     """Encapsulates server connection logic."""
@@ -46,14 +102,18 @@ class NaServer(object):
     def __init__(self, host, server_type=SERVER_TYPE_FILER,
                  transport_type=TRANSPORT_TYPE_HTTP,
                  style=STYLE_LOGIN_PASSWORD, username=None,
-                 password=None):
+                 password=None, pool_size=DEFAULT_POOL_SIZE):
         self._host = host
+        self._pool_size = pool_size
         self.set_server_type(server_type)
         self.set_transport_type(transport_type)
         self.set_style(style)
         self._username = username
         self._password = password
         self._refresh_conn = True
+        self._envelopes = {}
+        self._stats_lock = threading.Lock()
+        self.api_stats = {}
 
     def get_transport_type(self):
         """Get the transport type protocol."""
@@ -188,21 +248,88 @@ class NaServer(object):
         if na_element and not isinstance(na_element, NaElement):
             ValueError('NaElement must be supplied to invoke api')
         request = self._create_request(na_element, enable_tunneling)
-        if not hasattr(self, '_opener') or not self._opener \
+        if not hasattr(self, '_pool') or not self._pool \
                 or self._refresh_conn:
-            self._build_opener()
+            self._build_pool()
+        start = time.time()
         try:
-            if hasattr(self, '_timeout'):
-                response = self._opener.open(request, timeout=self._timeout)
-            else:
-                response = self._opener.open(request)
-        except urllib2.HTTPError as e:
-            raise NaApiError(e.code, e.msg)
-        except Exception as e:
-            raise NaApiError('Unexpected error', e)
-        xml = response.read()
+            xml = self._send(request)
+        finally:
+            self._record_latency(na_element.get_name(), time.time() - start)
         return self._get_result(xml)
 
+    def invoke_parallel(self, na_elements, enable_tunneling=False):
+        """Invokes independent apis concurrently and checks their status.
+
+        Returns results in the order of the given elements, the first
+        error is raised after all calls are over.
+        """
+        pool = eventlet.GreenPool(max(1, self._pool_size))
+
+        def invoke(na_element):
+            try:
+                return self.invoke_successfully(na_element, enable_tunneling)
+            except Exception as e:
+                return e
+        results = list(pool.imap(invoke, na_elements))
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def get_api_stats(self):
+        """Returns copy of call count and latency of each invoked api."""
+        with self._stats_lock:
+            return dict((api, dict(stats))
+                        for api, stats in self.api_stats.items())
+
+    def _record_latency(self, api, elapsed):
+        with self._stats_lock:
+            stats = self.api_stats.setdefault(
+                api, {'calls': 0, 'total_time': 0.0, 'max_time': 0.0})
+            stats['calls'] += 1
+            stats['total_time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+        LOG.debug(_('NetApp api %(api)s took %(time).3fs.') %
+                  {'api': api, 'time': elapsed})
+
+    def _send(self, request):
+        """Posts request over pooled connection, returns response body.
+
+        A reused connection may have been closed by the filer while idle,
+        the request is then sent once again over a new one. Errors which
+        do not show that the filer never processed the request, such as
+        timeouts, are not retried.
+        """
+        with self._pool.item() as conn:
+            for attempt in (1, 2):
+                reused = conn.sock is not None
+                if hasattr(self, '_timeout'):
+                    conn.timeout = self._timeout
+                    if reused:
+                        conn.sock.settimeout(self._timeout)
+                sent = False
+                try:
+                    conn.request('POST', '/' + self._url, request,
+                                 self._get_headers())
+                    sent = True
+                    response = conn.getresponse()
+                    body = response.read()
+                except (httplib.HTTPException, socket.error) as e:
+                    conn.close()
+                    if (reused and attempt == 1 and
+                            _closed_before_response(e, sent)):
+                        continue
+                    raise NaApiError('Unexpected error', e)
+                except Exception as e:
+                    conn.close()
+                    raise NaApiError('Unexpected error', e)
+                if response.will_close:
+                    conn.close()
+                if response.status != httplib.OK:
+                    raise NaApiError(response.status, response.reason)
+                return body
+
     def invoke_successfully(self, na_element, enable_tunneling=False):
         """Invokes api and checks execution status as success.
 
@@ -223,19 +350,26 @@ class NaServer(object):
         raise NaApiError(code, msg)
 
     def _create_request(self, na_element, enable_tunneling=False):
-        """Creates request in the desired format."""
-        netapp_elem = NaElement('netapp')
-        netapp_elem.add_attr('xmlns', self._ns)
-        if hasattr(self, '_api_version'):
-            netapp_elem.add_attr('version', self._api_version)
-        if enable_tunneling:
-            self._enable_tunnel_request(netapp_elem)
-        netapp_elem.add_child_elem(na_element)
-        request_d = netapp_elem.to_string()
-        request = urllib2.Request(
-            self._get_url(), data=request_d,
-            headers={'Content-Type': 'text/xml', 'charset': 'utf-8'})
-        return request
+        """Creates request in the desired format.
+
+        Only the api element is serialized for each call, the envelope
+        around it is built once for each combination of its attributes.
+        """
+        key = (self._ns, getattr(self, '_api_version', None),
+               getattr(self, '_vfiler', None),
+               getattr(self, '_vserver', None), enable_tunneling)
+        envelope = self._envelopes.get(key)
+        if envelope is None:
+            netapp_elem = NaElement('netapp')
+            netapp_elem.add_attr('xmlns', self._ns)
+            if hasattr(self, '_api_version'):
+                netapp_elem.add_attr('version', self._api_version)
+            if enable_tunneling:
+                self._enable_tunnel_request(netapp_elem)
+            netapp_elem.add_new_child(_PLACEHOLDER, None)
+            envelope = netapp_elem.to_string().split('<%s/>' % _PLACEHOLDER)
+            self._envelopes[key] = envelope
+        return na_element.to_string(encoding=None).join(envelope)
 
     def _enable_tunnel_request(self, netapp_elem):
         """Enables vserver or vfiler tunneling."""
@@ -274,20 +408,19 @@ class NaServer(object):
         return '%s://%s:%s/%s' % (self._protocol, self._host, self._port,
                                   self._url)
 
-    def _build_opener(self):
-        if self._auth_style == NaServer.STYLE_LOGIN_PASSWORD:
-            auth_handler = self._create_basic_auth_handler()
-        else:
-            auth_handler = self._create_certificate_auth_handler()
-        opener = urllib2.build_opener(auth_handler)
-        self._opener = opener
-
-    def _create_basic_auth_handler(self):
-        password_man = urllib2.HTTPPasswordMgrWithDefaultRealm()
-        password_man.add_password(None, self._get_url(), self._username,
-                                  self._password)
-        auth_handler = urllib2.HTTPBasicAuthHandler(password_man)
-        return auth_handler
+    def _build_pool(self):
+        if self._auth_style != NaServer.STYLE_LOGIN_PASSWORD:
+            self._create_certificate_auth_handler()
+        self._pool = _get_connection_pool(self._protocol, self._host,
+                                          self._port, self._pool_size)
+        self._refresh_conn = False
+
+    def _get_headers(self):
+        """Returns request headers, authenticating without a 401 round."""
+        credentials = base64.b64encode('%s:%s' % (self._username,
+                                                  self._password))
+        return {'Content-Type': 'text/xml', 'charset': 'utf-8',
+                'Authorization': 'Basic %s' % credentials}
 
     def _create_certificate_auth_handler(self):
         raise NotImplementedError()
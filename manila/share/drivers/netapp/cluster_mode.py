@@ -99,13 +99,11 @@ class NetAppClusteredShareDriver(driver.NetAppShareDriver):
 
     def _get_cluster_nodes(self):
         """Get all available cluster nodes."""
-        response = self._client.send_request('system-node-get-iter')
-        nodes_info_list = response.get_child_by_name('attributes-list')\
-            .get_children() if response.get_child_by_name('attributes-list') \
-            else []
-        nodes = [node_info.get_child_content('node') for node_info
-                 in nodes_info_list]
-        return nodes
+        nodes_info = self._client.get_records(
+            'system-node-get-iter',
+            desired_attributes={'node-details-info': {'node': None}})
+        return [node_info.get_child_content('node')
+                for node_info in nodes_info]
 
     def _get_node_data_port(self, node):
         """Get data port on the node."""
@@ -141,19 +139,18 @@ class NetAppClusteredShareDriver(driver.NetAppShareDriver):
     def _find_match_aggregates(self):
         """Find all aggregates match pattern."""
         pattern = self.configuration.netapp_aggregate_name_search_pattern
-        try:
-            aggrs = self._client.send_request('aggr-get-iter')\
-                .get_child_by_name('attributes-list').get_children()
-        except AttributeError:
+        aggrs = [aggr.get_child_content('aggregate-name')
+                 for aggr in self._client.get_records(
+                     'aggr-get-iter',
+                     desired_attributes={
+                         'aggr-attributes': {'aggregate-name': None}})]
+        if not aggrs:
             msg = _("Have not found aggregates match pattern %s")\
                   % pattern
             LOG.error(msg)
             raise exception.NetAppException(msg)
-        aggr_list = [
-            {'aggr-name': aggr} for aggr in
-            map(lambda x: x.get_child_content('aggregate-name'), aggrs)
-            if re.match(pattern, aggr)
-        ]
+        aggr_list = [{'aggr-name': aggr} for aggr in aggrs
+                     if re.match(pattern, aggr)]
         return aggr_list
 
     def get_network_allocations_number(self):
@@ -378,14 +375,12 @@ class NetAppClusteredShareDriver(driver.NetAppShareDriver):
                     _("Failed to create CIFS server entry. %s") % e.message)
 
     def _get_lifs(self, vserver_client):
-        lifs_info = vserver_client.send_request('net-interface-get-iter')
-        try:
-            lif_names = [lif.get_child_content('interface-name') for lif in
-                         lifs_info.get_child_by_name('attributes-list')
-                         .get_children()]
-        except AttributeError:
-            lif_names = []
-        return lif_names
+        lifs_info = vserver_client.get_records(
+            'net-interface-get-iter',
+            desired_attributes={
+                'net-interface-info': {'interface-name': None}})
+        return [lif.get_child_content('interface-name')
+                for lif in lifs_info]
 
     def _create_lif_if_not_exists(self, vserver_name, allocation_id, vlan,
                                   node, port, ip, netmask, vserver_client):
@@ -621,6 +616,16 @@ class NetAppClusteredShareDriver(driver.NetAppShareDriver):
         helper.set_client(vserver_client)
         return helper.deny_access(context, share, access)
 
+    def update_access(self, context, share, add_rules, delete_rules):
+        """Allows and denies access to a given NAS storage at once."""
+        vserver = self._get_vserver_name(share['share_network_id'])
+        vserver_client = driver.NetAppApiClient(
+            self.api_version, vserver=vserver,
+            configuration=self.configuration)
+        helper = self._get_helper(share)
+        helper.set_client(vserver_client)
+        return helper.update_access(context, share, add_rules, delete_rules)
+
     def _delete_vserver(self, vserver_name, vserver_client,
                         network_info=None):
         """
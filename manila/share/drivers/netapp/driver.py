@@ -24,6 +24,7 @@ import os
 from oslo.config import cfg
 
 from manila import exception
+from manila.openstack.common import excutils
 from manila.openstack.common import log
 from manila.share import driver
 from manila.share.drivers.netapp import api as naapi
@@ -48,6 +49,14 @@ NETAPP_NAS_OPTS = [
     cfg.StrOpt('netapp_nas_volume_name_template',
                help='Netapp volume name template.',
                default='share_%(share_id)s'),
+    cfg.IntOpt('netapp_nas_max_records',
+               default=100,
+               help='Number of records requested per page from ONTAP '
+                    '*-get-iter apis.'),
+    cfg.IntOpt('netapp_nas_connection_pool_size',
+               default=naapi.DEFAULT_POOL_SIZE,
+               help='Number of keep-alive connections kept open to the '
+                    'ONTAP controller.'),
 ]
 
 CONF = cfg.CONF
@@ -66,7 +75,8 @@ class NetAppApiClient(object):
             host=self.configuration.netapp_nas_server_hostname,
             username=self.configuration.netapp_nas_login,
             password=self.configuration.netapp_nas_password,
-            transport_type=self.configuration.netapp_nas_transport_type)
+            transport_type=self.configuration.netapp_nas_transport_type,
+            pool_size=self.configuration.netapp_nas_connection_pool_size)
         self._client.set_api_version(*version)
         if vfiler:
             self._client.set_vfiler(vfiler)
@@ -81,6 +91,46 @@ class NetAppApiClient(object):
         LOG.debug(_("NaElement: %s") % elem.to_string(pretty=True))
         return self._client.invoke_successfully(elem, enable_tunneling=True)
 
+    def get_records(self, api_name, args=None, desired_attributes=None):
+        """Yields records of a *-get-iter api page by page.
+
+        Pages of netapp_nas_max_records records are requested while the
+        response carries a next-tag, so only one page is parsed at a time.
+        If desired_attributes is given, records carry only these fields.
+        """
+        args = dict(args or {})
+        args['max-records'] = self.configuration.netapp_nas_max_records
+        if desired_attributes:
+            args['desired-attributes'] = desired_attributes
+        while True:
+            response = self.send_request(api_name, args)
+            records = response.get_child_by_name('attributes-list')
+            if records:
+                for record in records.get_children():
+                    yield record
+            next_tag = response.get_child_content('next-tag')
+            if not next_tag:
+                break
+            args['tag'] = next_tag
+
+    def send_requests(self, requests):
+        """Sends independent requests to Ontapi concurrently.
+
+        :param requests: list of (api_name, args) tuples
+        :returns: list of results in the order of requests
+        """
+        elems = []
+        for api_name, args in requests:
+            elem = naapi.NaElement(api_name)
+            if args:
+                elem.translate_struct(args)
+            elems.append(elem)
+        return self._client.invoke_parallel(elems, enable_tunneling=True)
+
+    def get_api_stats(self):
+        """Returns call count and latency of each invoked Ontapi api."""
+        return self._client.get_api_stats()
+
 
 class NetAppShareDriver(driver.ShareDriver):
     """
@@ -222,6 +272,11 @@ class NetAppShareDriver(driver.ShareDriver):
         helper = self._get_helper(share)
         return helper.deny_access(context, share, access)
 
+    def update_access(self, context, share, add_rules, delete_rules):
+        """Allows and denies access to a given NAS storage at once."""
+        helper = self._get_helper(share)
+        return helper.update_access(context, share, add_rules, delete_rules)
+
     def _check_vfiler_exists(self):
         vfiler_status = self._client.send_request('vfiler-get-status',
                 {'vfiler': self.configuration.netapp_nas_vfiler})
@@ -391,6 +446,13 @@ class NetAppNASHelperBase(object):
         """Denies new_rules to a given NAS storage for IPs in new_rules."""
         raise NotImplementedError()
 
+    def update_access(self, context, share, add_rules, delete_rules):
+        """Allows add_rules and denies delete_rules to a given NAS storage."""
+        for access in delete_rules:
+            self.deny_access(context, share, access)
+        for access in add_rules:
+            self.allow_access(context, share, access)
+
     def get_target(self, share):
         """Returns host where the share located."""
         raise NotImplementedError()
@@ -512,6 +574,27 @@ class NetAppNFSHelper(NetAppNASHelperBase):
 
         self._modify_rule(share, existing_rules)
 
+    def update_access(self, context, share, add_rules, delete_rules):
+        """Modifies NFS rules of a share for all given IPs at once."""
+        for access in add_rules:
+            if access['access_type'] != 'ip':
+                raise exception.NetAppException(_('7mode driver supports only'
+                                                  ' \'ip\' type'))
+
+        existing_rules = self._get_exisiting_rules(share)
+        denied_ips = [access['access_to'] for access in delete_rules]
+        rules = [rule for rule in existing_rules if rule not in denied_ips]
+        for access in add_rules:
+            if access['access_to'] not in rules:
+                rules.append(access['access_to'])
+        if rules == existing_rules:
+            return
+        try:
+            self._modify_rule(share, rules)
+        except naapi.NaApiError:
+            with excutils.save_and_reraise_exception():
+                self._modify_rule(share, existing_rules)
+
     def get_target(self, share):
         """Returns ID of target OnTap device based on export location."""
         return self._get_export_path(share)[0]
@@ -0,0 +1,106 @@
+# Copyright 2014 Mirantis Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""In-memory table of NFS exports shared by NFS helpers of share drivers."""
+
+import threading
+
+from oslo.config import cfg
+
+nfs_exports_opts = [
+    cfg.StrOpt('nfs_exports_file',
+               default=None,
+               help='If set, NFS helpers write exports of shares to this '
+                    'file, e.g. /etc/exports.d/manila.exports, and apply '
+                    'each batch of access changes with a single '
+                    '"exportfs -ra" instead of per client exportfs calls. '
+                    'The rootwrap filters of the share node only allow '
+                    'writing /etc/exports.d/*.exports files.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(nfs_exports_opts)
+
+EXPORT_OPTIONS = 'rw,no_subtree_check'
+
+
+def parse_exports(out):
+    """Parses output of 'exportfs' or 'exportfs -v' to path -> clients.
+
+    Long paths make exportfs print the client on the following line, so
+    clients are bound to the last path seen rather than to their line.
+    """
+    exports = {}
+    path = None
+    for token in out.split():
+        if token.startswith('/'):
+            path = token
+            exports.setdefault(path, set())
+        elif path is not None:
+            client = token.split('(')[0]
+            exports[path].add('*' if client == '<world>' else client)
+    return exports
+
+
+class ExportTable(object):
+    """Indexed NFS exports of one NFS server.
+
+    Loaded lazily from the export listing returned by list_exports on first
+    use and kept up to date by the helper after each successful change,
+    so checking a rule needs no call to exportfs.
+    """
+
+    def __init__(self, list_exports):
+        self._list_exports = list_exports
+        self._exports = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._exports is None:
+                self._exports = parse_exports(self._list_exports())
+            return self._exports
+
+    def clients(self, path):
+        """Returns set of clients path is exported to."""
+        return set(self._load().get(path, ()))
+
+    def has_client(self, path, client):
+        return client in self._load().get(path, ())
+
+    def update(self, path, add=(), remove=()):
+        exports = self._load()
+        with self._lock:
+            clients = exports.setdefault(path, set())
+            clients.difference_update(remove)
+            clients.update(add)
+            if not clients:
+                del exports[path]
+
+    def invalidate(self):
+        """Drops the table, it is reloaded on next use."""
+        with self._lock:
+            self._exports = None
+
+    def render(self, root):
+        """Returns exports file content for exports under root."""
+        root = root.rstrip('/') + '/'
+        lines = []
+        for path, clients in sorted(self._load().items()):
+            if path.startswith(root) and clients:
+                lines.append(' '.join(
+                    [path] + ['%s(%s)' % (client, EXPORT_OPTIONS)
+                              for client in sorted(clients)]))
+        return '\n'.join(lines) + '\n'
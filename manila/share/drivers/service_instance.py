@@ -15,6 +15,7 @@
 
 """Module for managing nova instances for share drivers."""
 
+import eventlet
 import netaddr
 import os
 import socket
@@ -28,8 +29,10 @@ from manila import context
 from manila import exception
 from manila.network.linux import ip_lib
 from manila.network.neutron import api as neutron
+from manila.openstack.common import excutils
 from manila.openstack.common import importutils
 from manila.openstack.common import log as logging
+from manila.openstack.common import uuidutils
 from manila import utils
 
 
@@ -74,6 +77,34 @@ server_opts = [
     cfg.StrOpt('interface_driver',
                default='manila.network.linux.interface.OVSInterfaceDriver',
                help="Vif driver."),
+    cfg.IntOpt('service_instance_ssh_pool_size',
+               default=4,
+               help="Maximum number of ssh connections kept open to each "
+               "service instance."),
+    cfg.IntOpt('service_instance_ssh_conn_timeout',
+               default=60,
+               help="Timeout in seconds for establishing ssh connections to "
+               "service instances, also used as the keepalive interval of "
+               "pooled connections."),
+    cfg.IntOpt('service_instance_pool_size',
+               default=0,
+               help="Number of booted service instances kept ready in each "
+               "pool zone to be handed out to new share networks. "
+               "0 disables the pool."),
+    cfg.ListOpt('service_instance_pool_zones',
+                default=[],
+                help="Compute availability zones to keep pools of service "
+                "instances in. If empty, one pool is kept in the default "
+                "zone."),
+    cfg.IntOpt('service_instance_pool_retry_interval',
+               default=10,
+               help="Seconds to wait before booting a pooled service "
+               "instance again after a failed boot, doubled after each "
+               "further failure."),
+    cfg.IntOpt('service_instance_pool_max_retry_interval',
+               default=300,
+               help="Maximum number of seconds to wait between failed boots "
+               "of pooled service instances."),
 ]
 
 CONF = cfg.CONF
@@ -106,12 +137,47 @@ def synchronized(f):
     return wrapped_func
 
 
+_SCRIPT_STEP_FAILED = 'manila-script-step-failed:'
+
+# Names of pooled service vms and their subnets start with it, until they
+# are handed out and renamed after a share network.
+_POOL_PREFIX = 'pool-'
+
+
 def _ssh_exec(server, command):
-    """Executes ssh commands and checks/restores ssh connection."""
-    if not server['ssh'].get_transport().is_active():
-        server['ssh_pool'].remove(server['ssh'])
-        server['ssh'] = server['ssh_pool'].create()
-    return utils.ssh_execute(server['ssh'], ' '.join(command))
+    """Executes ssh command over a pooled connection to the service vm.
+
+    The pool replaces connections whose transport is no longer active,
+    so a dropped connection is restored transparently.
+    """
+    with server['ssh_pool'].item() as ssh:
+        return utils.ssh_execute(ssh, ' '.join(command))
+
+
+def _ssh_exec_script(server, commands):
+    """Executes sequence of ssh commands in a single round trip.
+
+    Commands are run in order as one remote script which stops at the
+    first failing command. ProcessExecutionError raised in that case
+    carries the failed command, its exit code and its stderr, just as
+    if it was executed alone with _ssh_exec.
+    """
+    steps = []
+    for i, command in enumerate(commands):
+        steps.append('{ %(cmd)s ; } || { rc=$?; echo %(mark)s%(step)d >&2; '
+                     'exit $rc; }' % {'cmd': ' '.join(command),
+                                      'mark': _SCRIPT_STEP_FAILED,
+                                      'step': i})
+    try:
+        return _ssh_exec(server, [' ; '.join(steps)])
+    except exception.ProcessExecutionError as e:
+        stderr = (e.stderr or '').rstrip('\n').split('\n')
+        if not stderr[-1].startswith(_SCRIPT_STEP_FAILED):
+            raise
+        step = int(stderr.pop()[len(_SCRIPT_STEP_FAILED):])
+        raise exception.ProcessExecutionError(
+            exit_code=e.exit_code, stdout=e.stdout,
+            stderr='\n'.join(stderr), cmd=' '.join(commands[step]))
 
 
 class ServiceInstanceManager(object):
@@ -122,6 +188,11 @@ class ServiceInstanceManager(object):
                              infrastructure for provided share network.
     2. delete_service_instance: removes service instance and network
                                 infrastructure.
+
+    If service_instance_pool_size is set, booted service instances with
+    their own service subnets are kept ready in a pool per zone. A new
+    share network gets one of them, with its subnet renamed and attached
+    to the share network's router, and the pool is refilled in background.
     """
 
     def __init__(self, db, _helpers, *args, **kwargs):
@@ -153,6 +224,14 @@ class ServiceInstanceManager(object):
         self.service_network_id = self._get_service_network()
         self.vif_driver = importutils.import_class(CONF.interface_driver)()
         self._setup_connectivity_with_service_instances()
+        self.pool_hits = 0
+        self.pool_misses = 0
+        self._pool = dict((zone, []) for zone in
+                          CONF.service_instance_pool_zones or [None])
+        self._pool_filler = None
+        if CONF.service_instance_pool_size > 0:
+            self._load_pool(self.admin_context)
+            self._replenish_pool()
 
     def _get_service_network(self):
         """Finds existing or creates new service network."""
@@ -257,7 +336,6 @@ class ServiceInstanceManager(object):
             server['share_network_id'] = share_network_id
             server['ip'] = self._get_server_ip(server)
             server['ssh_pool'] = self._get_ssh_pool(server)
-            server['ssh'] = server['ssh_pool'].create()
             for helper in self._helpers.values():
                 helper.init_helper(server)
         elif not return_inactive:
@@ -281,11 +359,12 @@ class ServiceInstanceManager(object):
 
     def _get_ssh_pool(self, server):
         """Returns ssh connection pool for service vm."""
-        ssh_pool = utils.SSHPool(server['ip'], 22, None,
+        ssh_pool = utils.SSHPool(server['ip'], 22,
+                                 CONF.service_instance_ssh_conn_timeout,
                                  CONF.service_instance_user,
                                  password=CONF.service_instance_password,
                                  privatekey=CONF.path_to_private_key,
-                                 max_size=1)
+                                 max_size=CONF.service_instance_ssh_pool_size)
         return ssh_pool
 
     def _get_key(self, context):
@@ -335,8 +414,22 @@ class ServiceInstanceManager(object):
     def _create_service_instance(self, context, share_network_id,
                                  old_server_ip):
         """Creates service vm and sets up networking for it."""
-        service_image_id = self._get_service_image(context)
+        if CONF.service_instance_pool_size > 0 and not old_server_ip:
+            service_instance = self._claim_pooled_instance(context,
+                                                           share_network_id)
+            if service_instance:
+                return service_instance
         instance_name = self._get_service_instance_name(share_network_id)
+        return self._boot_service_instance(
+            context, instance_name,
+            lambda: self._setup_network_for_instance(context,
+                                                     share_network_id,
+                                                     old_server_ip))
+
+    def _boot_service_instance(self, context, instance_name, setup_network,
+                               availability_zone=None):
+        """Boots service vm on the port returned by setup_network."""
+        service_image_id = self._get_service_image(context)
 
         with lock:
             key_name = self._get_key(context)
@@ -344,9 +437,7 @@ class ServiceInstanceManager(object):
                 raise exception.ServiceInstanceException(_('Neither service '
                     'instance password nor key are available.'))
 
-            port = self._setup_network_for_instance(context,
-                                                    share_network_id,
-                                                    old_server_ip)
+            port = setup_network()
             try:
                 self._setup_connectivity_with_service_instances()
             except Exception as e:
@@ -361,7 +452,8 @@ class ServiceInstanceManager(object):
                                               key_name,
                                               None,
                                               None,
-                                              nics=[{'port-id': port['id']}])
+                                              nics=[{'port-id': port['id']}],
+                                          availability_zone=availability_zone)
 
         t = time.time()
         while time.time() - t < CONF.max_time_to_build_instance:
@@ -389,6 +481,138 @@ class ServiceInstanceManager(object):
                               CONF.max_time_to_build_instance)
         return service_instance
 
+    def _create_pooled_instance(self, context, availability_zone):
+        """Boots service vm with its own service subnet for the pool."""
+        pool_name = _POOL_PREFIX + uuidutils.generate_uuid()
+        subnets = []
+
+        def setup_network():
+            subnets.append(self.neutron_api.subnet_create(
+                self.service_tenant_id, self.service_network_id, pool_name,
+                self._get_cidr_for_subnet()))
+            return self.neutron_api.create_port(self.service_tenant_id,
+                                                self.service_network_id,
+                                                subnet_id=subnets[0]['id'],
+                                                device_owner='manila')
+
+        service_instance = self._boot_service_instance(
+            context, self._get_service_instance_name(pool_name),
+            setup_network, availability_zone=availability_zone)
+        service_instance['subnet_id'] = subnets[0]['id']
+        return service_instance
+
+    def _load_pool(self, context):
+        """Adopts idle pooled service vms left by a previous run.
+
+        Their zone is not known, so they are added to the first pool.
+        """
+        prefix = self._get_service_instance_name(_POOL_PREFIX)
+        subnets = dict((subnet['name'], subnet['id'])
+                       for subnet in self._get_all_service_subnets())
+        pool = self._pool[(CONF.service_instance_pool_zones or [None])[0]]
+        for server in self.compute_api.server_list(context,
+                                                   {'name': prefix}, True):
+            pool_name = _POOL_PREFIX + server['name'][len(prefix):]
+            if server['status'] != 'ACTIVE' or pool_name not in subnets:
+                LOG.warn(_('Skipping unusable pooled service instance %s.')
+                         % server['id'])
+                continue
+            server['subnet_id'] = subnets[pool_name]
+            pool.append(server)
+
+    def _replenish_pool(self):
+        """Starts refilling pools in background unless already running."""
+        if self._pool_filler is None:
+            self._pool_filler = eventlet.spawn(self._fill_pool)
+
+    def _fill_pool(self):
+        """Boots pooled service vms until all pools are full.
+
+        Failed boots are retried with an interval which doubles after each
+        failure in a row.
+        """
+        interval = CONF.service_instance_pool_retry_interval
+        try:
+            while True:
+                zones = [zone for zone, servers in self._pool.items()
+                         if len(servers) < CONF.service_instance_pool_size]
+                if not zones:
+                    break
+                for zone in zones:
+                    try:
+                        server = self._create_pooled_instance(
+                            self.admin_context, zone)
+                    except Exception:
+                        LOG.exception(_('Failed to boot pooled service '
+                                        'instance, retrying in %d seconds.')
+                                      % interval)
+                        eventlet.sleep(interval)
+                        interval = min(
+                            interval * 2,
+                            CONF.service_instance_pool_max_retry_interval)
+                        break
+                    self._pool[zone].append(server)
+                    interval = CONF.service_instance_pool_retry_interval
+        finally:
+            self._pool_filler = None
+
+    def _claim_pooled_instance(self, context, share_network_id):
+        """Hands out pooled service vm to share network.
+
+        Returns None if all pools are empty.
+        """
+        servers = max(self._pool.values(), key=len)
+        while servers:
+            server = servers.pop(0)
+            self._replenish_pool()
+            if self._ensure_server(context, server, update=True):
+                break
+            LOG.warn(_('Pooled service instance %s is not available, '
+                       'discarding it.') % server['id'])
+            self._discard_pooled_instance(context, server)
+        else:
+            self.pool_misses += 1
+            self._replenish_pool()
+            return None
+        self.pool_hits += 1
+        LOG.debug(_('Service instance %(server)s taken from pool for share '
+                    'network %(sn)s, pool stats: %(stats)s.') %
+                  {'server': server['id'], 'sn': share_network_id,
+                   'stats': self.get_pool_stats()})
+        try:
+            subnet = self.neutron_api.update_subnet(server['subnet_id'],
+                                                    share_network_id)
+            self._add_subnet_to_router(share_network_id, subnet)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._discard_pooled_instance(context, server)
+        server.update(self.compute_api.server_update(
+            context, server['id'],
+            self._get_service_instance_name(share_network_id)))
+        return server
+
+    def _discard_pooled_instance(self, context, server):
+        """Deletes pooled service vm and its subnet."""
+        try:
+            self._delete_server(context, server)
+            port = self._get_service_port()
+            self._remove_fixed_ip_from_service_port(port, server['subnet_id'])
+            self.neutron_api.delete_subnet(server['subnet_id'])
+        except Exception:
+            LOG.exception(_('Failed to delete pooled service instance %s.')
+                          % server['id'])
+
+    def get_pool_stats(self):
+        """Returns sizes of service instance pools and their hit rate."""
+        claims = self.pool_hits + self.pool_misses
+        return {
+            'sizes': dict((zone, len(servers))
+                          for zone, servers in self._pool.items()),
+            'hits': self.pool_hits,
+            'misses': self.pool_misses,
+            'hit_rate': float(self.pool_hits) / claims if claims else None,
+        }
+
     def _check_server_availability(self, server):
         t = time.time()
         while time.time() - t < CONF.max_time_to_build_instance:
@@ -414,6 +638,16 @@ class ServiceInstanceManager(object):
                         share_network_id,
                         self._get_cidr_for_subnet())
 
+        self._add_subnet_to_router(share_network_id, service_subnet)
+
+        return self.neutron_api.create_port(self.service_tenant_id,
+                                            self.service_network_id,
+                                            subnet_id=service_subnet['id'],
+                                            fixed_ip=old_server_ip,
+                                            device_owner='manila')
+
+    def _add_subnet_to_router(self, share_network_id, service_subnet):
+        """Attaches service subnet to the share network's router."""
         private_router = self._get_private_router(share_network_id)
         try:
             self.neutron_api.router_add_interface(private_router['id'],
@@ -426,12 +660,6 @@ class ServiceInstanceManager(object):
                                     {'subnet_id': service_subnet['id'],
                                      'router_id': private_router['id']})
 
-        return self.neutron_api.create_port(self.service_tenant_id,
-                                            self.service_network_id,
-                                            subnet_id=service_subnet['id'],
-                                            fixed_ip=old_server_ip,
-                                            device_owner='manila')
-
     def _get_private_router(self, share_network_id):
         """Returns router attached to private subnet gateway."""
         share_network = self.db.share_network_get(self.admin_context,
@@ -22,6 +22,12 @@
                        :class:`manila.share.drivers.lvm.LVMShareDriver`.
 """
 
+import sys
+import time
+
+from eventlet import greenpool
+from eventlet import greenthread
+
 from manila.common import constants
 from manila import context
 from manila import exception
@@ -42,6 +48,23 @@ share_manager_opts = [
     cfg.StrOpt('share_driver',
                default='manila.share.drivers.lvm.LVMShareDriver',
                help='Driver to use for share creation'),
+    cfg.IntOpt('share_init_host_workers',
+               default=1,
+               help='Number of share batches re-exported concurrently '
+                    'while the share service is starting'),
+    cfg.IntOpt('share_init_host_batch_size',
+               default=10,
+               help='Number of shares passed to the driver at once while '
+                    'they are re-exported on share service start'),
+    cfg.IntOpt('share_create_workers',
+               default=4,
+               help='Number of shares of a scheduled batch created '
+                    'concurrently'),
+    cfg.FloatOpt('share_access_coalesce_interval',
+                 default=0,
+                 help='Seconds to wait for further allow and deny requests '
+                      'for the same share before passing them to the driver '
+                      'as a single update'),
 ]
 
 CONF = cfg.CONF
@@ -53,7 +76,7 @@ QUOTAS = quota.QUOTAS
 class ShareManager(manager.SchedulerDependentManager):
     """Manages NAS storages."""
 
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.3'
 
     def __init__(self, share_driver=None, service_name=None, *args, **kwargs):
         """Load the driver from args, or from flags."""
@@ -66,6 +89,7 @@ class ShareManager(manager.SchedulerDependentManager):
         self.driver = importutils.import_object(
             share_driver, self.db, configuration=self.configuration)
         self.network_api = network.API()
+        self._access_queues = {}
 
     def init_host(self):
         """Initialization for a standalone service."""
@@ -76,22 +100,69 @@ class ShareManager(manager.SchedulerDependentManager):
 
         shares = self.db.share_get_all_by_host(ctxt, self.host)
         LOG.debug(_("Re-exporting %s shares"), len(shares))
+        self._ensure_shares(ctxt, shares)
+
+        self.publish_service_capabilities(ctxt)
+
+    def _ensure_shares(self, ctxt, shares):
+        """Re-exports shares in batches using a pool of workers.
+
+        Access rules of all shares are loaded with a single query, every
+        batch of shares is then handed to the driver together with its
+        rules. Returns counters of ensured and failed shares.
+        """
+        stats = {'total': 0, 'ensured': 0, 'failed': 0}
+        to_ensure = []
         for share in shares:
             if share['status'] in ['available', 'in-use']:
-                self.driver.ensure_share(ctxt, share)
-                rules = self.db.share_access_get_all_for_share(ctxt,
-                                                               share['id'])
-                for access_ref in rules:
-                    if access_ref['state'] == access_ref.STATE_ACTIVE:
-                        try:
-                            self.driver.allow_access(ctxt, share,
-                                                     access_ref)
-                        except exception.ShareAccessExists:
-                            pass
+                to_ensure.append(share)
             else:
                 LOG.info(_("share %s: skipping export"), share['name'])
-
-        self.publish_service_capabilities(ctxt)
+        if not to_ensure:
+            return stats
+        stats['total'] = len(to_ensure)
+
+        access_rules = {}
+        for access_ref in self.db.share_access_get_all_by_host(ctxt,
+                                                               self.host):
+            if access_ref['state'] == access_ref.STATE_ACTIVE:
+                access_rules.setdefault(access_ref['share_id'],
+                                        []).append(access_ref)
+
+        batch_size = max(self.configuration.share_init_host_batch_size, 1)
+        batches = [to_ensure[i:i + batch_size]
+                   for i in xrange(0, len(to_ensure), batch_size)]
+        workers = max(self.configuration.share_init_host_workers, 1)
+        pool = greenpool.GreenPool(min(workers, len(batches)))
+        start_time = time.time()
+
+        def _ensure_batch(batch):
+            try:
+                failures = self.driver.ensure_shares(ctxt, batch,
+                                                     access_rules) or {}
+            except Exception:
+                stats['failed'] += len(batch)
+                LOG.exception(_("Failed to re-export shares %s"),
+                              ', '.join(share['name'] for share in batch))
+            else:
+                failed = [share for share in batch
+                          if share['id'] in failures]
+                stats['failed'] += len(failed)
+                stats['ensured'] += len(batch) - len(failed)
+                if failed:
+                    LOG.error(_("Failed to re-export shares %s"),
+                              ', '.join(share['name'] for share in failed))
+            LOG.info(_("Re-exported %(done)d of %(total)d shares "
+                       "(%(failed)d failed) in %(elapsed).2f seconds"),
+                     {'done': stats['ensured'] + stats['failed'],
+                      'total': stats['total'],
+                      'failed': stats['failed'],
+                      'elapsed': time.time() - start_time})
+
+        for batch in batches:
+            pool.spawn_n(_ensure_batch, batch)
+        pool.waitall()
+        return stats
 
     def create_share(self, context, share_id, request_spec=None,
                      filter_properties=None, snapshot_id=None):
@@ -129,8 +200,34 @@ class ShareManager(manager.SchedulerDependentManager):
         else:
             self.db.share_update(context, share_id,
                                  {'status': 'available',
+                                  'progress': '100%',
                                   'launched_at': timeutils.utcnow()})
 
+    def create_shares(self, context, shares):
+        """Creates a batch of shares placed on this host by the scheduler.
+
+        Each entry carries the create_share() arguments for one share.
+        Up to share_create_workers shares are created concurrently; a
+        failure only affects its own share, which create_share() puts into
+        the error state.
+        """
+        def _create_share(share):
+            try:
+                self.create_share(context, share['share_id'],
+                                  request_spec=share.get('request_spec'),
+                                  filter_properties=share.get(
+                                      'filter_properties'),
+                                  snapshot_id=share.get('snapshot_id'))
+            except Exception:
+                LOG.exception(_("Failed to create share %s"),
+                              share['share_id'])
+
+        workers = max(self.configuration.share_create_workers, 1)
+        pool = greenpool.GreenPool(min(workers, max(len(shares), 1)))
+        for share in shares:
+            pool.spawn_n(_create_share, share)
+        pool.waitall()
+
     def delete_share(self, context, share_id):
         """Delete a share."""
         context = context.elevated()
@@ -142,8 +239,8 @@ class ShareManager(manager.SchedulerDependentManager):
             project_id = context.project_id
         rules = self.db.share_access_get_all_for_share(context, share_id)
         try:
-            for access_ref in rules:
-                self._deny_access(context, access_ref, share_ref)
+            if rules:
+                self._update_access(context, share_ref, [], rules)
             self.driver.delete_share(context, share_ref)
         except Exception:
             with excutils.save_and_reraise_exception():
@@ -222,33 +319,107 @@ class ShareManager(manager.SchedulerDependentManager):
 
     def allow_access(self, context, access_id):
         """Allow access to some share."""
-        try:
-            access_ref = self.db.share_access_get(context, access_id)
-            share_ref = self.db.share_get(context, access_ref['share_id'])
-            if access_ref['state'] == access_ref.STATE_NEW:
-                self.driver.allow_access(context, share_ref, access_ref)
-                self.db.share_access_update(
-                    context, access_id, {'state': access_ref.STATE_ACTIVE})
-        except Exception:
-            with excutils.save_and_reraise_exception():
-                self.db.share_access_update(
-                    context, access_id, {'state': access_ref.STATE_ERROR})
+        access_ref = self.db.share_access_get(context, access_id)
+        self._queue_access_change(context, access_ref, deny=False)
 
     def deny_access(self, context, access_id):
         """Deny access to some share."""
         access_ref = self.db.share_access_get(context, access_id)
-        share_ref = self.db.share_get(context, access_ref['share_id'])
-        self._deny_access(context, access_ref, share_ref)
-
-    def _deny_access(self, context, access_ref, share_ref):
-        access_id = access_ref['id']
+        self._queue_access_change(context, access_ref, deny=True)
+
+    def _queue_access_change(self, context, access_ref, deny):
+        """Coalesce access changes of a share into single driver calls.
+
+        The first request for a share becomes responsible for applying
+        changes: it waits share_access_coalesce_interval seconds and passes
+        everything queued for the share in the meantime to the driver at
+        once, repeating until the queue is empty. Other requests just add
+        their changes to the queue.
+        """
+        share_id = access_ref['share_id']
+        queue = self._access_queues.get(share_id)
+        if queue is not None:
+            queue.append((access_ref, deny))
+            return
+
+        queue = self._access_queues[share_id] = [(access_ref, deny)]
+        exc_info = None
         try:
-            self.driver.deny_access(context, share_ref, access_ref)
+            while queue:
+                greenthread.sleep(
+                    self.configuration.share_access_coalesce_interval)
+                changes = queue[:]
+                del queue[:]
+                try:
+                    self._apply_access_changes(context, share_id, changes)
+                except Exception:
+                    exc_info = sys.exc_info()
+                    LOG.exception(_("Failed to update access rules of "
+                                    "share %s"), share_id)
+        finally:
+            del self._access_queues[share_id]
+        if exc_info:
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+    def _apply_access_changes(self, context, share_id, changes):
+        add_rules = []
+        delete_rules = []
+        for access_ref, deny in changes:
+            if not deny:
+                if access_ref['state'] == access_ref.STATE_NEW:
+                    add_rules.append(access_ref)
+                continue
+            pending = [rule for rule in add_rules
+                       if rule['id'] == access_ref['id']]
+            if pending:
+                # NOTE: rule is denied before it was passed to the driver.
+                add_rules.remove(pending[0])
+                self.db.share_access_delete(context, access_ref['id'])
+            else:
+                delete_rules.append(access_ref)
+        if add_rules or delete_rules:
+            share_ref = self.db.share_get(context, share_id)
+            self._update_access(context, share_ref, add_rules, delete_rules)
+
+    def _update_access(self, context, share_ref, add_rules, delete_rules):
+        """Applies access changes to the share, all at once if possible.
+
+        If the driver fails to apply several changes at once, they are
+        applied one by one and only the rules which fail on their own are
+        put into error state.
+        """
+        try:
+            self.driver.update_access(context, share_ref, add_rules,
+                                      delete_rules)
         except Exception:
-            with excutils.save_and_reraise_exception():
-                self.db.share_access_update(
-                    context, access_id, {'state': access_ref.STATE_ERROR})
-        self.db.share_access_delete(context, access_id)
+            if len(add_rules) + len(delete_rules) == 1:
+                with excutils.save_and_reraise_exception():
+                    for access_ref in add_rules + delete_rules:
+                        self.db.share_access_update(
+                            context, access_ref['id'],
+                            {'state': access_ref.STATE_ERROR})
+            LOG.exception(_("Failed to update access rules of share %s at "
+                            "once, applying them one by one"),
+                          share_ref['id'])
+            exc_info = None
+            for access_ref in delete_rules:
+                try:
+                    self._update_access(context, share_ref, [], [access_ref])
+                except Exception:
+                    exc_info = exc_info or sys.exc_info()
+            for access_ref in add_rules:
+                try:
+                    self._update_access(context, share_ref, [access_ref], [])
+                except Exception:
+                    exc_info = exc_info or sys.exc_info()
+            if exc_info:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            return
+        for access_ref in add_rules:
+            self.db.share_access_update(
+                context, access_ref['id'], {'state': access_ref.STATE_ACTIVE})
+        for access_ref in delete_rules:
+            self.db.share_access_delete(context, access_ref['id'])
 
     @manager.periodic_task
     def _report_driver_status(self, context):
@@ -258,7 +429,8 @@ class ShareManager(manager.SchedulerDependentManager):
             self.update_service_capabilities(share_stats)
 
     def publish_service_capabilities(self, context):
-        """Collect driver status and then publish it."""
+        """Collect driver status and then publish all of it."""
+        self.resync_service_capabilities()
         self._report_driver_status(context)
         self._publish_service_capabilities(context)
 
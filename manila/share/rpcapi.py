@@ -35,6 +35,7 @@ class ShareAPI(manila.openstack.common.rpc.proxy.RpcProxy):
         1.0 - Initial version.
         1.1 - Add snapshot support.
         1.2 - Add filter scheduler support
+        1.3 - Add create_shares() method
     '''
 
     BASE_RPC_API_VERSION = '1.1'
@@ -57,6 +58,12 @@ class ShareAPI(manila.openstack.common.rpc.proxy.RpcProxy):
                                           self.topic,
                                           host))
 
+    def create_shares(self, ctxt, host, shares):
+        self.cast(ctxt,
+                  self.make_msg('create_shares', shares=shares),
+                  topic=rpc.queue_get_for(ctxt, self.topic, host),
+                  version='1.3')
+
     def delete_share(self, ctxt, share):
         self.cast(ctxt,
                   self.make_msg('delete_share',
@@ -88,9 +95,14 @@ class ShareAPI(manila.openstack.common.rpc.proxy.RpcProxy):
                                           self.topic,
                                           share['host']))
 
-    def publish_service_capabilities(self, ctxt):
-        self.fanout_cast(ctxt, self.make_msg('publish_service_capabilities'),
-                         version='1.0')
+    def publish_service_capabilities(self, ctxt, host=None):
+        msg = self.make_msg('publish_service_capabilities')
+        if host:
+            self.cast(ctxt, msg,
+                      topic=rpc.queue_get_for(ctxt, self.topic, host),
+                      version='1.0')
+        else:
+            self.fanout_cast(ctxt, msg, version='1.0')
 
     def activate_network(self, context, share_network_id, metadata):
         self.fanout_cast(context,
@@ -99,7 +99,8 @@ def stub_snapshot_update(self, context, *args, **param):
     return share
 
 
-def stub_share_get_all_by_project(self, context, search_opts=None):
+def stub_share_get_all_by_project(self, context, search_opts=None,
+                                  **kwargs):
     return [stub_share_get(self, context, '1')]
 
 
@@ -129,5 +130,6 @@ def stub_snapshot_delete(self, context, *args, **param):
     pass
 
 
-def stub_snapshot_get_all_by_project(self, context, search_opts=None):
+def stub_snapshot_get_all_by_project(self, context, search_opts=None,
+                                     **kwargs):
     return [stub_snapshot_get(self, context, 2)]
@@ -15,11 +15,14 @@
 
 import datetime
 
+import mock
 import webob
 
 from manila.api import common
 from manila.api.v1 import shares
 from manila import context
+from manila import db
+from manila.db.sqlalchemy import session
 from manila import exception
 from manila.share import api as share_api
 from manila import test
@@ -286,3 +289,83 @@ class ShareApiTest(test.TestCase):
         self.mox.ReplayAll()
         common.remove_invalid_options(ctx, search_opts, allowed_opts)
         self.assertEqual(search_opts, expected_opts)
+
+    def test_share_list_pushes_paging_to_share_api(self):
+        def fake_get_all(_self, context, search_opts=None, **kwargs):
+            self.search_opts = search_opts
+            self.list_params = kwargs
+            return [stubs.stub_share_get(_self, context, '1')]
+
+        self.stubs.Set(share_api.API, 'get_all', fake_get_all)
+        env = {'QUERY_STRING': 'status=available&limit=5&offset=2&'
+                               'marker=fake_id&sort_key=size&sort_dir=asc'}
+        req = fakes.HTTPRequest.blank('/shares', environ=env)
+
+        res_dict = self.controller.index(req)
+
+        self.assertEqual(1, len(res_dict['shares']))
+        self.assertEqual({'status': 'available'}, self.search_opts)
+        self.assertEqual({'limit': 5, 'offset': 2, 'marker': 'fake_id',
+                          'sort_key': 'size', 'sort_dir': 'asc',
+                          'columns_to_join': []},
+                         self.list_params)
+
+    def test_share_list_invalid_marker(self):
+        def fake_get_all(_self, context, search_opts=None, **kwargs):
+            raise exception.InvalidInput(reason='marker not found')
+
+        self.stubs.Set(share_api.API, 'get_all', fake_get_all)
+        env = {'QUERY_STRING': 'marker=fake_id'}
+        req = fakes.HTTPRequest.blank('/shares', environ=env)
+
+        self.assertRaises(webob.exc.HTTPBadRequest,
+                          self.controller.index, req)
+
+
+class ShareListQueryCountTest(test.TestCase):
+    """Share list views must not issue a query per share."""
+
+    def setUp(self):
+        super(ShareListQueryCountTest, self).setUp()
+        self.controller = shares.ShareController()
+        self.admin_context = context.get_admin_context()
+
+    def _create_shares(self, count):
+        for i in range(count):
+            db.share_create(self.admin_context,
+                            {'project_id': 'fake',
+                             'user_id': 'fake_user',
+                             'size': 1,
+                             'share_proto': 'NFS',
+                             'status': 'available',
+                             'metadata': {'key%d' % i: 'value%d' % i}})
+
+    def _list(self, is_detail):
+        """Call the list view, returning the body and the SQL it ran."""
+        req = fakes.HTTPRequest.blank('/shares')
+        dialect = session.get_engine().dialect
+        with mock.patch.object(dialect, 'do_execute',
+                               wraps=dialect.do_execute) as do_execute:
+            if is_detail:
+                res_dict = self.controller.detail(req)
+            else:
+                res_dict = self.controller.index(req)
+        statements = [call[0][1] for call in do_execute.call_args_list]
+        return res_dict, statements
+
+    def test_share_list_query_count_independent_of_share_count(self):
+        self._create_shares(2)
+        _res, summary = self._list(False)
+        _res, detail = self._list(True)
+
+        self._create_shares(5)
+        res_dict, summary_more = self._list(False)
+        self.assertEqual(7, len(res_dict['shares']))
+        self.assertEqual(len(summary), len(summary_more))
+        self.assertFalse([s for s in summary_more if 'share_metadata' in s])
+
+        res_dict, detail_more = self._list(True)
+        self.assertEqual(7, len(res_dict['shares']))
+        self.assertEqual(len(detail), len(detail_more))
+        for share in res_dict['shares']:
+            self.assertEqual(1, len(share['metadata']))
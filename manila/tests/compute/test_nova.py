@@ -14,6 +14,7 @@
 
 import mock
 
+from manila.common import client_auth
 from manila.compute import nova
 from manila import context
 from manila import exception
@@ -21,6 +22,9 @@ from manila import test
 from manila.volume import cinder
 from novaclient import exceptions as nova_exception
 from novaclient.v1_1 import servers as nova_servers
+from oslo.config import cfg
+
+CONF = cfg.CONF
 
 
 class Volume(object):
@@ -199,3 +203,33 @@ class NovaApiTestCase(test.TestCase):
     def test_keypair_list(self):
         self.assertEqual([{'id': 'id1'}, {'id': 'id2'}],
                          self.api.keypair_list(self.ctx))
+
+
+class NovaclientTestCase(test.TestCase):
+
+    def setUp(self):
+        super(NovaclientTestCase, self).setUp()
+        self.stubs.Set(client_auth, 'admin_clients',
+                       client_auth.AdminClientCache())
+
+    def test_novaclient_admin_client_is_cached(self):
+        fake_client = mock.Mock(spec=['client'])
+        fake_client.client = mock.Mock(spec=['auth_token', 'authenticate',
+                                             'service_catalog'])
+        fake_client.client.auth_token = None
+
+        def authenticate():
+            fake_client.client.auth_token = 'fake_token'
+
+        fake_client.client.authenticate.side_effect = authenticate
+        ctx = context.get_admin_context()
+        with mock.patch.object(nova.nova_client, 'Client',
+                               mock.Mock(return_value=fake_client)):
+            self.assertIs(fake_client, nova.novaclient(ctx))
+            self.assertIs(fake_client, nova.novaclient(ctx))
+
+            nova.nova_client.Client.assert_called_once_with(
+                CONF.nova_admin_username, CONF.nova_admin_password,
+                CONF.nova_admin_tenant_name, CONF.nova_admin_auth_url)
+        fake_client.client.authenticate.assert_called_once_with()
+        self.assertEqual(1, client_auth.admin_clients.auth_calls)
@@ -21,6 +21,7 @@ from oslo.config import cfg
 CONF = cfg.CONF
 
 CONF.import_opt('policy_file', 'manila.policy')
+CONF.import_opt('quota_cache_ttl', 'manila.quota')
 
 def_vol_type = 'fake_vol_type'
 
@@ -37,3 +38,4 @@ def set_defaults(conf):
     conf.set_default('service_instance_user', 'fake_user')
     conf.set_default('share_driver',
                      'manila.tests.fake_driver.FakeShareDriver')
+    conf.set_default('quota_cache_ttl', 0)
@@ -83,6 +83,9 @@ class API(object):
     def server_get(self, *args, **kwargs):
         pass
 
+    def server_update(self, *args, **kwargs):
+        pass
+
     def keypair_list(self, *args, **kwargs):
         pass
 
@@ -164,6 +164,12 @@ class API(object):
     def subnet_create(self, *args, **kwargs):
         pass
 
+    def update_subnet(self, *args, **kwargs):
+        pass
+
+    def delete_subnet(self, *args, **kwargs):
+        pass
+
     def router_add_interface(self, *args, **kwargs):
         pass
 
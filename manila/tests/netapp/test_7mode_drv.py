@@ -176,6 +176,13 @@ class NetApp7modeDrvTestCase(test.TestCase):
         self.helper.deny_access.assert_called_ince_with(self._context,
                                                         self.share, access)
 
+    def test_update_access(self):
+        access = {'access_to': '1.2.3.4', 'access_type': 'ip'}
+        self.driver.update_access(self._context, self.share, [access], [])
+        self.helper.update_access.assert_called_once_with(self._context,
+                                                          self.share,
+                                                          [access], [])
+
 
 class NetAppNFSHelperTestCase(test.TestCase):
     """Tests for NetApp 7mode driver.
@@ -220,6 +227,30 @@ class NetAppNFSHelperTestCase(test.TestCase):
             mock.call('nfs-exportfs-append-rules-2', mock.ANY)
         ])
 
+    def test_update_access(self):
+        add_rules = [{'access_to': '1.2.3.4', 'access_type': 'ip'},
+                     {'access_to': '1.2.3.5', 'access_type': 'ip'}]
+        delete_rules = [{'access_to': '1.2.3.6', 'access_type': 'ip'}]
+        self.helper._get_exisiting_rules = mock.Mock(
+            return_value=['1.2.3.5', '1.2.3.6'])
+        self.helper._modify_rule = mock.Mock()
+        self.helper.update_access(self._context, self.share, add_rules,
+                                  delete_rules)
+        self.helper._modify_rule.assert_called_once_with(
+            self.share, ['1.2.3.5', '1.2.3.4'])
+
+    def test_update_access_error(self):
+        add_rules = [{'access_to': '1.2.3.4', 'access_type': 'ip'}]
+        self.helper._get_exisiting_rules = mock.Mock(
+            return_value=['1.2.3.5'])
+        self.helper._modify_rule = mock.Mock(
+            side_effect=[naapi.NaApiError, None])
+        self.assertRaises(naapi.NaApiError, self.helper.update_access,
+                          self._context, self.share, add_rules, [])
+        self.helper._modify_rule.assert_has_calls([
+            mock.call(self.share, ['1.2.3.5', '1.2.3.4']),
+            mock.call(self.share, ['1.2.3.5'])])
+
     def test_deny_access(self):
         access = {'access_to': '1.2.3.4',
                   'access_type': 'ip'}
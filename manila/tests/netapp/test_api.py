@@ -0,0 +1,218 @@
+# Copyright (c) 2014 NetApp, Inc.
+# All Rights Reserved.
+#
+#     Licensed under the Apache License, Version 2.0 (the "License"); you may
+#     not use this file except in compliance with the License. You may obtain
+#     a copy of the License at
+#
+#          http://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#     WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#     License for the specific language governing permissions and limitations
+#     under the License.
+
+import errno
+import httplib
+import socket
+
+import mock
+
+from manila.share import configuration
+from manila.share.drivers.netapp import api as naapi
+from manila.share.drivers.netapp import driver
+from manila import test
+
+
+# Other tests replace the client class of the driver module.
+NetAppApiClient = driver.NetAppApiClient
+
+
+RESPONSE = ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<netapp xmlns="http://www.netapp.com/filer/admin" version="1.15">'
+            '<results status="passed"><num-records>1</num-records></results>'
+            '</netapp>')
+
+
+def fake_response(status=httplib.OK, body=RESPONSE, will_close=False):
+    response = mock.Mock(status=status, reason='fake reason',
+                         will_close=will_close)
+    response.read.return_value = body
+    return response
+
+
+class NaServerTestCase(test.TestCase):
+    """Tests for NaServer transport."""
+
+    def setUp(self):
+        super(NaServerTestCase, self).setUp()
+        naapi._pools.clear()
+        self.conn = mock.Mock(sock=None)
+        self.conn.getresponse.return_value = fake_response()
+        self.conn_class = mock.Mock(return_value=self.conn)
+        self.stubs.Set(naapi.httplib, 'HTTPConnection', self.conn_class)
+        self.server = naapi.NaServer('fake_host', username='user',
+                                     password='pass')
+        self.server.set_api_version(1, 15)
+        self.server.set_vserver('fake_vserver')
+
+    def tearDown(self):
+        naapi._pools.clear()
+        super(NaServerTestCase, self).tearDown()
+
+    def test_create_request_same_as_full_serialization(self):
+        elem = naapi.NaElement('volume-get-iter')
+        elem.add_new_child('max-records', '10')
+        netapp_elem = naapi.NaElement('netapp')
+        netapp_elem.add_attr('xmlns', naapi.NETAPP_NS)
+        netapp_elem.add_attr('version', '1.15')
+        netapp_elem.add_attr('vfiler', 'fake_vserver')
+        netapp_elem.add_child_elem(elem)
+        expected = netapp_elem.to_string()
+
+        self.assertEqual(self.server._create_request(elem, True), expected)
+        self.assertEqual(self.server._create_request(elem, True), expected)
+        self.assertEqual(len(self.server._envelopes), 1)
+        self.assertNotIn('vfiler',
+                         self.server._create_request(elem, False))
+
+    def test_invoke_reuses_connection(self):
+        for i in range(3):
+            result = self.server.invoke_successfully(
+                naapi.NaElement('system-get-version'), True)
+            self.conn.sock = mock.Mock()
+        self.assertEqual(result.get_child_content('num-records'), '1')
+        self.conn_class.assert_called_once_with('fake_host', 80)
+        self.assertEqual(self.conn.request.call_count, 3)
+        method, url, body, headers = self.conn.request.call_args[0]
+        self.assertEqual(method, 'POST')
+        self.assertEqual(url, '/' + naapi.URL_FILER)
+        self.assertEqual(headers['Authorization'], 'Basic dXNlcjpwYXNz')
+        self.assertEqual(
+            self.server.get_api_stats()['system-get-version']['calls'], 3)
+
+    def test_connection_shared_by_servers_of_filer(self):
+        other = naapi.NaServer('fake_host', username='user',
+                               password='pass')
+        self.server.invoke_elem(naapi.NaElement('system-get-version'))
+        self.conn.sock = mock.Mock()
+        other.invoke_elem(naapi.NaElement('system-get-version'))
+        self.conn_class.assert_called_once_with('fake_host', 80)
+
+    def test_invoke_retries_closed_connection(self):
+        self.conn.sock = mock.Mock()
+        self.conn.getresponse.side_effect = [httplib.BadStatusLine(''),
+                                             fake_response()]
+        self.server.invoke_elem(naapi.NaElement('system-get-version'))
+        self.assertEqual(self.conn.request.call_count, 2)
+        self.conn.close.assert_called_once_with()
+
+    def test_invoke_retries_reset_connection(self):
+        self.conn.sock = mock.Mock()
+        self.conn.request.side_effect = [
+            socket.error(errno.ECONNRESET, 'Connection reset by peer'), None]
+        self.server.invoke_elem(naapi.NaElement('system-get-version'))
+        self.assertEqual(self.conn.request.call_count, 2)
+
+    def test_invoke_timeout_not_retried(self):
+        self.conn.sock = mock.Mock()
+        self.conn.getresponse.side_effect = socket.timeout('timed out')
+        self.assertRaises(naapi.NaApiError, self.server.invoke_elem,
+                          naapi.NaElement('system-get-version'))
+        self.assertEqual(self.conn.request.call_count, 1)
+        self.conn.close.assert_called_once_with()
+
+    def test_invoke_reset_after_request_not_retried(self):
+        self.conn.sock = mock.Mock()
+        self.conn.getresponse.side_effect = socket.error(
+            errno.ECONNRESET, 'Connection reset by peer')
+        self.assertRaises(naapi.NaApiError, self.server.invoke_elem,
+                          naapi.NaElement('system-get-version'))
+        self.assertEqual(self.conn.request.call_count, 1)
+
+    def test_invoke_new_connection_error(self):
+        self.conn.getresponse.side_effect = httplib.BadStatusLine('')
+        self.assertRaises(naapi.NaApiError, self.server.invoke_elem,
+                          naapi.NaElement('system-get-version'))
+        self.assertEqual(self.conn.request.call_count, 1)
+
+    def test_invoke_http_error(self):
+        self.conn.getresponse.return_value = fake_response(status=401)
+        try:
+            self.server.invoke_elem(naapi.NaElement('system-get-version'))
+        except naapi.NaApiError as e:
+            self.assertEqual(e.code, 401)
+        else:
+            self.fail('NaApiError not raised')
+
+    def test_invoke_parallel(self):
+        self.stubs.Set(self.server, 'invoke_successfully',
+                       mock.Mock(side_effect=lambda elem, tunneling:
+                                 elem.get_name()))
+        results = self.server.invoke_parallel(
+            [naapi.NaElement('api-%d' % i) for i in range(5)])
+        self.assertEqual(results, ['api-%d' % i for i in range(5)])
+
+    def test_invoke_parallel_error(self):
+        def invoke(elem, tunneling):
+            if elem.get_name() == 'api-1':
+                raise naapi.NaApiError('fake')
+            return elem.get_name()
+        invoke_mock = mock.Mock(side_effect=invoke)
+        self.stubs.Set(self.server, 'invoke_successfully', invoke_mock)
+        self.assertRaises(naapi.NaApiError, self.server.invoke_parallel,
+                          [naapi.NaElement('api-%d' % i) for i in range(3)])
+        self.assertEqual(invoke_mock.call_count, 3)
+
+
+class NetAppApiClientTestCase(test.TestCase):
+    """Tests for paging of *-get-iter apis."""
+
+    def setUp(self):
+        super(NetAppApiClientTestCase, self).setUp()
+        self.flags(netapp_nas_max_records=2)
+        self.client = NetAppApiClient(
+            (1, 15), configuration=configuration.Configuration(None))
+
+    def _page(self, names, next_tag=None):
+        response = naapi.NaElement('results')
+        records = naapi.NaElement('attributes-list')
+        for name in names:
+            record = naapi.NaElement('aggr-attributes')
+            record.add_new_child('aggregate-name', name)
+            records.add_child_elem(record)
+        response.add_child_elem(records)
+        if next_tag:
+            response.add_new_child('next-tag', next_tag)
+        return response
+
+    def test_get_records(self):
+        calls = []
+        pages = [self._page(['aggr1', 'aggr2'], 'tag1'),
+                 self._page(['aggr3'])]
+
+        def send_request(api_name, args):
+            calls.append((api_name, dict(args)))
+            return pages.pop(0)
+        self.stubs.Set(self.client, 'send_request', send_request)
+        desired = {'aggr-attributes': {'aggregate-name': None}}
+
+        records = self.client.get_records('aggr-get-iter',
+                                          desired_attributes=desired)
+        self.assertEqual(calls, [])
+        names = [r.get_child_content('aggregate-name') for r in records]
+
+        self.assertEqual(names, ['aggr1', 'aggr2', 'aggr3'])
+        self.assertEqual(calls, [
+            ('aggr-get-iter', {'max-records': 2,
+                               'desired-attributes': desired}),
+            ('aggr-get-iter', {'max-records': 2,
+                               'desired-attributes': desired,
+                               'tag': 'tag1'}),
+        ])
+
+    def test_get_records_empty(self):
+        self.stubs.Set(self.client, 'send_request',
+                       mock.Mock(return_value=naapi.NaElement('results')))
+        self.assertEqual(list(self.client.get_records('aggr-get-iter')), [])
@@ -71,10 +71,7 @@ class NetAppClusteredDrvTestCase(test.TestCase):
         res = naapi.NaElement('fake')
         res.add_new_child('aggregate-name', 'aggr')
         self.driver.configuration.netapp_root_volume_aggregate = 'root'
-        fake_aggrs = mock.Mock()
-        fake_aggrs.get_child_by_name.return_value = fake_aggrs
-        fake_aggrs.get_children.return_value = [res]
-        self.driver._client.send_request = mock.Mock(return_value=fake_aggrs)
+        self.driver._client.get_records = mock.Mock(return_value=[res])
         vserver_create_args = {
             'vserver-name': 'os_fake_net_id',
             'root-volume-security-style': 'unix',
@@ -92,10 +89,28 @@ class NetAppClusteredDrvTestCase(test.TestCase):
         self.driver._create_vserver('os_fake_net_id')
         self.driver._client.send_request.assert_has_calls([
             mock.call('vserver-create', vserver_create_args),
-            mock.call('aggr-get-iter'),
             mock.call('vserver-modify', vserver_modify_args),
             ]
         )
+        self.driver._client.get_records.assert_called_once_with(
+            'aggr-get-iter',
+            desired_attributes={'aggr-attributes': {'aggregate-name': None}})
+
+    def test_find_match_aggregates_none(self):
+        self.driver._client.get_records = mock.Mock(return_value=[])
+        self.assertRaises(exception.NetAppException,
+                          self.driver._find_match_aggregates)
+
+    def test_get_cluster_nodes(self):
+        nodes = []
+        for name in ('node1', 'node2'):
+            node = naapi.NaElement('node-details-info')
+            node.add_new_child('node', name)
+            nodes.append(node)
+        self.driver._client.get_records = mock.Mock(
+            return_value=iter(nodes))
+        self.assertEqual(self.driver._get_cluster_nodes(),
+                         ['node1', 'node2'])
 
     def test_get_network_allocations_number(self):
         res = mock.Mock()
@@ -377,6 +392,14 @@ class NetAppClusteredDrvTestCase(test.TestCase):
         self.helper.deny_access.assert_called_ince_with(self._context,
                                                         self.share, access)
 
+    def test_update_access(self):
+        access = {'access_to': '1.2.3.4', 'access_type': 'ip'}
+        self.driver.update_access(self._context, self.share, [], [access])
+        self.helper.set_client.assert_called_once_with(self._vserver_client)
+        self.helper.update_access.assert_called_once_with(self._context,
+                                                          self.share,
+                                                          [], [access])
+
     def test_teardown_network(self):
         fake_net_info = {'id': 'fakeid'}
         self.driver._delete_vserver = mock.Mock()
@@ -21,6 +21,7 @@ from neutronclient.v2_0 import client as clientv20
 from oslo.config import cfg
 import unittest
 
+from manila.common import client_auth
 from manila import context
 from manila.db import base
 from manila import exception
@@ -70,6 +71,9 @@ class FakeNeutronClient(object):
     def update_port(self, port_id, body):
         return body
 
+    def update_subnet(self, subnet_id, body):
+        return body
+
     def add_interface_router(self, router_id, subnet_id, port_id):
         pass
 
@@ -400,6 +404,15 @@ class NeutronApiTest(unittest.TestCase):
             client_show_router_mock.assert_called_once_with(router_id)
             self.assertEqual(port, fake_router)
 
+    def test_update_subnet(self):
+        subnet_id = 'fake_subnet_id'
+        with mock.patch.object(self.neutron_api.client, 'update_subnet',
+                               mock.Mock(return_value={'subnet': {}})) as \
+                client_update_subnet_mock:
+            self.neutron_api.update_subnet(subnet_id, 'new_name')
+            client_update_subnet_mock.assert_called_once_with(
+                subnet_id, {'subnet': {'name': 'new_name'}})
+
     def test_router_add_interface(self):
         router_id = 'test port id'
         subnet_id = 'test subnet id'
@@ -432,6 +445,11 @@ class NeutronApiTest(unittest.TestCase):
 
 class TestNeutronClient(unittest.TestCase):
 
+    def setUp(self):
+        super(TestNeutronClient, self).setUp()
+        client_auth.admin_clients.clear()
+        self.addCleanup(client_auth.admin_clients.clear)
+
     @mock.patch.object(clientv20.Client, '__init__',
                        mock.Mock(return_value=None))
     def test_get_client_with_token(self):
@@ -475,3 +493,15 @@ class TestNeutronClient(unittest.TestCase):
 
         neutron.get_client(my_context)
         clientv20.Client.__init__.assert_called_once_with(**client_args)
+
+    @mock.patch.object(clientv20.Client, '__init__',
+                       mock.Mock(return_value=None))
+    def test_get_client_admin_context_shared(self):
+        my_context = context.RequestContext('test_user', 'test_tenant',
+                                            is_admin=True)
+
+        client = neutron.get_client(my_context)
+
+        self.assertIs(client, neutron.get_client(my_context))
+        clientv20.Client.__init__.assert_called_once()
+        self.assertEqual(0, client_auth.admin_clients.auth_calls)
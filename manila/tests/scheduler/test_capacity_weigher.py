@@ -17,7 +17,9 @@ Tests For Capacity Weigher.
 """
 
 from manila import context
-from manila.openstack.common.scheduler.weights import HostWeightHandler
+from manila.openstack.common.scheduler import weights
+from manila.scheduler.weights import capacity
+from manila.scheduler.weights import HostWeightHandler
 from manila import test
 from manila.tests.scheduler import fakes
 from manila.tests import utils as test_utils
@@ -92,3 +94,40 @@ class CapacityWeigherTestCase(test.TestCase):
         weighed_host = self._get_weighed_host(hostinfo_list)
         self.assertEqual(weighed_host.weight, 921.0 * 2)
         self.assertEqual(weighed_host.obj.host, 'host1')
+
+    def test_weigh_columns_match_weigh_object(self):
+        self.flags(capacity_weight_multiplier=2.0)
+        weigher = capacity.CapacityWeigher()
+        hosts = [fakes.FakeHostState('host%d' % i,
+                                     {'free_capacity_gb': free,
+                                      'reserved_percentage': reserved})
+                 for i, (free, reserved) in enumerate([(1024, 10),
+                                                       (512, 0),
+                                                       ('unknown', 0)])]
+        weighed_hosts = [weights.WeighedHost(host, 0.0) for host in hosts]
+
+        weigher.weigh_objects(weighed_hosts, {})
+
+        self.assertEqual([921.0 * 2, 512.0 * 2, float('inf')],
+                         [host.weight for host in weighed_hosts])
+        self.assertEqual([2.0 * weigher._weigh_object(host, {})
+                          for host in hosts],
+                         [host.weight for host in weighed_hosts])
+
+    def test_weigh_with_object_weigher(self):
+        class FreeIfHost2Weigher(weights.BaseHostWeigher):
+            def _weigh_object(self, host_state, weight_properties):
+                return 1000.0 if host_state.host == 'host2' else 0.0
+
+        hosts = [fakes.FakeHostState('host%d' % i,
+                                     {'free_capacity_gb': free,
+                                      'reserved_percentage': 0})
+                 for i, free in enumerate([500, 400, 100])]
+
+        weighed_hosts = self.weight_handler.get_weighed_objects(
+            [capacity.CapacityWeigher, FreeIfHost2Weigher], hosts, {})
+
+        self.assertEqual(['host2', 'host0', 'host1'],
+                         [weighed.obj.host for weighed in weighed_hosts])
+        self.assertEqual([1100.0, 500.0, 400.0],
+                         [weighed.weight for weighed in weighed_hosts])
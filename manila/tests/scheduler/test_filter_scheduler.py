@@ -23,6 +23,7 @@ from manila import test
 from manila.openstack.common.scheduler import weights
 from manila.scheduler import filter_scheduler
 from manila.scheduler import host_manager
+from manila.scheduler import weights as host_weights
 from manila.tests.scheduler import fakes
 from manila.tests.scheduler import test_scheduler
 from manila.tests import utils as test_utils
@@ -104,7 +105,7 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.stubs.Set(sched.host_manager, 'get_filtered_hosts',
                        fake_get_filtered_hosts)
-        self.stubs.Set(weights.HostWeightHandler,
+        self.stubs.Set(host_weights.HostWeightHandler,
                        'get_weighed_objects', _fake_weigh_objects)
         fakes.mox_host_manager_db_calls_share(self.mox, fake_context)
 
@@ -154,3 +155,75 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                          filter_properties['retry']['hosts'][0])
 
         self.assertEqual(1024, host_state.total_capacity_gb)
+
+    def _fake_batch_scheduler(self):
+        sched = fakes.FakeFilterScheduler()
+        hosts = [fakes.FakeHostState('host1', {'free_capacity_gb': 10}),
+                 fakes.FakeHostState('host2', {'free_capacity_gb': 5})]
+        self.filter_calls = 0
+
+        def _fake_get_filtered_hosts(hosts, filter_properties):
+            self.filter_calls += 1
+            return [host for host in hosts
+                    if host.free_capacity_gb >= filter_properties['size']]
+
+        def _fake_get_weighed_hosts(hosts, weight_properties):
+            return [weights.WeighedHost(host, host.free_capacity_gb)
+                    for host in sorted(hosts, reverse=True,
+                                       key=lambda h: h.free_capacity_gb)]
+
+        self.stubs.Set(sched.host_manager, 'get_all_host_states_share',
+                       lambda context: hosts)
+        self.stubs.Set(sched.host_manager, 'get_filtered_hosts',
+                       _fake_get_filtered_hosts)
+        self.stubs.Set(sched.host_manager, 'get_weighed_hosts',
+                       _fake_get_weighed_hosts)
+        self.stubs.Set(filter_scheduler.driver, 'share_update_db',
+                       lambda context, share_id, host: {'id': share_id})
+        self.casts = {}
+        self.stubs.Set(sched.share_rpcapi, 'create_shares',
+                       lambda context, host, shares:
+                       self.casts.setdefault(host, []).extend(shares))
+        return sched
+
+    def _batch_request_spec(self, share_id, size):
+        return {'share_id': share_id,
+                'snapshot_id': None,
+                'share_type': {'name': 'LVM_NFS'},
+                'share_properties': {'project_id': 1, 'size': size}}
+
+    def test_schedule_create_shares(self):
+        self.flags(scheduler_max_attempts=1)
+        sched = self._fake_batch_scheduler()
+        fake_context = context.RequestContext('user', 'project',
+                                              is_admin=True)
+        request_specs = [self._batch_request_spec('fake-id%d' % i, 4)
+                         for i in range(3)]
+
+        failed = sched.schedule_create_shares(fake_context, request_specs, {})
+
+        self.assertEqual([], failed)
+        self.assertEqual(['fake-id0', 'fake-id1'],
+                         [s['share_id'] for s in self.casts['host1']])
+        self.assertEqual(['fake-id2'],
+                         [s['share_id'] for s in self.casts['host2']])
+        # One pass for the size class plus one re-check per placement.
+        self.assertEqual(4, self.filter_calls)
+
+    def test_schedule_create_shares_returns_unplaced(self):
+        self.flags(scheduler_max_attempts=1)
+        sched = self._fake_batch_scheduler()
+        fake_context = context.RequestContext('user', 'project',
+                                              is_admin=True)
+        request_specs = [self._batch_request_spec('fake-id0', 8),
+                         self._batch_request_spec('fake-id1', 8),
+                         self._batch_request_spec('fake-id2', 2)]
+
+        failed = sched.schedule_create_shares(fake_context, request_specs, {})
+
+        self.assertEqual([request_specs[1]], [spec for spec, ex in failed])
+        self.assertTrue(isinstance(failed[0][1], exception.NoValidHost))
+        self.assertEqual(['fake-id0'],
+                         [s['share_id'] for s in self.casts['host1']])
+        self.assertEqual(['fake-id2'],
+                         [s['share_id'] for s in self.casts['host2']])
@@ -23,6 +23,8 @@ from manila import db
 from manila import exception
 from manila.openstack.common import jsonutils
 from manila.openstack.common.scheduler import filters
+from manila.scheduler import filters as host_filters
+from manila.scheduler.filters import capacity_filter
 from manila import test
 from manila.tests.scheduler import fakes
 from manila.tests import utils as test_utils
@@ -157,3 +159,54 @@ class HostFiltersTestCase(test.TestCase):
         retry = dict(num_attempts=1, hosts=['host1'])
         filter_properties = dict(retry=retry)
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
+
+    def test_capacity_filter_columns_match_host_passes(self):
+        filt = capacity_filter.CapacityFilter()
+        filter_properties = {'size': 100}
+        hosts = [fakes.FakeHostState('host%d' % i,
+                                     {'free_capacity_gb': free,
+                                      'reserved_percentage': reserved})
+                 for i, (free, reserved) in enumerate([(200, 0),
+                                                       (120, 20),
+                                                       ('infinite', 0),
+                                                       ('unknown', 0),
+                                                       (None, 0)])]
+
+        passed = list(filt.filter_all(hosts, filter_properties))
+
+        self.assertEqual(['host0', 'host2', 'host3'],
+                         [host.host for host in passed])
+        self.assertEqual([host for host in hosts
+                          if filt.host_passes(host, filter_properties)],
+                         passed)
+
+    def test_capacity_filter_host_passes_override(self):
+        class OverridingFilter(capacity_filter.CapacityFilter):
+            def host_passes(self, host_state, filter_properties):
+                return host_state.host == 'host1'
+
+        hosts = [fakes.FakeHostState('host%d' % i,
+                                     {'free_capacity_gb': 200,
+                                      'reserved_percentage': 0})
+                 for i in range(2)]
+
+        passed = list(OverridingFilter().filter_all(hosts, {'size': 100}))
+
+        self.assertEqual(['host1'], [host.host for host in passed])
+
+    def test_column_and_object_filters(self):
+        class NotHost0Filter(filters.BaseHostFilter):
+            def host_passes(self, host_state, filter_properties):
+                return host_state.host != 'host0'
+
+        hosts = [fakes.FakeHostState('host%d' % i,
+                                     {'free_capacity_gb': free,
+                                      'reserved_percentage': 0})
+                 for i, free in enumerate([200, 200, 50, 'unknown'])]
+        handler = host_filters.HostFilterHandler('manila.scheduler.filters')
+
+        passed = handler.get_filtered_objects(
+            [capacity_filter.CapacityFilter, NotHost0Filter], hosts,
+            {'size': 100})
+
+        self.assertEqual(['host1', 'host3'], [host.host for host in passed])
@@ -17,11 +17,14 @@ Tests For HostManager
 """
 
 
+import mock
+
 from manila import db
 from manila import exception
 
 from manila.openstack.common.scheduler import filters
 from manila.openstack.common import timeutils
+from manila.scheduler import host_columns
 from manila.scheduler import host_manager
 from manila import test
 from manila.tests.scheduler import fakes
@@ -160,6 +163,144 @@ class HostManagerTestCase(test.TestCase):
             self.assertEqual(host_state_map[host].service,
                              share_node)
 
+    def test_get_all_host_states_share_skips_down_services(self):
+        context = 'fake_context'
+        liveness_driver = mock.Mock()
+        # The liveness driver may return copies of the service records.
+        liveness_driver.filter_up.side_effect = lambda services: [
+            dict(service) for service in services
+            if service['host'] != 'host2']
+        self.stubs.Set(host_manager.liveness, 'get_driver',
+                       mock.Mock(return_value=liveness_driver))
+        self.stubs.Set(db, 'service_get_all_by_topic',
+                       mock.Mock(return_value=fakes.SHARE_SERVICES))
+
+        hosts = self.host_manager.get_all_host_states_share(context)
+
+        self.assertEqual(['host1', 'host3', 'host4'],
+                         [host_state.host for host_state in hosts])
+
+    def test_get_all_host_states_share_cached(self):
+        context = 'fake_context'
+        topic = CONF.share_topic
+
+        self.mox.StubOutWithMock(db, 'service_get_all_by_topic')
+        self.mox.StubOutWithMock(host_manager.time, 'time')
+
+        host_manager.time.time().AndReturn(100)
+        db.service_get_all_by_topic(context, topic).AndReturn(
+            fakes.SHARE_SERVICES)
+        host_manager.time.time().AndReturn(100)
+        host_manager.time.time().AndReturn(105)
+        host_manager.time.time().AndReturn(110)
+        db.service_get_all_by_topic(context, topic).AndReturn(
+            fakes.SHARE_SERVICES[:2])
+        host_manager.time.time().AndReturn(110)
+
+        self.mox.ReplayAll()
+        self.flags(scheduler_host_state_cache_ttl=10)
+        hosts = self.host_manager.get_all_host_states_share(context)
+        self.assertEqual(4, len(hosts))
+        cached_hosts = self.host_manager.get_all_host_states_share(context)
+        self.assertTrue(cached_hosts is hosts)
+        hosts = self.host_manager.get_all_host_states_share(context)
+        self.assertEqual(['host1', 'host2'], [h.host for h in hosts])
+
+    def test_get_all_host_states_share_no_cache(self):
+        context = 'fake_context'
+        topic = CONF.share_topic
+
+        self.mox.StubOutWithMock(db, 'service_get_all_by_topic')
+        db.service_get_all_by_topic(context, topic).AndReturn(
+            fakes.SHARE_SERVICES)
+        db.service_get_all_by_topic(context, topic).AndReturn(
+            fakes.SHARE_SERVICES)
+
+        self.mox.ReplayAll()
+        self.flags(scheduler_host_state_cache_ttl=0)
+        self.host_manager.get_all_host_states_share(context)
+        self.host_manager.get_all_host_states_share(context)
+
+    def test_update_service_capabilities_updates_cached_host(self):
+        context = 'fake_context'
+        topic = CONF.share_topic
+
+        self.mox.StubOutWithMock(db, 'service_get_all_by_topic')
+        db.service_get_all_by_topic(context, topic).AndReturn(
+            fakes.SHARE_SERVICES)
+
+        self.mox.ReplayAll()
+        self.flags(scheduler_host_state_cache_ttl=60)
+        self.host_manager.get_all_host_states_share(context)
+        capabilities = {'total_capacity_gb': 1024,
+                        'free_capacity_gb': 512,
+                        'reserved_percentage': 0}
+        self.host_manager.update_service_capabilities('share', 'host1',
+                                                      capabilities)
+        hosts = self.host_manager.get_all_host_states_share(context)
+
+        host_state = self.host_manager.host_state_map['host1']
+        self.assertTrue(host_state in hosts)
+        self.assertEqual(512, host_state.free_capacity_gb)
+        self.assertEqual(512, host_state.capabilities['free_capacity_gb'])
+        self.assertEqual(fakes.SHARE_SERVICES[0], host_state.service)
+
+    def test_update_service_capabilities_versioned(self):
+        capabilities = {'total_capacity_gb': 1024,
+                        'free_capacity_gb': 512,
+                        'reserved_percentage': 0}
+        self.assertFalse(self.host_manager.update_service_capabilities(
+            'share', 'host1', capabilities, version=1))
+        # Delta on top of version 1.
+        self.assertFalse(self.host_manager.update_service_capabilities(
+            'share', 'host1', {'free_capacity_gb': 256}, version=2,
+            base_version=1))
+        self.assertEqual(
+            self.host_manager.service_states['host1']['free_capacity_gb'],
+            256)
+        self.assertEqual(
+            self.host_manager.service_states['host1']['total_capacity_gb'],
+            1024)
+        # Heartbeat only refreshes the timestamp.
+        states = self.host_manager.service_states['host1']
+        self.assertFalse(self.host_manager.update_service_capabilities(
+            'share', 'host1', {}, version=2, base_version=2))
+        self.assertTrue(self.host_manager.service_states['host1'] is states)
+
+    def test_update_service_capabilities_version_gap(self):
+        capabilities = {'free_capacity_gb': 512}
+        self.host_manager.update_service_capabilities(
+            'share', 'host1', capabilities, version=1)
+        self.assertTrue(self.host_manager.update_service_capabilities(
+            'share', 'host1', {'free_capacity_gb': 10}, version=3,
+            base_version=2))
+        # Resync is requested once until the full report arrives.
+        self.assertFalse(self.host_manager.update_service_capabilities(
+            'share', 'host1', {}, version=3, base_version=3))
+        self.assertEqual(
+            self.host_manager.service_states['host1']['free_capacity_gb'],
+            512)
+        self.host_manager.update_service_capabilities(
+            'share', 'host1', {'free_capacity_gb': 10}, version=3)
+        self.assertTrue(self.host_manager.update_service_capabilities(
+            'share', 'host1', {}, version=5, base_version=5))
+
+    def test_update_service_capabilities_resync_repeated(self):
+        now = [100]
+        self.stubs.Set(host_manager, 'time', mock.Mock(time=lambda: now[0]))
+        self.assertTrue(self.host_manager.update_service_capabilities(
+            'share', 'host1', {}, version=1, base_version=1))
+        # The full report got lost.
+        self.assertFalse(self.host_manager.update_service_capabilities(
+            'share', 'host1', {}, version=1, base_version=1))
+        now[0] += CONF.service_down_time
+        self.assertTrue(self.host_manager.update_service_capabilities(
+            'share', 'host1', {}, version=1, base_version=1))
+
+    def test_update_service_capabilities_unknown_host(self):
+        self.assertTrue(self.host_manager.update_service_capabilities(
+            'share', 'host1', {}, version=1, base_version=1))
+
 
 class HostStateTestCase(test.TestCase):
     """Test case for HostState class."""
@@ -247,3 +388,22 @@ class HostStateTestCase(test.TestCase):
         fake_host.consume_from_share(fake_share)
         self.assertEqual(fake_host.total_capacity_gb, 'infinite')
         self.assertEqual(fake_host.free_capacity_gb, 'unknown')
+
+    def test_host_state_columns_follow_host_states(self):
+        host_states = [host_manager.HostState('host%d' % i)
+                       for i in range(2)]
+        for host_state, free in zip(host_states, [100, 'infinite']):
+            host_state.update_from_share_capability(
+                {'total_capacity_gb': 200, 'free_capacity_gb': free,
+                 'reserved_percentage': 10, 'timestamp': None})
+        columns = host_columns.HostStateColumns(host_states, attach=True)
+
+        host_states[0].consume_from_share({'size': 30})
+        host_states[1].consume_from_share({'size': 30})
+
+        self.assertEqual([70, float('inf')], list(columns.free_capacity_gb))
+        self.assertEqual([200, 200], list(columns.total_capacity_gb))
+        self.assertEqual([10, 10], list(columns.reserved_percentage))
+        taken = host_columns.get_columns(host_states[::-1])
+        self.assertEqual([float('inf'), 70], list(taken.free_capacity_gb))
+        self.assertEqual(list(taken.hosts), host_states[::-1])
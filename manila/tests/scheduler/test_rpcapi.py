@@ -68,7 +68,10 @@ class SchedulerRpcAPITestCase(test.TestCase):
                                  rpc_method='fanout_cast',
                                  service_name='fake_name',
                                  host='fake_host',
-                                 capabilities='fake_capabilities')
+                                 capabilities='fake_capabilities',
+                                 capabilities_version=2,
+                                 base_version=1,
+                                 version='1.5')
 
     def test_create_share(self):
         self._test_scheduler_api('create_share',
@@ -79,3 +82,11 @@ class SchedulerRpcAPITestCase(test.TestCase):
                                  request_spec='fake_request_spec',
                                  filter_properties='filter_properties',
                                  version='1.3')
+
+    def test_create_shares(self):
+        self._test_scheduler_api('create_shares',
+                                 rpc_method='cast',
+                                 topic='topic',
+                                 request_specs=['fake_request_spec'],
+                                 filter_properties='filter_properties',
+                                 version='1.4')
@@ -29,6 +29,7 @@ from manila.openstack.common import timeutils
 from manila.scheduler import driver
 from manila.scheduler import manager
 from manila.scheduler import simple
+from manila.share import rpcapi as share_rpcapi
 from manila import test
 from manila import utils
 from oslo.config import cfg
@@ -69,8 +70,8 @@ class SchedulerManagerTestCase(test.TestCase):
                                  'update_service_capabilities')
 
         # Test no capabilities passes empty dictionary
-        self.manager.driver.update_service_capabilities(service_name,
-                                                        host, {})
+        self.manager.driver.update_service_capabilities(
+            service_name, host, {}, version=None, base_version=None)
         self.mox.ReplayAll()
         result = self.manager.update_service_capabilities(
             self.context,
@@ -81,15 +82,31 @@ class SchedulerManagerTestCase(test.TestCase):
         self.mox.ResetAll()
         # Test capabilities passes correctly
         capabilities = {'fake_capability': 'fake_value'}
-        self.manager.driver.update_service_capabilities(service_name,
-                                                        host,
-                                                        capabilities)
+        self.manager.driver.update_service_capabilities(
+            service_name, host, capabilities, version=None,
+            base_version=None)
         self.mox.ReplayAll()
         result = self.manager.update_service_capabilities(
             self.context,
             service_name=service_name, host=host,
             capabilities=capabilities)
 
+    def test_update_service_capabilities_requests_resync(self):
+        self.mox.StubOutWithMock(self.manager.driver,
+                                 'update_service_capabilities')
+        self.mox.StubOutWithMock(share_rpcapi.ShareAPI,
+                                 'publish_service_capabilities')
+        self.manager.driver.update_service_capabilities(
+            'share', 'fake_host', {}, version=3,
+            base_version=3).AndReturn(True)
+        share_rpcapi.ShareAPI.publish_service_capabilities(self.context,
+                                                           host='fake_host')
+        self.mox.ReplayAll()
+        self.manager.update_service_capabilities(
+            self.context, service_name='share', host='fake_host',
+            capabilities={}, capabilities_version=3, base_version=3)
+        self.mox.VerifyAll()
+
     def test_create_share_exception_puts_share_in_error_state(self):
         """Test that a NoValideHost exception for create_share.
 
@@ -113,6 +130,21 @@ class SchedulerManagerTestCase(test.TestCase):
                                   request_spec=request_spec,
                                   filter_properties={})
 
+    def test_create_shares_puts_unplaced_shares_in_error_state(self):
+        self._mox_schedule_method_helper('schedule_create_shares')
+        self.mox.StubOutWithMock(db, 'share_update')
+
+        request_specs = [{'share_id': 1}, {'share_id': 2}]
+
+        self.manager.driver.schedule_create_shares(
+            self.context, request_specs, {}).AndReturn(
+                [(request_specs[1], exception.NoValidHost(reason=""))])
+        db.share_update(self.context, 2, {'status': 'error'})
+
+        self.mox.ReplayAll()
+        self.manager.create_shares(self.context, 'fake_topic', request_specs,
+                                   filter_properties={})
+
     def _mox_schedule_method_helper(self, method_name):
         # Make sure the method exists that we're going to test call
         def stub_method(*args, **kwargs):
@@ -144,13 +176,14 @@ class SchedulerTestCase(test.TestCase):
                                  'update_service_capabilities')
 
         capabilities = {'fake_capability': 'fake_value'}
-        self.driver.host_manager.update_service_capabilities(service_name,
-                                                             host,
-                                                             capabilities)
+        self.driver.host_manager.update_service_capabilities(
+            service_name, host, capabilities, version=2, base_version=1)
         self.mox.ReplayAll()
         result = self.driver.update_service_capabilities(service_name,
                                                          host,
-                                                         capabilities)
+                                                         capabilities,
+                                                         version=2,
+                                                         base_version=1)
 
     def test_hosts_up(self):
         service1 = {'host': 'host1'}
@@ -0,0 +1,100 @@
+# Copyright 2014 Mirantis Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+import mock
+
+from manila.common import client_auth
+from manila.openstack.common import timeutils
+from manila import test
+
+
+class FakeHTTPClient(object):
+
+    def __init__(self, expires_in=3600):
+        self.auth_token = None
+        self.expires_in = expires_in
+        self.service_catalog = None
+        self.authenticate = mock.Mock(side_effect=self._authenticate)
+
+    def _authenticate(self):
+        expires = timeutils.utcnow() + datetime.timedelta(
+            seconds=self.expires_in)
+        self.auth_token = 'fake_token'
+        self.service_catalog = mock.Mock()
+        self.service_catalog.catalog = {
+            'access': {'token': {'id': 'fake_token',
+                                 'expires': timeutils.isotime(expires)}}}
+
+
+class FakeClient(object):
+
+    def __init__(self, *args, **kwargs):
+        self.client = FakeHTTPClient(**kwargs)
+
+
+class AdminClientCacheTestCase(test.TestCase):
+
+    def setUp(self):
+        super(AdminClientCacheTestCase, self).setUp()
+        self.cache = client_auth.AdminClientCache()
+        self.build = mock.Mock(side_effect=FakeClient)
+
+    def test_get_reuses_client_and_token(self):
+        key = ('cinder', 'user', 'password', 'tenant', 'url')
+
+        client = self.cache.get(key, self.build)
+        same_client = self.cache.get(key, self.build)
+
+        self.assertIs(client, same_client)
+        self.build.assert_called_once_with()
+        client.client.authenticate.assert_called_once_with()
+        self.assertEqual(1, self.cache.client_constructions)
+        self.assertEqual(1, self.cache.auth_calls)
+
+    def test_get_separate_clients_per_key(self):
+        client = self.cache.get(('cinder', 'user1'), self.build)
+        other_client = self.cache.get(('cinder', 'user2'), self.build)
+
+        self.assertIsNot(client, other_client)
+        self.assertEqual(2, self.cache.client_constructions)
+        self.assertEqual(2, self.cache.auth_calls)
+
+    def test_get_reauthenticates_token_about_to_expire(self):
+        self.flags(admin_client_token_expiry_window=300)
+        build = mock.Mock(return_value=FakeClient(expires_in=60))
+
+        client = self.cache.get(('nova', 'user'), build)
+        self.cache.get(('nova', 'user'), build)
+
+        self.assertEqual(2, client.client.authenticate.call_count)
+        self.assertEqual(1, self.cache.client_constructions)
+        self.assertEqual(2, self.cache.auth_calls)
+
+    def test_get_without_authenticate(self):
+        client = self.cache.get(('neutron', 'user'), self.build,
+                                authenticate=False)
+
+        self.assertFalse(client.client.authenticate.called)
+        self.assertEqual(0, self.cache.auth_calls)
+        self.assertEqual(1, self.cache.client_constructions)
+
+    def test_clear(self):
+        self.cache.get(('cinder', 'user'), self.build)
+        self.cache.clear()
+        self.cache.get(('cinder', 'user'), self.build)
+
+        self.assertEqual(2, self.build.call_count)
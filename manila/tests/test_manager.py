@@ -0,0 +1,185 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Mirantis Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Unit tests for periodic tasks of managers."""
+
+import eventlet
+import mock
+
+from manila import context
+from manila import manager
+from manila import test
+
+
+class PeriodicManager(manager.Manager):
+
+    def __init__(self, *args, **kwargs):
+        super(PeriodicManager, self).__init__(*args, **kwargs)
+        self.calls = []
+        self.block = eventlet.event.Event()
+
+    @manager.periodic_task
+    def _every_tick(self, context):
+        self.calls.append('every_tick')
+
+    @manager.periodic_task(spacing=60)
+    def _spaced(self, context):
+        self.calls.append('spaced')
+
+    @manager.periodic_task(timeout=1)
+    def _slow(self, context):
+        self.calls.append('slow')
+        self.block.wait()
+
+    @manager.periodic_task(timeout=0.01)
+    def _hanging(self, context):
+        eventlet.sleep(1)
+
+    @manager.periodic_task(spacing=5, timeout=0)
+    def _failing(self, context):
+        raise ValueError()
+
+
+class PeriodicTasksTestCase(test.TestCase):
+
+    def setUp(self):
+        super(PeriodicTasksTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.manager = PeriodicManager(host='fake_host')
+        self.now = 1000.0
+        self.stubs.Set(manager, 'time', mock.Mock(time=lambda: self.now))
+
+    def tearDown(self):
+        if not self.manager.block.ready():
+            self.manager.block.send()
+        eventlet.sleep(0)
+        super(PeriodicTasksTestCase, self).tearDown()
+
+    def _tick(self):
+        self.manager.periodic_tasks(self.context)
+        eventlet.sleep(0)
+
+    def test_tasks_run_concurrently(self):
+        self._tick()
+        self.assertEqual(sorted(self.manager.calls),
+                         ['every_tick', 'slow', 'spaced'])
+        stats = self.manager.periodic_task_stats(self.context)
+        self.assertTrue(stats['_slow']['running'])
+        self.assertEqual(stats['_every_tick']['runs'], 1)
+        self.assertEqual(stats['_failing']['errors'], 1)
+
+    def test_no_overlap(self):
+        self._tick()
+        self._tick()
+        self.assertEqual(self.manager.calls.count('slow'), 1)
+        self.assertEqual(self.manager.calls.count('every_tick'), 2)
+        self.manager.block.send()
+        eventlet.sleep(0)
+        self._tick()
+        self.assertEqual(self.manager.calls.count('slow'), 2)
+
+    def test_spacing(self):
+        self._tick()
+        self.now += 30
+        self._tick()
+        self.assertEqual(self.manager.calls.count('spaced'), 1)
+        self.now += 40
+        self._tick()
+        self.assertEqual(self.manager.calls.count('spaced'), 2)
+        stats = self.manager.periodic_task_stats(self.context)
+        self.assertEqual(stats['_spaced']['last_lateness'], 10)
+        self.assertEqual(stats['_spaced']['next_run'], self.now + 60)
+
+    def test_jitter(self):
+        task = mock.Mock(_spacing=10, _jitter=4, _ticks_between_runs=0,
+                         _timeout=None, __name__='_task')
+        self.stubs.Set(self.manager, '_periodic_tasks', [('_task', task)])
+        self.stubs.Set(self.manager, '_ticks_to_skip', {'_task': 0})
+        self.stubs.Set(manager.random, 'uniform', mock.Mock(return_value=3))
+        self.manager.periodic_tasks(self.context, raise_on_error=True)
+        manager.random.uniform.assert_called_once_with(0, 4)
+        self.assertEqual(self.manager._periodic_state['_task'].next_run,
+                         self.now + 13)
+
+    def test_timeout(self):
+        self.stubs.Set(self.manager, '_periodic_tasks',
+                       [('_hanging', PeriodicManager._hanging.im_func)])
+        self.manager.periodic_tasks(self.context)
+        self.manager._periodic_state['_hanging'].thread.wait()
+        stats = self.manager.periodic_task_stats(self.context)
+        self.assertEqual(stats['_hanging']['timeouts'], 1)
+        self.assertFalse(stats['_hanging']['running'])
+
+    def test_raise_on_error(self):
+        self.stubs.Set(self.manager, '_periodic_tasks',
+                       [('_failing', PeriodicManager._failing.im_func)])
+        self.assertRaises(ValueError, self.manager.periodic_tasks,
+                          self.context, raise_on_error=True)
+
+
+class PublishCapabilitiesTestCase(test.TestCase):
+
+    def setUp(self):
+        super(PublishCapabilitiesTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.manager = manager.SchedulerDependentManager(
+            host='fake_host', service_name='share')
+        self.manager.scheduler_rpcapi = mock.Mock()
+        self.update = \
+            self.manager.scheduler_rpcapi.update_service_capabilities
+
+    def _publish(self, capabilities):
+        self.manager.update_service_capabilities(capabilities)
+        self.manager._publish_service_capabilities(self.context)
+        return self.update.call_args
+
+    def test_nothing_to_publish(self):
+        self.manager._publish_service_capabilities(self.context)
+        self.assertFalse(self.update.called)
+
+    def test_publish_deltas(self):
+        self.assertEqual(
+            self._publish({'free_capacity_gb': 10, 'total_capacity_gb': 20}),
+            mock.call(self.context, 'share', 'fake_host',
+                      {'free_capacity_gb': 10, 'total_capacity_gb': 20},
+                      capabilities_version=1, base_version=None))
+        self.assertEqual(
+            self._publish({'free_capacity_gb': 5, 'total_capacity_gb': 20}),
+            mock.call(self.context, 'share', 'fake_host',
+                      {'free_capacity_gb': 5},
+                      capabilities_version=2, base_version=1))
+        self.assertEqual(
+            self._publish({'free_capacity_gb': 5, 'total_capacity_gb': 20}),
+            mock.call(self.context, 'share', 'fake_host', {},
+                      capabilities_version=2, base_version=2))
+
+    def test_publish_full_on_removed_key(self):
+        self._publish({'free_capacity_gb': 10, 'QoS_support': False})
+        self.assertEqual(
+            self._publish({'free_capacity_gb': 10}),
+            mock.call(self.context, 'share', 'fake_host',
+                      {'free_capacity_gb': 10},
+                      capabilities_version=2, base_version=None))
+
+    def test_publish_full_on_resync(self):
+        self._publish({'free_capacity_gb': 10})
+        self.manager.resync_service_capabilities()
+        self.assertEqual(
+            self._publish({'free_capacity_gb': 10}),
+            mock.call(self.context, 'share', 'fake_host',
+                      {'free_capacity_gb': 10},
+                      capabilities_version=2, base_version=None))
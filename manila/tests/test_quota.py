@@ -17,9 +17,12 @@
 #    under the License.
 
 import datetime
+import sqlite3
 
 import mock
 from oslo.config import cfg
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import OperationalError
 
 from manila import context
 from manila import db
@@ -767,6 +770,59 @@ class DbQuotaDriverTestCase(test.TestCase):
                                       'quota_class_get_all_by_name', ])
         self.assertEqual(result, self.expected_all_context)
 
+    def test_get_project_quotas_cached(self):
+        self.flags(quota_cache_ttl=60)
+        self._stub_get_by_project()
+        context = FakeContext('test_project', 'test_class')
+
+        for i in range(2):
+            result = self.driver.get_project_quotas(
+                context, quota.QUOTAS._resources, 'test_project')
+
+        self.assertEqual(self.calls, ['quota_get_all_by_project',
+                                      'quota_usage_get_all_by_project',
+                                      'quota_class_get_all_by_name',
+                                      'quota_usage_get_all_by_project', ])
+        self.assertEqual(result, self.expected_all_context)
+        self.assertEqual(3, self.driver.cache_hits)
+        self.assertEqual(3, self.driver.cache_misses)
+
+        self.driver.invalidate_cache()
+        self.calls = []
+        self.driver.get_project_quotas(context, quota.QUOTAS._resources,
+                                       'test_project')
+        self.assertEqual(self.calls, ['quota_get_all_by_project',
+                                      'quota_usage_get_all_by_project',
+                                      'quota_class_get_all_by_name', ])
+
+    def test_get_project_quotas_cache_expires(self):
+        self.flags(quota_cache_ttl=60)
+        self._stub_get_by_project()
+        context = FakeContext('test_project', 'test_class')
+        self.mox.StubOutWithMock(quota.time, 'time')
+        quota.time.time().AndReturn(1000)
+        quota.time.time().AndReturn(1061)
+        self.mox.ReplayAll()
+
+        self.driver._get_project_limits(context, 'test_project')
+        self.driver._get_project_limits(context, 'test_project')
+
+        self.assertEqual(self.calls, ['quota_get_all_by_project',
+                                      'quota_get_all_by_project', ])
+        self.assertEqual(0, self.driver.cache_hits)
+
+    def test_get_project_quotas_other_project_not_cached(self):
+        self.flags(quota_cache_ttl=60)
+        self._stub_get_by_project()
+        context = FakeContext('other_project', None)
+
+        for i in range(2):
+            self.driver._get_project_limits(context, 'test_project')
+
+        self.assertEqual(self.calls, ['quota_get_all_by_project',
+                                      'quota_get_all_by_project', ])
+        self.assertEqual(0, self.driver.cache_misses)
+
     def test_get_user_quotas_alt_context_no_class(self):
         self._stub_get_by_project_and_user()
         result = self.driver.get_user_quotas(
@@ -1139,6 +1195,11 @@ class FakeUsage(sqa_models.QuotaUsage):
         pass
 
 
+class FakeProjectUsage(sqa_models.ProjectQuotaUsage):
+    def save(self, *args, **kwargs):
+        pass
+
+
 class QuotaReserveSqlAlchemyTestCase(test.TestCase):
     # manila.db.sqlalchemy.api.quota_reserve is so complex it needs its
     # own test case, and since it's a quota manipulator, this is the
@@ -1171,15 +1232,28 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
 
         self.usages = {}
         self.usages_created = {}
+        self.project_usages = {}
         self.reservations_created = {}
 
         def fake_get_session():
             return FakeSession()
 
-        def fake_get_project_quota_usages(context, session, project_id):
-            return self.usages.copy()
-
-        def fake_get_user_quota_usages(context, session, project_id, user_id):
+        def fake_get_project_quota_usages(context, session, project_id,
+                                          resources):
+            for resource in resources:
+                if resource not in self.project_usages:
+                    usage = self.usages.get(resource)
+                    total = FakeProjectUsage()
+                    total.project_id = project_id
+                    total.resource = resource
+                    total.in_use = usage.in_use if usage else 0
+                    total.reserved = usage.reserved if usage else 0
+                    self.project_usages[resource] = total
+            return dict((resource, self.project_usages[resource])
+                        for resource in resources)
+
+        def fake_get_user_quota_usages(context, session, project_id, user_id,
+                                       resources=None):
             return self.usages.copy()
 
         def fake_quota_usage_create(context, project_id, user_id, resource,
@@ -1543,3 +1617,246 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
                                        usage_id=self.usages['gigabytes'],
                                        project_id='test_project',
                                        delta=-2 * 1024), ])
+
+    def test_quota_reserve_locks_only_delta_resources(self):
+        self.init_usage('test_project', 'test_user', 'shares', 3, 0)
+        locked = []
+
+        def fake_get_user_quota_usages(context, session, project_id, user_id,
+                                       resources=None):
+            locked.append(sorted(resources))
+            return self.usages.copy()
+
+        self.stubs.Set(sqa_api, '_get_user_quota_usages',
+                       fake_get_user_quota_usages)
+        context = FakeContext('test_project', 'test_class')
+        quotas = dict(shares=5, gigabytes=10 * 1024, )
+        deltas = dict(shares=1, )
+
+        sqa_api.quota_reserve(context, self.resources, quotas, quotas,
+                              deltas, self.expire, 0, 0)
+
+        self.assertEqual([['shares']], locked)
+
+    def _test_quota_reserve_deadlock(self, orig, retried):
+        self.flags(db_deadlock_retry_interval=0)
+        self.init_usage('test_project', 'test_user', 'shares', 3, 0)
+        deadlock = exception.DBError(OperationalError('SELECT', {}, orig))
+        attempts = []
+
+        def fake_get_user_quota_usages(context, session, project_id, user_id,
+                                       resources=None):
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise deadlock
+            return self.usages.copy()
+
+        self.stubs.Set(sqa_api, '_get_user_quota_usages',
+                       fake_get_user_quota_usages)
+        context = FakeContext('test_project', 'test_class')
+        quotas = dict(shares=5, gigabytes=10 * 1024, )
+        deltas = dict(shares=1, )
+
+        if not retried:
+            self.assertRaises(exception.DBError, sqa_api.quota_reserve,
+                              context, self.resources, quotas, quotas,
+                              deltas, self.expire, 0, 0)
+            self.assertEqual(1, len(attempts))
+            return
+
+        result = sqa_api.quota_reserve(context, self.resources, quotas,
+                                       quotas, deltas, self.expire, 0, 0)
+
+        self.assertEqual(2, len(attempts))
+        self.assertEqual(1, len(result))
+
+    def test_quota_reserve_retries_on_mysql_deadlock(self):
+        self._test_quota_reserve_deadlock(
+            Exception(1213, 'Deadlock found when trying to get lock'), True)
+
+    def test_quota_reserve_retries_on_mysql_lock_wait_timeout(self):
+        self._test_quota_reserve_deadlock(
+            Exception(1205, 'Lock wait timeout exceeded'), True)
+
+    def test_quota_reserve_retries_on_postgresql_deadlock(self):
+        orig = Exception('deadlock detected')
+        orig.pgcode = '40P01'
+        self._test_quota_reserve_deadlock(orig, True)
+
+    def test_quota_reserve_does_not_retry_postgresql_errors(self):
+        orig = Exception('relation "quota_usages" does not exist')
+        orig.pgcode = '42P01'
+        self._test_quota_reserve_deadlock(orig, False)
+
+    def test_quota_reserve_does_not_retry_sqlite_locked(self):
+        self._test_quota_reserve_deadlock(
+            sqlite3.OperationalError('database is locked'), False)
+
+    def test_quota_reserve_retries_on_totals_race(self):
+        self.init_usage('test_project', 'test_user', 'shares', 3, 0)
+        fake_get_project_quota_usages = sqa_api._get_project_quota_usages
+        attempts = []
+
+        def racing_get_project_quota_usages(*args, **kwargs):
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise sqa_api._QuotaUsageRace()
+            return fake_get_project_quota_usages(*args, **kwargs)
+
+        self.stubs.Set(sqa_api, '_get_project_quota_usages',
+                       racing_get_project_quota_usages)
+        context = FakeContext('test_project', 'test_class')
+        quotas = dict(shares=5, gigabytes=10 * 1024, )
+
+        result = sqa_api.quota_reserve(context, self.resources, quotas,
+                                       quotas, dict(shares=1, ),
+                                       self.expire, 0, 0)
+
+        self.assertEqual(2, len(attempts))
+        self.assertEqual(1, len(result))
+
+    def test_quota_reserve_updates_project_totals(self):
+        self.init_usage('test_project', 'test_user', 'shares', 3, 0)
+        self.init_usage('test_project', 'test_user', 'gigabytes', 2 * 1024, 0)
+        context = FakeContext('test_project', 'test_class')
+        quotas = dict(shares=5, gigabytes=10 * 1024, )
+        deltas = dict(shares=2, gigabytes=2 * 1024, )
+
+        sqa_api.quota_reserve(context, self.resources, quotas, quotas,
+                              deltas, self.expire, 0, 0)
+
+        self.compare_usage(self.project_usages, [
+            dict(resource='shares', in_use=3, reserved=2),
+            dict(resource='gigabytes', in_use=2 * 1024, reserved=2 * 1024),
+        ])
+
+    def test_quota_reserve_checks_project_totals(self):
+        self.init_usage('test_project', 'test_user', 'shares', 1, 0)
+        total = FakeProjectUsage()
+        total.project_id = 'test_project'
+        total.resource = 'shares'
+        total.in_use = 4
+        total.reserved = 0
+        self.project_usages['shares'] = total
+        context = FakeContext('test_project', 'test_class')
+        project_quotas = dict(shares=5, gigabytes=10 * 1024, )
+        user_quotas = dict(shares=3, gigabytes=10 * 1024, )
+
+        self.assertRaises(exception.OverQuota, sqa_api.quota_reserve,
+                          context, self.resources, project_quotas,
+                          user_quotas, dict(shares=2, ), self.expire, 0, 0)
+
+    def test_quota_reserve_does_not_retry_other_errors(self):
+        def fake_get_user_quota_usages(context, session, project_id, user_id,
+                                       resources=None):
+            raise exception.DBError(OperationalError(
+                'SELECT', {}, Exception('no such table')))
+
+        self.stubs.Set(sqa_api, '_get_user_quota_usages',
+                       fake_get_user_quota_usages)
+        context = FakeContext('test_project', 'test_class')
+        quotas = dict(shares=5, gigabytes=10 * 1024, )
+
+        self.assertRaises(exception.DBError, sqa_api.quota_reserve, context,
+                          self.resources, quotas, quotas, dict(shares=1, ),
+                          self.expire, 0, 0)
+
+
+class ProjectQuotaUsageTestCase(test.TestCase):
+    """Runs the quota calls against the database to check project totals."""
+
+    def setUp(self):
+        super(ProjectQuotaUsageTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.project_id = 'totals_project'
+        self.resources = {
+            'shares': quota.ReservableResource('shares', '_sync_totals'),
+        }
+        self.synced = {}
+
+        def sync(context, project_id, user_id, session):
+            return {'shares': self.synced.get(user_id, 0)}
+
+        patcher = mock.patch.dict(sqa_api.QUOTA_SYNC_FUNCTIONS,
+                                  {'_sync_totals': sync})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.expire = timeutils.utcnow() + datetime.timedelta(seconds=3600)
+
+    def _reserve(self, user_id, delta, project_quota=10, user_quota=10):
+        return db.quota_reserve(self.context, self.resources,
+                                dict(shares=project_quota),
+                                dict(shares=user_quota),
+                                dict(shares=delta), self.expire, None, 0,
+                                project_id=self.project_id, user_id=user_id)
+
+    def _total(self):
+        session = sqa_api.get_session()
+        with session.begin():
+            totals = sqa_api._get_project_quota_usages(
+                self.context, session, self.project_id, ['shares'])
+        return totals['shares'].in_use, totals['shares'].reserved
+
+    def test_totals_follow_reservations_of_all_users(self):
+        for user_id in ('user1', 'user2'):
+            reservations = self._reserve(user_id, 2)
+            db.reservation_commit(self.context, reservations,
+                                  project_id=self.project_id,
+                                  user_id=user_id)
+        reservations = self._reserve('user1', 3)
+        self.assertEqual((4, 3), self._total())
+
+        db.reservation_rollback(self.context, reservations,
+                                project_id=self.project_id, user_id='user1')
+        self.assertEqual((4, 0), self._total())
+
+        db.quota_destroy_all_by_project_and_user(self.context,
+                                                 self.project_id, 'user2')
+        self.assertEqual((2, 0), self._total())
+
+        db.quota_usage_update(self.context, self.project_id, 'user1',
+                              'shares', in_use=5)
+        self.assertEqual((5, 0), self._total())
+
+    def test_project_quota_counts_all_users(self):
+        reservations = self._reserve('user1', 2)
+        db.reservation_commit(self.context, reservations,
+                              project_id=self.project_id, user_id='user1')
+
+        self.assertRaises(exception.OverQuota, self._reserve, 'user2', 2,
+                          project_quota=3, user_quota=5)
+        self.assertEqual((2, 0), self._total())
+
+    def test_totals_created_from_user_usages(self):
+        self._reserve('user1', 2)
+        session = sqa_api.get_session()
+        with session.begin():
+            session.query(sqa_models.ProjectQuotaUsage).delete()
+
+        self.assertEqual((0, 2), self._total())
+
+    def test_totals_removed_with_project(self):
+        self._reserve('user1', 2)
+
+        db.quota_destroy_all_by_project(self.context, self.project_id)
+
+        self.assertEqual((0, 0), self._total())
+
+    def test_concurrently_created_totals_raise_race(self):
+        session = sqa_api.get_session()
+        flush = session.flush
+
+        def conflicting_flush(*args, **kwargs):
+            if session.new:
+                raise exception.DBError(IntegrityError('INSERT', {},
+                                                       Exception()))
+            return flush(*args, **kwargs)
+
+        session.flush = conflicting_flush
+
+        def get_totals():
+            with session.begin():
+                sqa_api._get_project_quota_usages(
+                    self.context, session, self.project_id, ['shares'])
+
+        self.assertRaises(sqa_api._QuotaUsageRace, get_totals)
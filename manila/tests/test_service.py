@@ -20,13 +20,17 @@
 Unit Tests for remote procedure calls using queue
 """
 
+import shutil
+import tempfile
+
+import mock
 import mox
 from oslo.config import cfg
 
 from manila import context
 from manila import db
 from manila import exception
-
+from manila import liveness
 from manila import manager
 from manila import service
 from manila import test
@@ -113,6 +117,7 @@ class ServiceTestCase(test.TestCase):
     def setUp(self):
         super(ServiceTestCase, self).setUp()
         self.mox.StubOutWithMock(service, 'db')
+        self.mox.StubOutWithMock(liveness, 'db')
 
     def test_create(self):
         host = 'foo'
@@ -146,8 +151,8 @@ class ServiceTestCase(test.TestCase):
                                        binary).AndRaise(exception.NotFound())
         service.db.service_create(mox.IgnoreArg(),
                                   service_create).AndReturn(service_ref)
-        service.db.service_get(mox.IgnoreArg(),
-                               mox.IgnoreArg()).AndRaise(Exception())
+        liveness.db.service_heartbeat(mox.IgnoreArg(),
+                                      [1]).AndRaise(Exception())
 
         self.mox.ReplayAll()
         serv = service.Service(host,
@@ -179,10 +184,8 @@ class ServiceTestCase(test.TestCase):
                                        binary).AndRaise(exception.NotFound())
         service.db.service_create(mox.IgnoreArg(),
                                   service_create).AndReturn(service_ref)
-        service.db.service_get(mox.IgnoreArg(),
-                               service_ref['id']).AndReturn(service_ref)
-        service.db.service_update(mox.IgnoreArg(), service_ref['id'],
-                                  mox.ContainsKeyValue('report_count', 1))
+        liveness.db.service_heartbeat(mox.IgnoreArg(),
+                                      [service_ref['id']]).AndReturn([])
 
         self.mox.ReplayAll()
         serv = service.Service(host,
@@ -195,6 +198,83 @@ class ServiceTestCase(test.TestCase):
 
         self.assert_(not serv.model_disconnected)
 
+    def test_report_state_recreates_missing_service(self):
+        host = 'foo'
+        binary = 'bar'
+        topic = 'test'
+        service_ref = {'host': host,
+                       'binary': binary,
+                       'topic': topic,
+                       'report_count': 0,
+                       'availability_zone': 'nova',
+                       'id': 1}
+
+        service.db.service_get_by_args(mox.IgnoreArg(),
+                                       host,
+                                       binary).AndReturn(service_ref)
+        liveness.db.service_heartbeat(mox.IgnoreArg(), [1]).AndReturn([1])
+        service.db.service_create(mox.IgnoreArg(), mox.IgnoreArg()).\
+            AndReturn(dict(service_ref, id=2))
+
+        self.mox.ReplayAll()
+        serv = service.Service(host,
+                               binary,
+                               topic,
+                               'manila.tests.test_service.FakeManager')
+        serv.start()
+        serv.report_state()
+        self.assertEqual(serv.service_id, 2)
+
+    def test_heartbeats_batched(self):
+        services = [mock.Mock(service_id=1, report_interval=10,
+                              model_disconnected=False),
+                    mock.Mock(service_id=2, report_interval=10,
+                              model_disconnected=False)]
+        batch = service._HeartbeatBatch()
+        self.stubs.Set(service.utils, 'LoopingCall', mock.Mock())
+        timer = batch.add(services[0])
+        self.assertEqual(batch.add(services[1]), timer)
+        timer.start.assert_called_once_with(interval=10, initial_delay=10)
+
+        liveness.db.service_heartbeat(mox.IgnoreArg(), [1, 2]).AndReturn([])
+        self.mox.ReplayAll()
+        batch.report()
+
+        batch.remove(services[0])
+        self.assertFalse(timer.stop.called)
+        batch.remove(services[1])
+        timer.stop.assert_called_once_with()
+
+
+class LivenessDriverTestCase(test.TestCase):
+
+    def setUp(self):
+        super(LivenessDriverTestCase, self).setUp()
+        self.context = context.get_admin_context()
+
+    def test_db_heartbeat(self):
+        service_ref = db.service_create(self.context,
+                                        {'host': 'foo',
+                                         'binary': 'bar',
+                                         'topic': 'test',
+                                         'report_count': 0})
+        driver = liveness.DbLivenessDriver()
+        missing = driver.heartbeat(self.context, [service_ref['id'], 4242])
+        self.assertEqual(missing, [4242])
+        service_ref = db.service_get(self.context, service_ref['id'])
+        self.assertEqual(service_ref['report_count'], 1)
+        self.assertTrue(driver.filter_up([service_ref]))
+
+    def test_file_heartbeat(self):
+        self.flags(service_liveness_dir=tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, CONF.service_liveness_dir)
+        driver = liveness.FileLivenessDriver()
+        self.assertEqual(driver.heartbeat(self.context, [1]), [])
+        self.assertEqual(driver.filter_up([{'id': 1}, {'id': 2}]),
+                         [{'id': 1}])
+        self.flags(service_down_time=-1)
+        self.assertEqual(driver.filter_up([{'id': 1}]), [])
+
 
 class TestWSGIService(test.TestCase):
 
@@ -387,7 +387,7 @@ class ServiceInstanceManagerTestCase(test.TestCase):
         self._manager.compute_api.server_create.assert_called_once_with(
                 self._context, fake_instance_name, 'fake_image_id',
                 CONF.service_instance_flavor_id, 'fake_key_name', None, None,
-                nics=[{'port-id': fake_port['id']}])
+                nics=[{'port-id': fake_port['id']}], availability_zone=None)
         service_instance.socket.socket.assert_called_once()
         self.assertEqual(result, fake_server)
 
@@ -660,3 +660,241 @@ class ServiceInstanceManagerTestCase(test.TestCase):
                        mock.Mock(return_value=[fake_subnet]))
         result = self._manager._get_cidr_for_subnet()
         self.assertEqual(result, cidr2)
+
+    def test_create_service_instance_from_pool(self):
+        self.flags(service_instance_pool_size=1)
+        fake_server = fake_compute.FakeServer(subnet_id='fake_subnet_id')
+        self._manager._pool[None].append(fake_server)
+        self.stubs.Set(self._manager, '_replenish_pool', mock.Mock())
+        self.stubs.Set(self._manager, '_ensure_server',
+                       mock.Mock(return_value=True))
+        self.stubs.Set(self._manager, '_boot_service_instance', mock.Mock())
+        self.stubs.Set(self._manager, '_add_subnet_to_router', mock.Mock())
+        self.stubs.Set(self._manager.neutron_api, 'update_subnet',
+                       mock.Mock(return_value='fake_subnet'))
+        self.stubs.Set(self._manager.compute_api, 'server_update',
+                       mock.Mock(return_value={}))
+
+        result = self._manager._create_service_instance(self._context,
+                                                        'fake_sn_id', None)
+
+        self.assertEqual(result, fake_server)
+        self.assertEqual(self._manager._pool[None], [])
+        self._manager.neutron_api.update_subnet.assert_called_once_with(
+                'fake_subnet_id', 'fake_sn_id')
+        self._manager._add_subnet_to_router.assert_called_once_with(
+                'fake_sn_id', 'fake_subnet')
+        self._manager.compute_api.server_update.assert_called_once_with(
+                self._context, fake_server['id'],
+                self._manager._get_service_instance_name('fake_sn_id'))
+        self._manager._replenish_pool.assert_called_once_with()
+        self.assertFalse(self._manager._boot_service_instance.called)
+        self.assertEqual(self._manager.get_pool_stats(),
+                         {'sizes': {None: 0}, 'hits': 1, 'misses': 0,
+                          'hit_rate': 1.0})
+
+    def test_create_service_instance_pool_empty(self):
+        self.flags(service_instance_pool_size=1)
+        fake_server = fake_compute.FakeServer()
+        self.stubs.Set(self._manager, '_replenish_pool', mock.Mock())
+        self.stubs.Set(self._manager, '_boot_service_instance',
+                       mock.Mock(return_value=fake_server))
+
+        result = self._manager._create_service_instance(self._context,
+                                                        'fake_sn_id', None)
+
+        self.assertEqual(result, fake_server)
+        self._manager._boot_service_instance.assert_called_once()
+        self._manager._replenish_pool.assert_called_once_with()
+        self.assertEqual(self._manager.pool_misses, 1)
+
+    def test_claim_pooled_instance_discards_unavailable(self):
+        fake_server = fake_compute.FakeServer(subnet_id='fake_subnet_id')
+        self._manager._pool[None].append(fake_server)
+        self.stubs.Set(self._manager, '_replenish_pool', mock.Mock())
+        self.stubs.Set(self._manager, '_ensure_server',
+                       mock.Mock(return_value=False))
+        self.stubs.Set(self._manager, '_delete_server', mock.Mock())
+        self.stubs.Set(self._manager, '_get_service_port',
+                       mock.Mock(return_value='fake_port'))
+        self.stubs.Set(self._manager, '_remove_fixed_ip_from_service_port',
+                       mock.Mock())
+        self.stubs.Set(self._manager.neutron_api, 'delete_subnet',
+                       mock.Mock())
+
+        result = self._manager._claim_pooled_instance(self._context,
+                                                      'fake_sn_id')
+
+        self.assertEqual(result, None)
+        self._manager._delete_server.assert_called_once_with(self._context,
+                                                             fake_server)
+        self._manager._remove_fixed_ip_from_service_port.\
+                assert_called_once_with('fake_port', 'fake_subnet_id')
+        self._manager.neutron_api.delete_subnet.assert_called_once_with(
+                'fake_subnet_id')
+        self.assertEqual(self._manager.pool_misses, 1)
+
+    def test_fill_pool(self):
+        self.flags(service_instance_pool_size=2)
+        self._manager._pool = {'zone1': [], 'zone2': ['fake_server']}
+        self.stubs.Set(self._manager, '_create_pooled_instance',
+                       mock.Mock(side_effect=lambda ctx, zone: zone))
+
+        self._manager._fill_pool()
+
+        self.assertEqual(self._manager._pool,
+                         {'zone1': ['zone1', 'zone1'],
+                          'zone2': ['fake_server', 'zone2']})
+        self.assertEqual(self._manager._pool_filler, None)
+
+    def test_fill_pool_retries_failed_boot(self):
+        self.flags(service_instance_pool_size=2,
+                   service_instance_pool_retry_interval=1,
+                   service_instance_pool_max_retry_interval=3)
+        self._manager._pool = {None: []}
+        self.stubs.Set(self._manager, '_create_pooled_instance', mock.Mock(
+            side_effect=[exception.ManilaException, exception.ManilaException,
+                         exception.ManilaException, 'server1',
+                         exception.ManilaException, 'server2']))
+        sleeps = []
+        self.stubs.Set(service_instance.eventlet, 'sleep', sleeps.append)
+
+        self._manager._fill_pool()
+
+        self.assertEqual(self._manager._pool, {None: ['server1', 'server2']})
+        self.assertEqual(sleeps, [1, 2, 3, 1])
+        self.assertEqual(self._manager._pool_filler, None)
+
+    def test_create_pooled_instance(self):
+        fake_server = fake_compute.FakeServer()
+        self.stubs.Set(self._manager, '_get_cidr_for_subnet',
+                       mock.Mock(return_value='fake_cidr'))
+        self.stubs.Set(self._manager.neutron_api, 'subnet_create',
+                       mock.Mock(return_value={'id': 'fake_subnet_id'}))
+        self.stubs.Set(self._manager.neutron_api, 'create_port',
+                       mock.Mock(return_value='fake_port'))
+
+        def fake_boot(context, name, setup_network, availability_zone):
+            self.assertEqual(setup_network(), 'fake_port')
+            return fake_server
+        self.stubs.Set(self._manager, '_boot_service_instance',
+                       mock.Mock(side_effect=fake_boot))
+
+        result = self._manager._create_pooled_instance(self._context,
+                                                       'fake_zone')
+
+        self.assertEqual(result, fake_server)
+        self.assertEqual(result['subnet_id'], 'fake_subnet_id')
+        name = self._manager.neutron_api.subnet_create.call_args[0][2]
+        self.assertTrue(name.startswith('pool-'))
+        self._manager.neutron_api.create_port.assert_called_once_with(
+                self._manager.service_tenant_id,
+                self._manager.service_network_id,
+                subnet_id='fake_subnet_id', device_owner='manila')
+        self.assertEqual(self._manager._boot_service_instance.call_args[0][1],
+                         self._manager._get_service_instance_name(name))
+
+    def test_load_pool(self):
+        prefix = self._manager._get_service_instance_name('pool-')
+        good = fake_compute.FakeServer(name=prefix + 'a')
+        bad = fake_compute.FakeServer(name=prefix + 'b', status='ERROR')
+        orphan = fake_compute.FakeServer(name=prefix + 'c')
+        self.stubs.Set(self._manager.compute_api, 'server_list',
+                       mock.Mock(return_value=[good, bad, orphan]))
+        self.stubs.Set(self._manager, '_get_all_service_subnets',
+                       mock.Mock(return_value=[
+                           {'name': 'pool-a', 'id': 'subnet_a'},
+                           {'name': 'pool-b', 'id': 'subnet_b'}]))
+
+        self._manager._load_pool(self._context)
+
+        self._manager.compute_api.server_list.assert_called_once_with(
+                self._context, {'name': prefix}, True)
+        self.assertEqual(self._manager._pool[None], [good])
+        self.assertEqual(good['subnet_id'], 'subnet_a')
+
+
+class SSHExecTestCase(test.TestCase):
+    """Tests pooled ssh execution on service instances."""
+
+    def setUp(self):
+        super(SSHExecTestCase, self).setUp()
+        self.ssh = mock.Mock()
+        self.pool = mock.Mock()
+        self.pool.item.return_value.__enter__ = mock.Mock(
+            return_value=self.ssh)
+        self.pool.item.return_value.__exit__ = mock.Mock(return_value=False)
+        self.server = {'ssh_pool': self.pool}
+
+    def test_ssh_exec(self):
+        self.stubs.Set(service_instance.utils, 'ssh_execute',
+                       mock.Mock(return_value=('out', '')))
+
+        result = service_instance._ssh_exec(self.server, ['sudo', 'ls'])
+
+        service_instance.utils.ssh_execute.assert_called_once_with(
+            self.ssh, 'sudo ls')
+        self.pool.item.assert_called_once_with()
+        self.assertEqual(('out', ''), result)
+
+    def test_ssh_exec_script(self):
+        self.stubs.Set(service_instance, '_ssh_exec',
+                       mock.Mock(return_value=('out', '')))
+
+        result = service_instance._ssh_exec_script(
+            self.server, [['sudo', 'mkdir', 'a'], ['sudo', 'mount', 'b']])
+
+        self.assertEqual(('out', ''), result)
+        service_instance._ssh_exec.assert_called_once()
+        script = service_instance._ssh_exec.call_args[0][1]
+        self.assertEqual(1, len(script))
+        self.assertTrue(script[0].startswith('{ sudo mkdir a ; } ||'))
+        self.assertIn('{ sudo mount b ; } ||', script[0])
+
+    def test_ssh_exec_script_reports_failed_step(self):
+        error = exception.ProcessExecutionError(
+            exit_code=32, stdout='', cmd='script',
+            stderr='already mounted\n%s1\n' %
+                   service_instance._SCRIPT_STEP_FAILED)
+        self.stubs.Set(service_instance, '_ssh_exec',
+                       mock.Mock(side_effect=error))
+
+        try:
+            service_instance._ssh_exec_script(
+                self.server, [['sudo', 'mkdir', 'a'], ['sudo', 'mount', 'b'],
+                              ['sudo', 'chmod', 'c']])
+        except exception.ProcessExecutionError as e:
+            self.assertEqual('sudo mount b', e.cmd)
+            self.assertEqual(32, e.exit_code)
+            self.assertEqual('already mounted', e.stderr)
+        else:
+            self.fail('ProcessExecutionError was not raised')
+
+    def test_ssh_exec_script_connection_error(self):
+        error = exception.ProcessExecutionError(exit_code=255, stderr='',
+                                                cmd='script')
+        self.stubs.Set(service_instance, '_ssh_exec',
+                       mock.Mock(side_effect=error))
+
+        try:
+            service_instance._ssh_exec_script(self.server,
+                                              [['sudo', 'mkdir', 'a']])
+        except exception.ProcessExecutionError as e:
+            self.assertEqual('script', e.cmd)
+        else:
+            self.fail('ProcessExecutionError was not raised')
+
+    def test_get_ssh_pool(self):
+        CONF.set_default('service_instance_ssh_pool_size', 3)
+        CONF.set_default('service_instance_ssh_conn_timeout', 30)
+        self.stubs.Set(service_instance.utils, 'SSHPool', mock.Mock())
+        with mock.patch.object(service_instance.ServiceInstanceManager,
+                               '__init__', mock.Mock(return_value=None)):
+            manager = service_instance.ServiceInstanceManager(None, {})
+
+        manager._get_ssh_pool({'ip': 'fake_ip'})
+
+        service_instance.utils.SSHPool.assert_called_once_with(
+            'fake_ip', 22, 30, CONF.service_instance_user,
+            password=CONF.service_instance_password,
+            privatekey=CONF.path_to_private_key, max_size=3)
@@ -18,6 +18,7 @@
 Tests for Share Code.
 
 """
+from eventlet import greenthread
 import mock
 
 from manila import context
@@ -61,12 +62,21 @@ class FakeShareDriver(object):
     def ensure_share(self, context, share):
         pass
 
+    def ensure_shares(self, context, shares, access_rules):
+        pass
+
     def allow_access(self, context, share, access):
         pass
 
     def deny_access(self, context, share, access):
         pass
 
+    def update_access(self, context, share, add_rules, delete_rules):
+        for access in add_rules:
+            self.allow_access(context, share, access)
+        for access in delete_rules:
+            self.deny_access(context, share, access)
+
     def check_for_setup_error(self):
         pass
 
@@ -150,11 +160,68 @@ class ShareTestCase(test.TestCase):
         driver.get_share_stats.return_value = {}
         self.share.driver = driver
         self.share.init_host()
-        driver.ensure_share.assert_called_once_with(self.context, share)
-        driver.allow_access.assert_called_once_with(
-            self.context, share, mock.ANY)
+        driver.ensure_shares.assert_called_once_with(
+            self.context, [share], mock.ANY)
+        access_rules = driver.ensure_shares.call_args[0][2]
+        self.assertEqual([share_id], access_rules.keys())
+        self.assertEqual([access['id']],
+                         [rule['id'] for rule in access_rules[share_id]])
         driver.get_share_stats.assert_called_once_with(refresh=True)
 
+    def test_ensure_shares_in_batches(self):
+        """Test shares are re-exported in batches by a pool of workers."""
+        self.flags(share_init_host_workers=2, share_init_host_batch_size=2)
+        shares = [self._create_share(status='available') for i in range(5)]
+        self.share.driver = mock.Mock()
+        self.share.driver.ensure_shares.return_value = {}
+
+        stats = self.share._ensure_shares(self.context, shares)
+
+        self.assertEqual({'total': 5, 'ensured': 5, 'failed': 0}, stats)
+        self.assertEqual(3, self.share.driver.ensure_shares.call_count)
+        ensured = []
+        for call in self.share.driver.ensure_shares.call_args_list:
+            ensured.extend(share['id'] for share in call[0][1])
+        self.assertEqual(sorted(share['id'] for share in shares),
+                         sorted(ensured))
+
+    def test_ensure_shares_batch_failure(self):
+        """Test failure of one batch doesn't stop re-exporting of others."""
+        self.flags(share_init_host_batch_size=1)
+        shares = [self._create_share(status='available') for i in range(2)]
+        self.share.driver = mock.Mock()
+        self.share.driver.ensure_shares.side_effect = [
+            exception.ManilaException, None]
+
+        stats = self.share._ensure_shares(self.context, shares)
+
+        self.assertEqual({'total': 2, 'ensured': 1, 'failed': 1}, stats)
+        self.assertEqual(2, self.share.driver.ensure_shares.call_count)
+
+    def test_ensure_shares_share_failure(self):
+        """Test shares failed by the driver are counted one by one."""
+        shares = [self._create_share(status='available') for i in range(3)]
+        self.share.driver = mock.Mock()
+        self.share.driver.ensure_shares.return_value = {
+            shares[1]['id']: exception.ManilaException()}
+
+        stats = self.share._ensure_shares(self.context, shares)
+
+        self.assertEqual({'total': 3, 'ensured': 2, 'failed': 1}, stats)
+
+    def test_ensure_shares_skips_inactive_rules(self):
+        """Test only active access rules are passed to the driver."""
+        share = self._create_share(status='available')
+        active = self._create_access(share_id=share['id'], state='active')
+        self._create_access(share_id=share['id'], state='error')
+        self.share.driver = mock.Mock()
+
+        self.share._ensure_shares(self.context, [share])
+
+        access_rules = self.share.driver.ensure_shares.call_args[0][2]
+        self.assertEqual([active['id']],
+                         [rule['id'] for rule in access_rules[share['id']]])
+
     def test_create_share_from_snapshot(self):
         """Test share can be created from snapshot."""
         share = self._create_share()
@@ -170,6 +237,96 @@ class ShareTestCase(test.TestCase):
         shr = db.share_get(self.context, share_id)
         self.assertEquals(shr['status'], 'available')
 
+    def test_create_shares(self):
+        """Test a failing share does not stop the rest of the batch."""
+        good = self._create_share()
+        bad = self._create_share()
+
+        def _fake_create_share(self, context, share):
+            if share['id'] == bad['id']:
+                raise exception.NotFound()
+            return 'fake_location'
+
+        self.stubs.Set(FakeShareDriver, "create_share", _fake_create_share)
+
+        self.share.create_shares(self.context,
+                                 [{'share_id': bad['id']},
+                                  {'share_id': good['id']}])
+
+        self.assertEqual('error', db.share_get(self.context,
+                                               bad['id'])['status'])
+        self.assertEqual('available', db.share_get(self.context,
+                                                   good['id'])['status'])
+
+    def test_create_shares_bounded_workers(self):
+        """Test no more than share_create_workers shares run at once."""
+        self.flags(share_create_workers=2)
+        shares = [self._create_share() for i in range(5)]
+        running = []
+        peak = []
+
+        def _fake_create_share(self, context, share):
+            running.append(share['id'])
+            peak.append(len(running))
+            greenthread.sleep(0)
+            running.remove(share['id'])
+            return 'fake_location'
+
+        self.stubs.Set(FakeShareDriver, "create_share", _fake_create_share)
+
+        self.share.create_shares(self.context,
+                                 [{'share_id': share['id']}
+                                  for share in shares])
+
+        self.assertEqual(2, max(peak))
+        for share in shares:
+            self.assertEqual('available', db.share_get(self.context,
+                                                       share['id'])['status'])
+
+    def test_share_get_all_filters_in_db(self):
+        available = self._create_share(status='available')
+        self._create_share(status='error')
+
+        shares = db.share_get_all(self.context,
+                                  filters={'status': 'available'})
+
+        self.assertEqual([available['id']], [s['id'] for s in shares])
+        self.assertEqual([], db.share_get_all(self.context,
+                                              filters={'fake_key': 'x'}))
+
+    def test_share_get_all_by_project_paginates_in_db(self):
+        ids = [self._create_share(size=size)['id'] for size in (3, 1, 2)]
+
+        first_page = db.share_get_all_by_project(self.context, 'fake',
+                                                 sort_key='size',
+                                                 sort_dir='asc', limit=2)
+        second_page = db.share_get_all_by_project(
+            self.context, 'fake', sort_key='size', sort_dir='asc', limit=2,
+            marker=first_page[-1]['id'])
+
+        self.assertEqual([ids[1], ids[2]], [s['id'] for s in first_page])
+        self.assertEqual([ids[0]], [s['id'] for s in second_page])
+        self.assertEqual([ids[2], ids[0]],
+                         [s['id'] for s in db.share_get_all_by_project(
+                             self.context, 'fake', sort_key='size',
+                             sort_dir='asc', offset=1)])
+
+    def test_share_get_all_bad_marker(self):
+        self._create_share()
+        self.assertRaises(exception.InvalidInput, db.share_get_all,
+                          self.context, marker='fake_id')
+
+    def test_share_snapshot_get_all_by_project_paginates_in_db(self):
+        share = self._create_share()
+        ids = [self._create_snapshot(share_id=share['id'], size=size)['id']
+               for size in (2, 1)]
+
+        snapshots = db.share_snapshot_get_all_by_project(
+            self.context, 'fake', filters={'share_id': share['id']},
+            sort_key='size', sort_dir='desc', limit=1)
+
+        self.assertEqual([ids[0]], [s['id'] for s in snapshots])
+
     def test_create_delete_share_snapshot(self):
         """Test share's snapshot can be created and deleted."""
 
@@ -342,6 +499,81 @@ class ShareTestCase(test.TestCase):
         acs = db.share_access_get(self.context, access_id)
         self.assertEquals(acs['state'], 'error')
 
+    def test_allow_access_coalesced(self):
+        """Test queued access changes of a share are applied at once."""
+        share = self._create_share()
+        first = self._create_access(share_id=share['id'])
+        second = self._create_access(share_id=share['id'])
+        active = self._create_access(share_id=share['id'], state='active')
+        self.share.driver = mock.Mock()
+
+        def _fake_sleep(seconds):
+            if not fake_sleep.called_once:
+                fake_sleep.called_once = True
+                self.share.allow_access(self.context, second['id'])
+                self.share.deny_access(self.context, active['id'])
+
+        fake_sleep = mock.Mock(side_effect=_fake_sleep)
+        fake_sleep.called_once = False
+        self.stubs.Set(manager.greenthread, 'sleep', fake_sleep)
+
+        self.share.allow_access(self.context, first['id'])
+
+        self.assertEqual(1, self.share.driver.update_access.call_count)
+        args = self.share.driver.update_access.call_args[0]
+        self.assertEqual(share['id'], args[1]['id'])
+        self.assertEqual([first['id'], second['id']],
+                         [rule['id'] for rule in args[2]])
+        self.assertEqual([active['id']], [rule['id'] for rule in args[3]])
+        for access_id in (first['id'], second['id']):
+            self.assertEqual('active',
+                             db.share_access_get(self.context,
+                                                 access_id)['state'])
+        self.assertRaises(exception.NotFound, db.share_access_get,
+                          self.context, active['id'])
+        self.assertEqual({}, self.share._access_queues)
+
+    def test_update_access_falls_back_to_single_rules(self):
+        """Test only rules failing on their own are put into error."""
+        share = self._create_share()
+        good = self._create_access(share_id=share['id'])
+        bad = self._create_access(share_id=share['id'])
+        revoked = self._create_access(share_id=share['id'], state='active')
+        self.share.driver = mock.Mock()
+
+        def _fake_update_access(context, share, add_rules, delete_rules):
+            if bad['id'] in [rule['id'] for rule in add_rules]:
+                raise exception.InvalidShareAccess(reason='fake')
+
+        self.share.driver.update_access.side_effect = _fake_update_access
+
+        self.assertRaises(exception.InvalidShareAccess,
+                          self.share._update_access, self.context, share,
+                          [good, bad], [revoked])
+
+        self.assertEqual(4, self.share.driver.update_access.call_count)
+        self.assertEqual('active',
+                         db.share_access_get(self.context,
+                                             good['id'])['state'])
+        self.assertEqual('error',
+                         db.share_access_get(self.context,
+                                             bad['id'])['state'])
+        self.assertRaises(exception.NotFound, db.share_access_get,
+                          self.context, revoked['id'])
+
+    def test_deny_access_of_queued_rule(self):
+        """Test rule denied before it was applied doesn't reach driver."""
+        share = self._create_share()
+        access = self._create_access(share_id=share['id'])
+        self.share.driver = mock.Mock()
+
+        self.share._apply_access_changes(self.context, share['id'],
+                                         [(access, False), (access, True)])
+
+        self.assertFalse(self.share.driver.update_access.called)
+        self.assertRaises(exception.NotFound, db.share_access_get,
+                          self.context, access['id'])
+
     def test_create_delete_share_with_metadata(self):
         """Test share can be created with metadata and deleted."""
         test_meta = {'fake_key': 'fake_value'}
@@ -140,10 +140,9 @@ class ShareAPITestCase(test.TestCase):
 
         self.mox.StubOutWithMock(db_driver, 'share_create')
         db_driver.share_create(self.context, options).AndReturn(share)
-        self.scheduler_rpcapi.create_share(self.context, mox.IgnoreArg(),
-                                           share['id'], share['snapshot_id'],
-                                           request_spec=request_spec,
-                                           filter_properties={})
+        self.scheduler_rpcapi.create_shares(self.context, mox.IgnoreArg(),
+                                            [request_spec],
+                                            filter_properties={})
         self.mox.ReplayAll()
         self.api.create(self.context, 'nfs', '1', 'fakename', 'fakedesc',
                         availability_zone='fakeaz')
@@ -225,6 +224,43 @@ class ShareAPITestCase(test.TestCase):
         self.assertRaises(exception.InvalidShare, self.api.create_snapshot,
                           self.context, share, 'fakename', 'fakedesc')
 
+    def test_create_shares(self):
+        shares = [fake_share('fakeid1'), fake_share('fakeid2')]
+        self.stubs.Set(db_driver, 'share_create',
+                       mock.Mock(side_effect=shares))
+        self.scheduler_rpcapi.create_shares(self.context, mox.IgnoreArg(),
+                                            mox.Func(lambda specs: [
+                                                spec['share_id']
+                                                for spec in specs] ==
+                                                ['fakeid1', 'fakeid2']),
+                                            filter_properties={})
+        self.mox.ReplayAll()
+        result = self.api.create_shares(
+            self.context,
+            [{'share_proto': 'nfs', 'size': 1, 'name': 'fakename1',
+              'description': 'fakedesc'},
+             {'share_proto': 'nfs', 'size': 2, 'name': 'fakename2',
+              'description': 'fakedesc'}])
+        self.assertEqual(shares, result)
+
+    def test_create_shares_schedules_created_on_error(self):
+        share = fake_share('fakeid1')
+        self.stubs.Set(db_driver, 'share_create',
+                       mock.Mock(return_value=share))
+        self.scheduler_rpcapi.create_shares(self.context, mox.IgnoreArg(),
+                                            mox.Func(lambda specs: [
+                                                spec['share_id']
+                                                for spec in specs] ==
+                                                ['fakeid1']),
+                                            filter_properties={})
+        self.mox.ReplayAll()
+        self.assertRaises(
+            exception.InvalidInput, self.api.create_shares, self.context,
+            [{'share_proto': 'nfs', 'size': 1, 'name': 'fakename1',
+              'description': 'fakedesc'},
+             {'share_proto': 'nfs', 'size': -1, 'name': 'fakename2',
+              'description': 'fakedesc'}])
+
     def test_create_from_snapshot_available(self):
         date = datetime.datetime(1, 1, 1, 1, 1, 1)
         self.mock_utcnow.return_value = date
@@ -248,10 +284,9 @@ class ShareAPITestCase(test.TestCase):
 
         self.mox.StubOutWithMock(db_driver, 'share_create')
         db_driver.share_create(self.context, options).AndReturn(share)
-        self.scheduler_rpcapi.create_share(self.context, mox.IgnoreArg(),
-                                           share['id'], share['snapshot_id'],
-                                           request_spec=request_spec,
-                                           filter_properties={})
+        self.scheduler_rpcapi.create_shares(self.context, mox.IgnoreArg(),
+                                            [request_spec],
+                                            filter_properties={})
         self.mox.ReplayAll()
         self.api.create(self.context, 'nfs', '1', 'fakename', 'fakedesc',
                         snapshot=snapshot, availability_zone='fakeaz')
@@ -362,7 +397,10 @@ class ShareAPITestCase(test.TestCase):
         self.mox.StubOutWithMock(share_api.policy, 'check_policy')
         share_api.policy.check_policy(ctx, 'share', 'get_all')
         self.mox.StubOutWithMock(db_driver, 'share_get_all_by_project')
-        db_driver.share_get_all_by_project(ctx, 'fakepid')
+        db_driver.share_get_all_by_project(ctx, 'fakepid', filters={},
+                                           sort_key=None, sort_dir=None,
+                                           limit=None, offset=None,
+                                           marker=None, columns_to_join=None)
         self.mox.ReplayAll()
         self.api.get_all(ctx)
 
@@ -370,7 +408,9 @@ class ShareAPITestCase(test.TestCase):
         self.mox.StubOutWithMock(share_api.policy, 'check_policy')
         share_api.policy.check_policy(self.context, 'share', 'get_all')
         self.mox.StubOutWithMock(db_driver, 'share_get_all')
-        db_driver.share_get_all(self.context)
+        db_driver.share_get_all(self.context, filters={}, sort_key=None,
+                                sort_dir=None, limit=None, offset=None,
+                                marker=None, columns_to_join=None)
         self.mox.ReplayAll()
         self.api.get_all(self.context, search_opts={'all_tenants': 1})
 
@@ -379,21 +419,30 @@ class ShareAPITestCase(test.TestCase):
         self.mox.StubOutWithMock(share_api.policy, 'check_policy')
         share_api.policy.check_policy(ctx, 'share', 'get_all')
         self.mox.StubOutWithMock(db_driver, 'share_get_all_by_project')
-        db_driver.share_get_all_by_project(ctx, 'fakepid')
+        db_driver.share_get_all_by_project(ctx, 'fakepid', filters={},
+                                           sort_key=None, sort_dir=None,
+                                           limit=None, offset=None,
+                                           marker=None, columns_to_join=None)
         self.mox.ReplayAll()
         self.api.get_all(ctx)
 
     def test_get_all_not_admin_search_opts(self):
         search_opts = {'size': 'fakesize'}
-        fake_objs = [{'name': 'fakename1'}, search_opts]
+        fake_objs = [search_opts]
         ctx = context.RequestContext('fakeuid', 'fakepid', id_admin=False)
         self.mox.StubOutWithMock(share_api.policy, 'check_policy')
         share_api.policy.check_policy(ctx, 'share', 'get_all')
         self.mox.StubOutWithMock(db_driver, 'share_get_all_by_project')
-        db_driver.share_get_all_by_project(ctx,
-                                           'fakepid').AndReturn(fake_objs)
+        db_driver.share_get_all_by_project(ctx, 'fakepid',
+                                           filters=search_opts,
+                                           sort_key='size', sort_dir='asc',
+                                           limit=10, offset=None,
+                                           marker='fakeid',
+                                           columns_to_join=None).\
+            AndReturn(fake_objs)
         self.mox.ReplayAll()
-        result = self.api.get_all(ctx, search_opts)
+        result = self.api.get_all(ctx, search_opts, sort_key='size',
+                                  sort_dir='asc', limit=10, marker='fakeid')
         self.assertEqual([search_opts], result)
 
     def test_get_all_snapshots_admin_not_all_tenants(self):
@@ -402,7 +451,9 @@ class ShareAPITestCase(test.TestCase):
         share_api.policy.check_policy(ctx, 'share', 'get_all_snapshots')
         self.mox.StubOutWithMock(db_driver,
                                  'share_snapshot_get_all_by_project')
-        db_driver.share_snapshot_get_all_by_project(ctx, 'fakepid')
+        db_driver.share_snapshot_get_all_by_project(
+            ctx, 'fakepid', filters={}, sort_key=None, sort_dir=None,
+            limit=None, offset=None, marker=None)
         self.mox.ReplayAll()
         self.api.get_all_snapshots(ctx)
 
@@ -411,7 +462,9 @@ class ShareAPITestCase(test.TestCase):
         share_api.policy.check_policy(self.context, 'share',
                                       'get_all_snapshots')
         self.mox.StubOutWithMock(db_driver, 'share_snapshot_get_all')
-        db_driver.share_snapshot_get_all(self.context)
+        db_driver.share_snapshot_get_all(
+            self.context, filters={}, sort_key=None, sort_dir=None,
+            limit=None, offset=None, marker=None)
         self.mox.ReplayAll()
         self.api.get_all_snapshots(self.context,
                                    search_opts={'all_tenants': 1})
@@ -422,19 +475,23 @@ class ShareAPITestCase(test.TestCase):
         share_api.policy.check_policy(ctx, 'share', 'get_all_snapshots')
         self.mox.StubOutWithMock(db_driver,
                                  'share_snapshot_get_all_by_project')
-        db_driver.share_snapshot_get_all_by_project(ctx, 'fakepid')
+        db_driver.share_snapshot_get_all_by_project(
+            ctx, 'fakepid', filters={}, sort_key=None, sort_dir=None,
+            limit=None, offset=None, marker=None)
         self.mox.ReplayAll()
         self.api.get_all_snapshots(ctx)
 
     def test_get_all_snapshots_not_admin_search_opts(self):
         search_opts = {'size': 'fakesize'}
-        fake_objs = [{'name': 'fakename1'}, search_opts]
+        fake_objs = [search_opts]
         ctx = context.RequestContext('fakeuid', 'fakepid', id_admin=False)
         self.mox.StubOutWithMock(share_api.policy, 'check_policy')
         share_api.policy.check_policy(ctx, 'share', 'get_all_snapshots')
         self.mox.StubOutWithMock(db_driver,
                                  'share_snapshot_get_all_by_project')
-        db_driver.share_snapshot_get_all_by_project(ctx, 'fakepid').\
+        db_driver.share_snapshot_get_all_by_project(
+            ctx, 'fakepid', filters=search_opts, sort_key=None,
+            sort_dir=None, limit=None, offset=None, marker=None).\
             AndReturn(fake_objs)
         self.mox.ReplayAll()
         result = self.api.get_all_snapshots(ctx, search_opts)
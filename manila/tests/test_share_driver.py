@@ -17,6 +17,8 @@
 
 import time
 
+import mock
+
 from manila import exception
 from manila.share.configuration import Configuration
 from manila.share import driver
@@ -47,3 +49,36 @@ class ShareDriverTestCase(test.TestCase):
         execute_mixin = driver.ExecuteMixin(configuration=Configuration(None))
         self.assertRaises(exception.ProcessExecutionError,
                           execute_mixin._try_execute)
+
+    def test_ensure_shares(self):
+        share_driver = driver.ShareDriver()
+        share_driver.ensure_share = mock.Mock()
+        share_driver.allow_access = mock.Mock(
+            side_effect=exception.ShareAccessExists(access_type='ip',
+                                                    access='10.0.0.1'))
+        shares = [{'id': 'fake_id1'}, {'id': 'fake_id2'}]
+        access = {'access_type': 'ip', 'access_to': '10.0.0.1'}
+
+        failures = share_driver.ensure_shares('fake_context', shares,
+                                              {'fake_id2': [access]})
+
+        self.assertEqual({}, failures)
+        share_driver.ensure_share.assert_has_calls(
+            [mock.call('fake_context', shares[0]),
+             mock.call('fake_context', shares[1])])
+        share_driver.allow_access.assert_called_once_with(
+            'fake_context', shares[1], access)
+
+    def test_ensure_shares_failure(self):
+        share_driver = driver.ShareDriver()
+        error = exception.ManilaException()
+        share_driver.ensure_share = mock.Mock(side_effect=[error, None])
+        share_driver.update_access = mock.Mock()
+        shares = [{'id': 'fake_id1', 'name': 'fake_name1'},
+                  {'id': 'fake_id2', 'name': 'fake_name2'}]
+
+        failures = share_driver.ensure_shares('fake_context', shares, {})
+
+        self.assertEqual({'fake_id1': error}, failures)
+        share_driver.update_access.assert_called_once_with(
+            'fake_context', shares[1], [], [])
@@ -32,6 +32,7 @@ from manila.tests import fake_service_instance
 from manila.tests import fake_utils
 from manila.tests import fake_volume
 from manila import volume
+from manila.volume import waiter
 
 
 CONF = cfg.CONF
@@ -94,6 +95,8 @@ class GenericShareDriverTestCase(test.TestCase):
         self._driver.service_network_id = 'service network id'
         self._driver.compute_api = fake_compute.API()
         self._driver.volume_api = fake_volume.API()
+        self._driver.volume_waiter = waiter.VolumeStatusWaiter(
+            self._driver.volume_api)
         self._driver.share_networks_locks = {}
         self._driver.get_service_instance = mock.Mock()
         self._driver.share_networks_servers = {}
@@ -109,6 +112,7 @@ class GenericShareDriverTestCase(test.TestCase):
             share_network_id=self.fake_sn["id"], old_server_ip="fake")
 
         self.stubs.Set(generic, '_ssh_exec', mock.Mock())
+        self.stubs.Set(generic, '_ssh_exec_script', mock.Mock())
         self.stubs.Set(generic, 'synchronized', mock.Mock(side_effect=
                                                           lambda f: f))
         self.stubs.Set(generic.os.path, 'exists', mock.Mock(return_value=True))
@@ -166,7 +170,7 @@ class GenericShareDriverTestCase(test.TestCase):
         generic._ssh_exec.assert_called_once_with('fake_server',
                 ['sudo', 'mkfs.ext4', volume['mountpoint']])
 
-    def _test_mount_device(self):
+    def test_mount_device(self):
         volume = {'mountpoint': 'fake_mount_point'}
         self.stubs.Set(self._driver, '_get_mount_path',
                 mock.Mock(return_value='fake_mount_path'))
@@ -174,39 +178,30 @@ class GenericShareDriverTestCase(test.TestCase):
         self._driver._mount_device(self._context, self.share, 'fake_server',
                                    volume)
 
-        generic._ssh_exec.assert_has_calls([
-            mock.call('fake_server', ['sudo', 'mkdir', '-p',
-                                      'fake_mount_path',
-                                      ';', 'sudo', 'mount',
-                                      volume['mountpoint'],
-                                      'fake_mount_path']),
-            mock.call('fake_server', ['sudo', 'chmod', '777',
-                      'fake_mount_path'])
-            ])
+        generic._ssh_exec_script.assert_called_once_with('fake_server', [
+            ['sudo', 'mkdir', '-p', 'fake_mount_path'],
+            ['sudo', 'mount', volume['mountpoint'], 'fake_mount_path'],
+            ['sudo', 'chmod', '777', 'fake_mount_path'],
+        ])
+        self.assertFalse(generic._ssh_exec.called)
 
     def test_mount_device_exception_01(self):
         volume = {'mountpoint': 'fake_mount_point'}
-        generic._ssh_exec.side_effect = [
-               exception.ProcessExecutionError(stderr='already mounted'), None]
+        generic._ssh_exec_script.side_effect = \
+               exception.ProcessExecutionError(stderr='already mounted')
         self.stubs.Set(self._driver, '_get_mount_path',
                 mock.Mock(return_value='fake_mount_path'))
 
         self._driver._mount_device(self._context, self.share, 'fake_server',
                                    volume)
 
-        generic._ssh_exec.assert_has_calls([
-            mock.call('fake_server', ['sudo', 'mkdir', '-p',
-                                      'fake_mount_path',
-                                      ';', 'sudo', 'mount',
-                                      volume['mountpoint'],
-                                      'fake_mount_path']),
-            mock.call('fake_server', ['sudo', 'chmod', '777',
-                                      'fake_mount_path'])
-            ])
+        generic._ssh_exec_script.assert_called_once()
+        generic._ssh_exec.assert_called_once_with('fake_server',
+                ['sudo', 'chmod', '777', 'fake_mount_path'])
 
     def test_mount_device_exception_02(self):
         volume = {'mountpoint': 'fake_mount_point'}
-        generic._ssh_exec.side_effect = exception.ManilaException
+        generic._ssh_exec_script.side_effect = exception.ManilaException
         self.stubs.Set(self._driver, '_get_mount_path',
                 mock.Mock(return_value='fake_mount_path'))
         self.assertRaises(exception.ManilaException,
@@ -275,12 +270,15 @@ class GenericShareDriverTestCase(test.TestCase):
         availiable_volume = fake_volume.FakeVolume()
         self.stubs.Set(self._driver, '_get_device_path',
                        mock.Mock(return_value='fake_device_path'))
+        self.stubs.Set(self._driver, '_release_device_path', mock.Mock())
         self.stubs.Set(self._driver.compute_api, 'instance_volume_attach',
                 mock.Mock(side_effect=exception.ManilaException))
         self.assertRaises(exception.ManilaException,
                           self._driver._attach_volume,
                           self._context, self.share, fake_server,
                           availiable_volume)
+        self._driver._release_device_path.assert_called_once_with(
+                fake_server, 'fake_device_path')
 
     def test_attach_volume_error(self):
         fake_server = fake_compute.FakeServer()
@@ -406,6 +404,21 @@ class GenericShareDriverTestCase(test.TestCase):
 
         self.assertEqual(result, '/dev/vdc')
 
+    def test_get_device_path_reserved(self):
+        fake_server = fake_compute.FakeServer()
+        self.stubs.Set(self._driver.compute_api, 'instance_volumes_list',
+                mock.Mock(return_value=[
+                    fake_volume.FakeVolume(device='/dev/vdb')]))
+
+        first = self._driver._get_device_path(self._context, fake_server)
+        second = self._driver._get_device_path(self._context, fake_server)
+        self._driver._release_device_path(fake_server, first)
+        third = self._driver._get_device_path(self._context, fake_server)
+
+        self.assertEqual(first, '/dev/vdc')
+        self.assertEqual(second, '/dev/vdd')
+        self.assertEqual(third, '/dev/vdc')
+
     def test_allocate_container(self):
         fake_vol = fake_volume.FakeVolume()
         self.stubs.Set(self._driver.volume_api, 'create',
@@ -447,6 +460,18 @@ class GenericShareDriverTestCase(test.TestCase):
                           self._context,
                           self.share)
 
+    def test_allocate_container_volume_vanished(self):
+        fake_vol = fake_volume.FakeVolume(status='creating')
+        self.stubs.Set(self._driver.volume_api, 'create',
+                       mock.Mock(return_value=fake_vol))
+        self.stubs.Set(self._driver.volume_api, 'get', mock.Mock(
+               side_effect=exception.VolumeNotFound(volume_id=fake_vol['id'])))
+
+        self.assertRaises(exception.VolumeNotFound,
+                          self._driver._allocate_container,
+                          self._context,
+                          self.share)
+
     def test_deallocate_container(self):
         fake_vol = fake_volume.FakeVolume()
         self.stubs.Set(self._driver, '_get_volume',
@@ -546,6 +571,19 @@ class GenericShareDriverTestCase(test.TestCase):
                                                      access['access_type'],
                                                      access['access_to'])
 
+    def test_update_access(self):
+        fake_server = fake_compute.FakeServer()
+        access = {'access_type': 'ip', 'access_to': 'fake_dest'}
+        self.stubs.Set(self._driver, 'get_service_instance',
+                       mock.Mock(return_value=fake_server))
+        self._driver.update_access(self._context, self.share, [access], [])
+
+        self._driver.get_service_instance.assert_called_once()
+        self._driver._helpers[self.share['share_proto']].\
+                update_access.assert_called_once_with(fake_server,
+                                                      self.share['name'],
+                                                      [access], [])
+
     def test_deny_access(self):
         fake_server = fake_compute.FakeServer()
         access = {'access_type': 'ip', 'access_to': 'fake_dest'}
@@ -582,6 +620,14 @@ class GenericShareDriverTestCase(test.TestCase):
         self._driver.teardown_network(self.fake_sn)
         sim.delete_service_instance.assert_called_once()
 
+    def test_teardown_network_prunes_device_slots(self):
+        sim = self._driver.instance_manager
+        self._driver.service_instance_manager = sim
+        sim.share_networks_servers = {self.fake_sn['id']: {'id': 'fake_id'}}
+        self._driver._device_slots['fake_id'] = generic.DeviceSlots()
+        self._driver.teardown_network(self.fake_sn)
+        self.assertNotIn('fake_id', self._driver._device_slots)
+
 
 class NFSHelperTestCase(test.TestCase):
     """Test case for NFS helper of generic driver."""
@@ -607,12 +653,24 @@ class NFSHelperTestCase(test.TestCase):
                                   'ip', '10.0.0.2')
         local_path = os.path.join(CONF.share_mount_path, 'volume-00001')
         generic._ssh_exec.assert_has_calls([
-            mock.call(fake_server, ['sudo', 'exportfs']),
+            mock.call(fake_server, ['sudo', 'exportfs', '-v']),
             mock.call(fake_server, ['sudo', 'exportfs', '-o',
                                     'rw,no_subtree_check',
                                     ':'.join(['10.0.0.2', local_path])])
             ])
 
+    def test_allow_access_exists(self):
+        fake_server = fake_compute.FakeServer(ip='10.254.0.3')
+        local_path = os.path.join(CONF.share_mount_path, 'volume-00001')
+        generic._ssh_exec.return_value = (
+            '%s\n\t\t10.0.0.2(rw,wdelay)\n' % local_path, '')
+        self.assertRaises(exception.ShareAccessExists,
+                          self._helper.allow_access, fake_server,
+                          'volume-00001', 'ip', '10.0.0.2')
+        self._helper.allow_access(fake_server, 'volume-00001', 'ip',
+                                  '10.0.0.25')
+        self.assertEqual(2, generic._ssh_exec.call_count)
+
     def test_allow_access_no_ip(self):
         self.assertRaises(exception.InvalidShareAccess,
                           self._helper.allow_access, 'fake_server', 'share0',
@@ -624,7 +682,45 @@ class NFSHelperTestCase(test.TestCase):
         self._helper.deny_access(fake_server, 'volume-00001', 'ip', '10.0.0.2')
         export_string = ':'.join(['10.0.0.2', local_path])
         expected_exec = ['sudo', 'exportfs', '-u', export_string]
-        generic._ssh_exec.assert_called_once_with(fake_server, expected_exec)
+        generic._ssh_exec.assert_any_call(fake_server, expected_exec)
+        self.assertEqual(2, generic._ssh_exec.call_count)
+
+    def test_update_access(self):
+        fake_server = fake_compute.FakeServer(ip='10.254.0.3')
+        local_path = os.path.join(CONF.share_mount_path, 'volume-00001')
+        add_rules = [{'access_type': 'ip', 'access_to': '10.0.0.2'},
+                     {'access_type': 'ip', 'access_to': '10.0.0.3'}]
+        delete_rules = [{'access_type': 'ip', 'access_to': '10.0.0.4'}]
+        self._helper.update_access(fake_server, 'volume-00001', add_rules,
+                                   delete_rules)
+        generic._ssh_exec.assert_has_calls([
+            mock.call(fake_server, ['sudo', 'exportfs', '-v']),
+            mock.call(fake_server, ['sudo', 'exportfs', '-u',
+                                    ':'.join(['10.0.0.4', local_path])]),
+            mock.call(fake_server, ['sudo', 'exportfs', '-o',
+                                    'rw,no_subtree_check',
+                                    ':'.join(['10.0.0.2', local_path]),
+                                    ':'.join(['10.0.0.3', local_path])])
+            ])
+        self.assertEqual(3, generic._ssh_exec.call_count)
+
+    def test_update_access_exports_file(self):
+        self.flags(nfs_exports_file='/etc/exports.d/manila.exports')
+        self.stubs.Set(generic, '_ssh_exec_script', mock.Mock())
+        fake_server = fake_compute.FakeServer(ip='10.254.0.3')
+        local_path = os.path.join(CONF.share_mount_path, 'volume-00001')
+        self._helper.update_access(
+            fake_server, 'volume-00001',
+            [{'access_type': 'ip', 'access_to': '10.0.0.2'}], [])
+        generic._ssh_exec.assert_called_once_with(
+            fake_server, ['sudo', 'exportfs', '-v'])
+        generic._ssh_exec_script.assert_called_once_with(fake_server, [
+            ['sudo', 'mkdir', '-p', '/etc/exports.d'],
+            ['echo', "'%s 10.0.0.2(rw,no_subtree_check)\n'" % local_path,
+             '|', 'sudo', 'tee', '/etc/exports.d/manila.exports', '>',
+             '/dev/null'],
+            ['sudo', 'exportfs', '-ra'],
+        ])
 
 
 class CIFSHelperTestCase(test.TestCase):
@@ -634,6 +730,8 @@ class CIFSHelperTestCase(test.TestCase):
         super(CIFSHelperTestCase, self).setUp()
         self.fake_conf = Configuration(None)
         self.stubs.Set(generic, '_ssh_exec', mock.Mock(return_value=('', '')))
+        self.stubs.Set(generic, '_ssh_exec_script',
+                       mock.Mock(return_value=('', '')))
         self._execute = mock.Mock(return_value=('', ''))
         self._helper = generic.CIFSHelper(self._execute, self.fake_conf, {})
 
@@ -642,7 +740,6 @@ class CIFSHelperTestCase(test.TestCase):
                                     share_network_id='fake_share_network_id')
         self.stubs.Set(self._helper, '_update_config', mock.Mock())
         self.stubs.Set(self._helper, '_write_remote_config', mock.Mock())
-        self.stubs.Set(self._helper, '_restart_service', mock.Mock())
         self.stubs.Set(self._helper, '_get_local_config', mock.Mock())
         self.stubs.Set(generic.ConfigParser, 'ConfigParser', mock.Mock())
 
@@ -652,7 +749,6 @@ class CIFSHelperTestCase(test.TestCase):
                 assert_called_once_with(fake_server['share_network_id'])
         self._helper._update_config.assert_called_once()
         self._helper._write_remote_config.assert_called_once()
-        self._helper._restart_service.assert_called_once()
         expected_location = '//%s/%s' % (fake_server['ip'], 'volume-00001')
         self.assertEqual(ret, expected_location)
 
@@ -670,6 +766,32 @@ class CIFSHelperTestCase(test.TestCase):
         generic._ssh_exec.assert_called_once_with(fake_server,
                 ['sudo', 'smbcontrol', 'all', 'close-share', 'volume-00001'])
 
+    def test_write_remote_config(self):
+        fake_server = fake_compute.FakeServer(ip='10.254.0.3',
+                                    share_network_id='fake_share_network_id')
+        with mock.patch.object(generic, 'open',
+                               mock.mock_open(read_data='[global]'),
+                               create=True):
+            self._helper._write_remote_config('fake_config', fake_server)
+
+        generic._ssh_exec_script.assert_called_once_with(fake_server, [
+            ["echo '[global]' > %s" % self._helper.config_path],
+            ['sudo', 'pkill', '-HUP', 'smbd'],
+        ])
+
+    def test_write_remote_config_no_reload(self):
+        fake_server = fake_compute.FakeServer(ip='10.254.0.3',
+                                    share_network_id='fake_share_network_id')
+        with mock.patch.object(generic, 'open',
+                               mock.mock_open(read_data='[global]'),
+                               create=True):
+            self._helper._write_remote_config('fake_config', fake_server,
+                                              reload=False)
+
+        generic._ssh_exec_script.assert_called_once_with(fake_server, [
+            ["echo '[global]' > %s" % self._helper.config_path],
+        ])
+
     def test_allow_access(self):
         class FakeParser(object):
             def read(self, *args, **kwargs):
@@ -687,14 +809,12 @@ class CIFSHelperTestCase(test.TestCase):
         self.stubs.Set(self._helper, '_get_local_config', mock.Mock())
         self.stubs.Set(self._helper, '_update_config', mock.Mock())
         self.stubs.Set(self._helper, '_write_remote_config', mock.Mock())
-        self.stubs.Set(self._helper, '_restart_service', mock.Mock())
 
         self._helper.allow_access(fake_server, 'volume-00001',
                                   'ip', '10.0.0.2')
         self._helper._get_local_config.assert_called_once()
         self._helper._update_config.assert_called_once()
         self._helper._write_remote_config.assert_called_once()
-        self._helper._restart_service.assert_called_once()
 
     def test_deny_access(self):
         fake_server = fake_compute.FakeServer(ip='10.254.0.3',
@@ -703,11 +823,127 @@ class CIFSHelperTestCase(test.TestCase):
         self.stubs.Set(self._helper, '_get_local_config', mock.Mock())
         self.stubs.Set(self._helper, '_update_config', mock.Mock())
         self.stubs.Set(self._helper, '_write_remote_config', mock.Mock())
-        self.stubs.Set(self._helper, '_restart_service', mock.Mock())
 
         self._helper.deny_access(fake_server, 'volume-00001',
                                   'ip', '10.0.0.2')
         self._helper._get_local_config.assert_called_once()
         self._helper._update_config.assert_called_once()
         self._helper._write_remote_config.assert_called_once()
-        self._helper._restart_service.assert_called_once()
+
+    def test_update_access(self):
+        fake_server = fake_compute.FakeServer(ip='10.254.0.3',
+                                    share_network_id='fake_share_network_id')
+        parser = mock.Mock()
+        parser.get.return_value = '127.0.0.1 10.0.0.4'
+        self.stubs.Set(generic.ConfigParser, 'ConfigParser',
+                       mock.Mock(return_value=parser))
+        self.stubs.Set(self._helper, '_get_local_config', mock.Mock())
+        self.stubs.Set(self._helper, '_update_config', mock.Mock())
+        self.stubs.Set(self._helper, '_write_remote_config', mock.Mock())
+
+        self._helper.update_access(
+            fake_server, 'volume-00001',
+            [{'access_type': 'ip', 'access_to': '10.0.0.2'},
+             {'access_type': 'ip', 'access_to': '10.0.0.3'}],
+            [{'access_type': 'ip', 'access_to': '10.0.0.4'}])
+        parser.set.assert_called_once_with('volume-00001', 'hosts allow',
+                                           '127.0.0.1 10.0.0.2 10.0.0.3')
+        self._helper._update_config.assert_called_once()
+        self._helper._write_remote_config.assert_called_once()
+
+
+class CIFSNetConfHelperTestCase(test.TestCase):
+    """Test case for registry based CIFS helper of generic driver."""
+
+    def setUp(self):
+        super(CIFSNetConfHelperTestCase, self).setUp()
+        self.fake_conf = Configuration(None)
+        self.stubs.Set(generic, '_ssh_exec', mock.Mock(return_value=('', '')))
+        self.stubs.Set(generic, '_ssh_exec_script',
+                       mock.Mock(return_value=('', '')))
+        self._helper = generic.CIFSNetConfHelper(mock.Mock(), self.fake_conf,
+                                                 {})
+        self.server = fake_compute.FakeServer(ip='10.254.0.3',
+                                    share_network_id='fake_share_network_id')
+
+    def test_create_export(self):
+        ret = self._helper.create_export(self.server, 'volume-00001')
+
+        self.assertEqual(ret, '//10.254.0.3/volume-00001')
+        commands = generic._ssh_exec_script.call_args[0][1]
+        self.assertEqual(commands[0],
+            ['sudo', 'net', 'conf', 'addshare', 'volume-00001',
+             os.path.join(CONF.share_mount_path, 'volume-00001'),
+             'writeable=y', 'guest_ok=y'])
+        self.assertIn(['sudo', 'net', 'conf', 'setparm', 'volume-00001',
+                       "'hosts deny'", '0.0.0.0/0'], commands)
+        self.assertEqual(len(commands), 6)
+        generic._ssh_exec_script.assert_called_once()
+        self.assertFalse(generic._ssh_exec.called)
+
+    def test_create_export_recreate(self):
+        self._helper.create_export(self.server, 'volume-00001',
+                                   recreate=True)
+
+        commands = generic._ssh_exec_script.call_args[0][1]
+        self.assertEqual(commands[0], ['sudo', 'net', 'conf', 'delshare',
+                                       'volume-00001', '||', 'true'])
+
+    def test_create_export_exists(self):
+        self.stubs.Set(generic, '_ssh_exec_script', mock.Mock(
+            side_effect=exception.ProcessExecutionError(
+                stderr='ERROR: share volume-00001 already exists.')))
+
+        self.assertRaises(exception.ShareBackendException,
+                          self._helper.create_export, self.server,
+                          'volume-00001')
+
+    def test_remove_export_not_exists(self):
+        self.stubs.Set(generic, '_ssh_exec_script', mock.Mock(
+            side_effect=exception.ProcessExecutionError(
+                stderr='SBC_ERR_NO_SUCH_SERVICE')))
+
+        self._helper.remove_export(self.server, 'volume-00001')
+
+        generic._ssh_exec.assert_called_once_with(
+            self.server,
+            ['sudo', 'smbcontrol', 'all', 'close-share', 'volume-00001'])
+
+    def test_allow_access(self):
+        generic._ssh_exec.return_value = ('127.0.0.1\n', '')
+
+        self._helper.allow_access(self.server, 'volume-00001', 'ip',
+                                  '10.0.0.2')
+
+        generic._ssh_exec.assert_called_with(
+            self.server, ['sudo', 'net', 'conf', 'setparm', 'volume-00001',
+                          "'hosts allow'", "'127.0.0.1 10.0.0.2'"])
+
+    def test_allow_access_exists(self):
+        generic._ssh_exec.return_value = ('127.0.0.1 10.0.0.2\n', '')
+
+        self.assertRaises(exception.ShareAccessExists,
+                          self._helper.allow_access, self.server,
+                          'volume-00001', 'ip', '10.0.0.2')
+
+    def test_deny_access_force(self):
+        generic._ssh_exec.side_effect = exception.ProcessExecutionError(
+            stdout='share volume-00001 does not exist')
+
+        self._helper.deny_access(self.server, 'volume-00001', 'ip',
+                                 '10.0.0.2', force=True)
+
+        generic._ssh_exec.assert_called_once()
+
+    def test_update_access(self):
+        generic._ssh_exec.return_value = ('127.0.0.1 10.0.0.4\n', '')
+
+        self._helper.update_access(
+            self.server, 'volume-00001',
+            [{'access_type': 'ip', 'access_to': '10.0.0.2'}],
+            [{'access_type': 'ip', 'access_to': '10.0.0.4'}])
+
+        self.assertEqual(generic._ssh_exec.call_count, 2)
+        generic._ssh_exec.assert_called_with(
+            self.server, ['sudo', 'net', 'conf', 'setparm', 'volume-00001',
+                          "'hosts allow'", "'127.0.0.1 10.0.0.2'"])
@@ -16,6 +16,7 @@
 #    under the License.
 
 import errno
+import eventlet
 from mock import Mock
 from mock import patch
 import os
@@ -106,6 +107,69 @@ class GlusterAddressTestCase(test.TestCase):
                             ' '.join(self._gluster_args))
         self.assertEqual(ret[1], {})
 
+    def test_gluster_address_make_remote_args_local(self):
+        self._gluster_address = glusterfs.GlusterAddress(
+            '127.0.0.1:/testvol')
+        ret = self._gluster_address.make_remote_args('cat', 'foo')
+        self.assertEqual(ret, (('cat', 'foo'), {'run_as_root': True}))
+
+
+class ExportDirQueueTestCase(test.TestCase):
+    """Tests ExportDirQueue."""
+
+    def setUp(self):
+        super(ExportDirQueueTestCase, self).setUp()
+        self.load = Mock(return_value=['/foo(0.0.0.0)'])
+        self.store = Mock()
+        self.get_version = Mock(return_value=3)
+        self.queue = glusterfs.ExportDirQueue(
+            self.load, self.store, self.get_version, 0)
+
+    def test_change_coalesced(self):
+        pool = eventlet.GreenPool()
+        for dirs in ('/bar(0.0.0.0)', '/baz(0.0.0.0)'):
+            pool.spawn(self.queue.change, lambda dl, d=dirs: dl.append(d))
+        pool.waitall()
+        self.store.assert_called_once_with(
+            ['/foo(0.0.0.0)', '/bar(0.0.0.0)', '/baz(0.0.0.0)'])
+
+    def test_change_noop(self):
+        self.queue.change(lambda dl: True)
+        self.assertFalse(self.store.called)
+
+    def test_change_cached(self):
+        self.queue.change(lambda dl: dl.append('/bar(0.0.0.0)'))
+        # Version after our own volume set.
+        self.get_version.return_value = 4
+        self.queue.change(lambda dl: dl.remove('/foo(0.0.0.0)'))
+        self.assertEqual(1, self.load.call_count)
+        self.assertEqual(self.store.call_args[0][0], ['/bar(0.0.0.0)'])
+
+    def test_change_version_changed(self):
+        self.queue.change(lambda dl: dl.append('/bar(0.0.0.0)'))
+        self.get_version.return_value = 7
+        self.queue.change(lambda dl: dl.append('/baz(0.0.0.0)'))
+        self.assertEqual(2, self.load.call_count)
+        self.assertEqual(self.store.call_args[0][0],
+                         ['/foo(0.0.0.0)', '/baz(0.0.0.0)'])
+
+    def test_change_no_version(self):
+        self.get_version.return_value = None
+        self.queue.change(lambda dl: True)
+        self.queue.change(lambda dl: True)
+        self.assertEqual(2, self.load.call_count)
+
+    def test_change_store_fails(self):
+        self.store.side_effect = exception.ProcessExecutionError
+        self.assertRaises(exception.ProcessExecutionError,
+                          self.queue.change,
+                          lambda dl: dl.append('/bar(0.0.0.0)'))
+        self.store.side_effect = None
+        self.queue.change(lambda dl: dl.append('/baz(0.0.0.0)'))
+        self.assertEqual(2, self.load.call_count)
+        self.assertEqual(self.store.call_args[0][0],
+                         ['/foo(0.0.0.0)', '/baz(0.0.0.0)'])
+
 
 class GlusterfsShareDriverTestCase(test.TestCase):
     """Tests GlusterfsShareDriver."""
@@ -117,6 +181,7 @@ class GlusterfsShareDriverTestCase(test.TestCase):
         self._context = context.get_admin_context()
 
         CONF.set_default('glusterfs_mount_point_base', '/mnt/nfs')
+        self.flags(glusterfs_export_dir_flush_interval=0)
 
         self.fake_conf = config.Configuration(None)
         self._db = Mock()
@@ -124,6 +189,7 @@ class GlusterfsShareDriverTestCase(test.TestCase):
                         self._db, execute=self._execute,
                         configuration=self.fake_conf)
         self._driver.gluster_address = Mock(**gluster_address_attrs)
+        self._driver._get_volume_version = Mock(return_value=None)
         self.share = fake_share()
 
     def tearDown(self):
@@ -312,6 +378,100 @@ class GlusterfsShareDriverTestCase(test.TestCase):
         self.assertEqual(fake_utils.fake_execute_get_log(), expected_exec)
         self.assertEqual(ret, ['foo', 'bar'])
 
+    def test_get_volume_version(self):
+        driver = glusterfs.GlusterfsShareDriver(
+            self._db, execute=self._execute, configuration=self.fake_conf)
+        driver.gluster_address = glusterfs.GlusterAddress(
+            '127.0.0.1:/testvol')
+
+        def exec_runner(*ignore_args, **ignore_kwargs):
+            return 'type=0\ncount=1\nversion=12\nstatus=1\n', ''
+        expected_exec = ['cat /var/lib/glusterd/vols/testvol/info']
+        fake_utils.fake_execute_set_repliers([(expected_exec[0], exec_runner)])
+        self.assertEqual(driver._get_volume_version(), 12)
+        self.assertEqual(fake_utils.fake_execute_get_log(), expected_exec)
+
+    def test_get_volume_version_fails(self):
+        driver = glusterfs.GlusterfsShareDriver(
+            self._db, execute=self._execute, configuration=self.fake_conf)
+        driver.gluster_address = glusterfs.GlusterAddress(
+            '127.0.0.1:/testvol')
+
+        def exec_runner(*ignore_args, **ignore_kwargs):
+            raise exception.ProcessExecutionError
+        fake_utils.fake_execute_set_repliers([('cat', exec_runner)])
+        self.assertEqual(driver._get_volume_version(), None)
+
+    def test_check_for_setup_error_quota(self):
+        self.flags(glusterfs_share_quota=True)
+        self._driver._get_quota_list = Mock(return_value={})
+        self._driver.check_for_setup_error()
+        self.assertEqual(self._driver._quotas, {})
+
+    def test_check_for_setup_error_quota_not_enabled(self):
+        self.flags(glusterfs_share_quota=True)
+        self._driver._get_quota_list = Mock(
+            side_effect=exception.ProcessExecutionError)
+        self.assertRaises(exception.GlusterfsException,
+                          self._driver.check_for_setup_error)
+
+    def test_get_quota_list(self):
+        self._driver.gluster_address = Mock(make_gluster_args=
+            Mock(return_value=(('true',), {})))
+
+        def exec_runner(*ignore_args, **ignore_kwargs):
+            return """\
+<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<cliOutput>
+  <opRet>0</opRet>
+  <volQuota>
+    <limit>
+      <path>/foo</path>
+      <hard_limit>1073741824</hard_limit>
+      <used_space>1024</used_space>
+    </limit>
+    <limit>
+      <path>/bar</path>
+      <hard_limit>2147483648</hard_limit>
+      <used_space>0</used_space>
+    </limit>
+  </volQuota>
+</cliOutput>
+""", ''
+        fake_utils.fake_execute_set_repliers([('true', exec_runner)])
+        ret = self._driver._get_quota_list()
+        self.assertEqual(fake_utils.fake_execute_get_log(), ['true'])
+        self.assertEqual(ret, {'/foo': (1073741824, 1024),
+                               '/bar': (2147483648, 0)})
+
+    def test_update_share_status(self):
+        self.flags(glusterfs_share_quota=True)
+        self._driver._get_quota_list = Mock(
+            return_value={'/foo': (3 * glusterfs._GiB, 0)})
+        stat = Mock(f_blocks=10, f_bavail=8, f_frsize=glusterfs._GiB)
+        with patch.object(os, 'statvfs', return_value=stat):
+            stats = self._driver.get_share_stats(refresh=True)
+        self.assertEqual(stats['total_capacity_gb'], 10)
+        self.assertEqual(stats['free_capacity_gb'], 7)
+        self.assertEqual(stats['share_backend_name'], 'GlusterFS')
+
+    def test_update_share_status_quota_list_fails(self):
+        self.flags(glusterfs_share_quota=True)
+        self._driver._quotas = {'/foo': (9 * glusterfs._GiB, 0)}
+        self._driver._get_quota_list = Mock(
+            side_effect=exception.ProcessExecutionError)
+        stat = Mock(f_blocks=10, f_bavail=8, f_frsize=glusterfs._GiB)
+        with patch.object(os, 'statvfs', return_value=stat):
+            stats = self._driver.get_share_stats(refresh=True)
+        self.assertEqual(stats['free_capacity_gb'], 1)
+
+    def test_update_share_status_no_quota(self):
+        stat = Mock(f_blocks=10, f_bavail=8, f_frsize=glusterfs._GiB)
+        with patch.object(os, 'statvfs', return_value=stat):
+            stats = self._driver.get_share_stats(refresh=True)
+        self.assertEqual(stats['total_capacity_gb'], 10)
+        self.assertEqual(stats['free_capacity_gb'], 8)
+
     def test_get_local_share_path(self):
         with patch.object(os, 'access', return_value=True):
             expected_ret = '/mnt/nfs/testvol/fakename'
@@ -334,6 +494,40 @@ class GlusterfsShareDriverTestCase(test.TestCase):
         self.assertEqual(fake_utils.fake_execute_get_log(), expected_exec)
         self.assertEqual(ret, expected_ret)
 
+    def test_create_share_with_quota(self):
+        self.flags(glusterfs_share_quota=True)
+        self._driver._get_local_share_path =\
+            Mock(return_value='/mnt/nfs/testvol/fakename')
+        self._driver.gluster_address = Mock(
+            make_gluster_args=Mock(return_value=(('true',), {})),
+            **gluster_address_attrs)
+        self._driver._quotas = {}
+
+        self._driver.create_share(self._context, self.share)
+        self.assertEqual(fake_utils.fake_execute_get_log(),
+                         ['mkdir /mnt/nfs/testvol/fakename', 'true'])
+        self._driver.gluster_address.make_gluster_args.assert_called_once_with(
+            'volume', 'quota', 'testvol', 'limit-usage', '/fakename', '1GB')
+        self.assertEqual(self._driver._quotas,
+                         {'/fakename': (glusterfs._GiB, 0)})
+
+    def test_create_share_with_quota_fails(self):
+        self.flags(glusterfs_share_quota=True)
+        self._driver._get_local_share_path =\
+            Mock(return_value='/mnt/nfs/testvol/fakename')
+        self._driver.gluster_address = Mock(
+            make_gluster_args=Mock(return_value=(('true',), {})),
+            **gluster_address_attrs)
+
+        def exec_runner(*ignore_args, **ignore_kw):
+            raise exception.ProcessExecutionError
+        fake_utils.fake_execute_set_repliers([('true', exec_runner)])
+        self.assertRaises(exception.ProcessExecutionError,
+                          self._driver.create_share, self._context, self.share)
+        self.assertEqual(fake_utils.fake_execute_get_log(),
+                         ['mkdir /mnt/nfs/testvol/fakename', 'true',
+                          'rm -rf /mnt/nfs/testvol/fakename'])
+
     def test_cannot_create_share(self):
         self._driver._get_local_share_path =\
             Mock(return_value='/mnt/nfs/testvol/fakename')
@@ -356,6 +550,22 @@ class GlusterfsShareDriverTestCase(test.TestCase):
         self._driver.delete_share(self._context, self.share)
         self.assertEqual(fake_utils.fake_execute_get_log(), expected_exec)
 
+    def test_delete_share_with_quota(self):
+        self.flags(glusterfs_share_quota=True)
+        self._driver._get_local_share_path =\
+            Mock(return_value='/mnt/nfs/testvol/fakename')
+        self._driver.gluster_address = Mock(
+            make_gluster_args=Mock(return_value=(('true',), {})),
+            **gluster_address_attrs)
+        self._driver._quotas = {'/fakename': (glusterfs._GiB, 0)}
+
+        self._driver.delete_share(self._context, self.share)
+        self.assertEqual(fake_utils.fake_execute_get_log(),
+                         ['true', 'rm -rf /mnt/nfs/testvol/fakename'])
+        self._driver.gluster_address.make_gluster_args.assert_called_once_with(
+            'volume', 'quota', 'testvol', 'remove', '/fakename')
+        self.assertEqual(self._driver._quotas, {})
+
     def test_cannot_delete_share(self):
         self._driver._get_local_share_path =\
             Mock(return_value='/mnt/nfs/testvol/fakename')
@@ -378,7 +588,7 @@ class GlusterfsShareDriverTestCase(test.TestCase):
     def test_manage_access_noop(self):
         cbk = Mock(return_value=True)
         access = {'access_type': 'ip', 'access_to': '0.0.0.0'}
-        self._driver._get_export_dir_list = Mock()
+        self._driver._get_export_dir_list = Mock(return_value=[])
         self._driver.gluster_address = Mock(make_gluster_args=
             Mock(return_value=(('true',), {})))
         expected_exec = []
@@ -466,3 +676,30 @@ class GlusterfsShareDriverTestCase(test.TestCase):
         self.assertEqual(
           self._driver.gluster_address.make_gluster_args.call_args[0][-1],
           '/example.com(0.0.0.0)')
+
+    def test_update_access(self):
+        self._driver._get_export_dir_list = \
+            Mock(return_value=['/fakename(0.0.0.1)', '/example.com(0.0.0.0)'])
+        self._driver.gluster_address = Mock(make_gluster_args=
+            Mock(return_value=(('true',), {})))
+        self._driver.update_access(
+            self._context, self.share,
+            [{'access_type': 'ip', 'access_to': '0.0.0.2'},
+             {'access_type': 'ip', 'access_to': '0.0.0.3'}],
+            [{'access_type': 'ip', 'access_to': '0.0.0.1'}])
+        self.assertEqual(
+            1, self._driver.gluster_address.make_gluster_args.call_count)
+        self.assertEqual(
+          self._driver.gluster_address.make_gluster_args.call_args[0][-1],
+          '/example.com(0.0.0.0),/fakename(0.0.0.2),/fakename(0.0.0.3)')
+
+    def test_update_access_nothing_changed(self):
+        self._driver._get_export_dir_list = \
+            Mock(return_value=['/fakename(0.0.0.0)'])
+        self._driver.gluster_address = Mock(make_gluster_args=
+            Mock(return_value=(('true',), {})))
+        self._driver.update_access(
+            self._context, self.share,
+            [{'access_type': 'ip', 'access_to': '0.0.0.0'}],
+            [{'access_type': 'ip', 'access_to': '0.0.0.1'}])
+        self.assertFalse(self._driver.gluster_address.make_gluster_args.called)
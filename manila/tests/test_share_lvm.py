@@ -191,8 +191,124 @@ class LVMShareDriverTestCase(test.TestCase):
             'mkfs.ext4 /dev/mapper/fakevg-fakename',
             ("dd count=0 if=%s of=%s iflag=direct oflag=direct" %
              (mount_snapshot, mount_share)),
-            ("dd if=%s of=%s count=1024 bs=1M iflag=direct oflag=direct" %
-             (mount_snapshot, mount_share)),
+            "dumpe2fs %s" % mount_snapshot,
+            ("dd if=%s of=%s count=1024 bs=1M skip=0 seek=0 iflag=direct "
+             "oflag=direct" % (mount_snapshot, mount_share)),
+        ]
+        self.assertEqual(fake_utils.fake_execute_get_log(), expected_exec)
+
+    def test_copy_volume_skips_free_chunks(self):
+        self.flags(share_lvm_copy_chunk_mb=4, share_lvm_copy_ionice='-c3')
+
+        def dumpe2fs_runner(*ignore_args, **ignore_kwargs):
+            return ('Filesystem features:      has_journal extent\n'
+                    'Filesystem state:         clean\n'
+                    'Block count:              3072\n'
+                    'Free blocks:              1024\n'
+                    'Block size:               4096\n'
+                    'Group 0: (Blocks 0-2047)\n'
+                    '  Free blocks: 1024-2047\n'
+                    'Group 1: (Blocks 2048-3071)\n'
+                    '  Free blocks: \n'), ''
+
+        fake_utils.fake_execute_set_repliers([('dumpe2fs', dumpe2fs_runner)])
+        self._driver._copy_volume('/dev/src', '/dev/dst', 1)
+
+        copies = [cmd for cmd in fake_utils.fake_execute_get_log()
+                  if cmd.startswith('ionice')]
+        # Chunk 1 holds blocks 1024-2047 only, chunks 3 and over are past
+        # the end of the filesystem.
+        self.assertEqual(copies, [
+            'ionice -c3 dd if=/dev/src of=/dev/dst count=4 bs=1M skip=0 '
+            'seek=0 iflag=direct oflag=direct',
+            'ionice -c3 dd if=/dev/src of=/dev/dst count=4 bs=1M skip=8 '
+            'seek=8 iflag=direct oflag=direct',
+        ])
+
+    def _test_copy_volume_copies_all(self, header):
+        self.flags(share_lvm_copy_chunk_mb=4)
+
+        def dumpe2fs_runner(*ignore_args, **ignore_kwargs):
+            return (header +
+                    'Block count:              3072\n'
+                    'Block size:               4096\n'
+                    'Group 0: (Blocks 0-2047)\n'
+                    '  Free blocks: 1024-2047\n'
+                    'Group 1: (Blocks 2048-3071)\n'
+                    '  Free blocks: 2048-3071\n'), ''
+
+        fake_utils.fake_execute_set_repliers([('dumpe2fs', dumpe2fs_runner)])
+        self._driver._copy_volume('/dev/src', '/dev/dst', 1)
+
+        copies = [cmd for cmd in fake_utils.fake_execute_get_log()
+                  if cmd.startswith('dd if=')]
+        self.assertEqual(len(copies), 256)
+
+    def test_copy_volume_not_clean(self):
+        self._test_copy_volume_copies_all(
+            'Filesystem features:      has_journal extent\n'
+            'Filesystem state:         not clean\n')
+
+    def test_copy_volume_needs_recovery(self):
+        self._test_copy_volume_copies_all(
+            'Filesystem features:      has_journal needs_recovery extent\n'
+            'Filesystem state:         clean\n')
+
+    def test_copy_throttle(self):
+        self.mox.StubOutWithMock(lvm.time, 'time')
+        self.mox.StubOutWithMock(lvm.time, 'sleep')
+        lvm.time.time().AndReturn(100)
+        lvm.time.time().AndReturn(100)
+        lvm.time.time().AndReturn(100.5)
+        lvm.time.sleep(1.5)
+        self.mox.ReplayAll()
+
+        throttle = lvm.CopyThrottle(1024)
+        throttle.consume(2048)
+        throttle.consume(1024)
+
+    def test_create_share_thin(self):
+        self.flags(share_lvm_thin_pool='fakepool', share_lvm_mirrors=2)
+        self._helper_nfs.create_export.return_value = 'fakelocation'
+        self._driver._mount_device = mock.Mock()
+        ret = self._driver.create_share(self._context, self.share)
+        expected_exec = [
+            'lvcreate -V 1G -T fakevg/fakepool -n fakename',
+            'mkfs.ext4 /dev/mapper/fakevg-fakename',
+        ]
+        self.assertEqual(fake_utils.fake_execute_get_log(), expected_exec)
+        self.assertEqual(ret, 'fakelocation')
+
+    def test_create_share_from_snapshot_thin(self):
+        self.flags(share_lvm_thin_pool='fakepool')
+        self._driver._mount_device = mock.Mock()
+        self._helper_nfs.create_export.return_value = 'fakelocation'
+
+        ret = self._driver.create_share_from_snapshot(self._context,
+                                                      self.share,
+                                                      self.snapshot)
+
+        self._driver._mount_device.assert_called_with(
+            self.share, '/dev/mapper/fakevg-fakename')
+        expected_exec = [
+            'lvcreate -kn --name fakename --snapshot fakevg/fakesnapshotname',
+        ]
+        self.assertEqual(fake_utils.fake_execute_get_log(), expected_exec)
+        self.assertEqual(ret, 'fakelocation')
+
+    def test_create_share_from_snapshot_thin_bigger(self):
+        self.flags(share_lvm_thin_pool='fakepool')
+        self._driver._mount_device = mock.Mock()
+        share = fake_share(size=2)
+
+        self._driver.create_share_from_snapshot(self._context, share,
+                                                self.snapshot)
+
+        expected_exec = [
+            'lvcreate -kn --name fakename --snapshot fakevg/fakesnapshotname',
+            'lvextend -L 2G fakevg/fakename',
+            'e2fsck -f -y /dev/mapper/fakevg-fakename',
+            'resize2fs /dev/mapper/fakevg-fakename',
         ]
         self.assertEqual(fake_utils.fake_execute_get_log(), expected_exec)
 
@@ -240,6 +356,31 @@ class LVMShareDriverTestCase(test.TestCase):
         self.assertEqual(fake_utils.fake_execute_get_log(), expected_exec)
         self.assertEqual(ret, expected_ret)
 
+    def test_get_share_stats_thin(self):
+        self.flags(share_lvm_thin_pool='fakepool',
+                   share_lvm_max_over_subscription_ratio=2.0)
+
+        def vgs_runner(*ignore_args, **ignore_kwargs):
+            return '\n  fakevg 5.38  4.30\n', ''
+
+        def lvs_runner(*ignore_args, **ignore_kwargs):
+            return ('  fakepool:4.00::25.00:1.50\n'
+                    '  share1:3.00:fakepool::\n'
+                    '  share2:2.00:fakepool::\n'
+                    '  other:1.00:::\n'), ''
+
+        fake_utils.fake_execute_set_repliers([('vgs', vgs_runner),
+                                              ('lvs', lvs_runner)])
+        ret = self._driver.get_share_stats(refresh=True)
+        self.assertEqual(ret['total_capacity_gb'], 4.0)
+        self.assertEqual(ret['free_capacity_gb'], 3.0)
+        self.assertEqual(ret['provisioned_capacity_gb'], 5.0)
+        self.assertEqual(ret['over_subscription_ratio'], 1.25)
+        self.assertEqual(ret['max_over_subscription_ratio'], 2.0)
+        self.assertEqual(ret['thin_pool_data_percent'], 25.0)
+        self.assertEqual(ret['thin_pool_metadata_percent'], 1.5)
+        self.assertTrue(ret['thin_provisioning_support'])
+
     def test_get_share_stats_error(self):
         def exec_runner(*ignore_args, **ignore_kwargs):
             raise exception.ProcessExecutionError()
@@ -306,9 +447,76 @@ class LVMShareDriverTestCase(test.TestCase):
 
     def test_create_snapshot(self):
         self._driver.create_snapshot(self._context, self.snapshot)
+        mount_path = self._get_mount_path(self.share)
         expected_exec = [
+            'fsfreeze -f %s' % mount_path,
             ("lvcreate -L 1G --name fakesnapshotname --snapshot %s/fakename" %
              (CONF.share_volume_group,)),
+            'fsfreeze -u %s' % mount_path,
+        ]
+        self.assertEqual(fake_utils.fake_execute_get_log(), expected_exec)
+
+    def test_create_snapshot_not_frozen(self):
+        def freeze_runner(*ignore_args, **ignore_kwargs):
+            raise exception.ProcessExecutionError(stderr='not mounted')
+
+        fake_utils.fake_execute_set_repliers([('fsfreeze', freeze_runner)])
+        self._driver.create_snapshot(self._context, self.snapshot)
+        expected_exec = [
+            'fsfreeze -f %s' % self._get_mount_path(self.share),
+            ("lvcreate -L 1G --name fakesnapshotname --snapshot %s/fakename" %
+             (CONF.share_volume_group,)),
+        ]
+        self.assertEqual(fake_utils.fake_execute_get_log(), expected_exec)
+
+    def test_create_share_from_frozen_snapshot_skips_chunks(self):
+        self.flags(share_lvm_copy_chunk_mb=256)
+        self._driver._mount_device = mock.Mock()
+        state = {'frozen': False, 'snapshot_frozen': False}
+
+        def freeze_runner(cmd, **ignore_kwargs):
+            state['frozen'] = cmd[1] == '-f'
+            return '', ''
+
+        def snapshot_runner(*ignore_args, **ignore_kwargs):
+            state['snapshot_frozen'] = state['frozen']
+            return '', ''
+
+        def dumpe2fs_runner(*ignore_args, **ignore_kwargs):
+            # Snapshots of a live filesystem carry its journal state.
+            features = 'has_journal extent'
+            if not state['snapshot_frozen']:
+                features += ' needs_recovery'
+            return ('Filesystem features:      %s\n'
+                    'Filesystem state:         clean\n'
+                    'Block count:              262144\n'
+                    'Block size:               4096\n'
+                    'Group 0: (Blocks 0-262143)\n'
+                    '  Free blocks: 65536-262143\n' % features), ''
+
+        fake_utils.fake_execute_set_repliers([
+            ('fsfreeze', freeze_runner),
+            ('lvcreate .* --snapshot', snapshot_runner),
+            ('dumpe2fs', dumpe2fs_runner),
+        ])
+        self._driver.create_snapshot(self._context, self.snapshot)
+        self._driver.create_share_from_snapshot(self._context,
+                                                fake_share(name='newname'),
+                                                self.snapshot)
+
+        copies = [cmd for cmd in fake_utils.fake_execute_get_log()
+                  if cmd.startswith('dd if=')]
+        self.assertEqual(len(copies), 1)
+        self.assertFalse(state['frozen'])
+        self._db.share_update.assert_has_calls([
+            mock.call(self._context, 'fakeid', {'progress': '%d%%' % percent})
+            for percent in (25, 50, 75, 100)])
+
+    def test_create_snapshot_thin(self):
+        self.flags(share_lvm_thin_pool='fakepool')
+        self._driver.create_snapshot(self._context, self.snapshot)
+        expected_exec = [
+            'lvcreate --name fakesnapshotname --snapshot fakevg/fakename',
         ]
         self.assertEqual(fake_utils.fake_execute_get_log(), expected_exec)
 
@@ -353,6 +561,13 @@ class LVMShareDriverTestCase(test.TestCase):
                                      self.access['access_to'])
         self._driver.deny_access(self._context, self.share, self.access)
 
+    def test_update_access(self):
+        mount_path = self._get_mount_path(self.share)
+        self._driver.update_access(self._context, self.share,
+                                   [self.access], [])
+        self._helper_nfs.update_access.assert_called_once_with(
+            mount_path, self.share['name'], [self.access], [])
+
     def test_mount_device(self):
         mount_path = self._get_mount_path(self.share)
         ret = self._driver._mount_device(self.share, 'fakedevice')
@@ -441,10 +656,12 @@ class NFSHelperTestCase(test.TestCase):
 
         export_string = '10.0.0.*:/opt/nfs'
         expected_exec = [
-            'exportfs',
+            'exportfs -v',
             'exportfs -o rw,no_subtree_check %s' % export_string,
         ]
         self.assertEqual(fake_utils.fake_execute_get_log(), expected_exec)
+        self.assertTrue(self._helper.exports.has_client('/opt/nfs',
+                                                        '10.0.0.*'))
 
     def test_allow_access_no_ip(self):
         self.assertRaises(exception.InvalidShareAccess,
@@ -463,8 +680,67 @@ class NFSHelperTestCase(test.TestCase):
     def test_deny_access(self):
         self._helper.deny_access('/opt/nfs', 'volume-00001', 'ip', '10.0.0.*')
         export_string = '10.0.0.*:/opt/nfs'
-        expected_exec = ['exportfs -u %s' % export_string]
+        expected_exec = ['exportfs -u %s' % export_string, 'exportfs -v']
+        self.assertEqual(fake_utils.fake_execute_get_log(), expected_exec)
+
+    def test_update_access(self):
+        def exec_runner(*ignore_args, **ignore_kwargs):
+            return '\n/opt/nfs\t\t10.0.0.3\n', ''
+
+        fake_utils.fake_execute_set_repliers([('exportfs', exec_runner)])
+        add_rules = [fake_access(access_to='10.0.0.2'),
+                     fake_access(access_to='10.0.0.3'),
+                     fake_access(access_to='10.0.0.4')]
+        delete_rules = [fake_access(access_to='10.0.0.5'),
+                        fake_access(access_to='10.0.0.6')]
+        self._helper.update_access('/opt/nfs', 'volume-00001', add_rules,
+                                   delete_rules)
+        expected_exec = [
+            'exportfs -v',
+            'exportfs -u 10.0.0.5:/opt/nfs 10.0.0.6:/opt/nfs',
+            'exportfs -o rw,no_subtree_check '
+            '10.0.0.2:/opt/nfs 10.0.0.4:/opt/nfs',
+        ]
         self.assertEqual(fake_utils.fake_execute_get_log(), expected_exec)
+        self.assertEqual(self._helper.exports.clients('/opt/nfs'),
+                         set(['10.0.0.2', '10.0.0.3', '10.0.0.4']))
+
+    def test_allow_access_uses_cached_exports(self):
+        self._helper.allow_access('/opt/nfs', 'volume-00001', 'ip',
+                                  '10.0.0.2')
+        self._helper.allow_access('/opt/nfs', 'volume-00001', 'ip',
+                                  '10.0.0.3')
+        self.assertRaises(exception.ShareAccessExists,
+                          self._helper.allow_access,
+                          '/opt/nfs', 'volume-00001', 'ip', '10.0.0.2')
+        self.assertEqual(fake_utils.fake_execute_get_log().count(
+            'exportfs -v'), 1)
+
+    def test_update_access_exports_file(self):
+        self.flags(nfs_exports_file='/etc/exports.d/manila.exports',
+                   share_export_root='/opt')
+
+        def exec_runner(*ignore_args, **ignore_kwargs):
+            return '/opt/nfs\t\t10.0.0.3(rw)\n/srv/other\t<world>(ro)\n', ''
+
+        fake_utils.fake_execute_set_repliers([('exportfs', exec_runner)])
+        execute = mock.Mock(side_effect=fake_utils.fake_execute)
+        self._helper._execute = execute
+        self._helper.update_access('/opt/nfs', 'volume-00001',
+                                   [fake_access(access_to='10.0.0.2')],
+                                   [fake_access(access_to='10.0.0.3')])
+        execute.assert_any_call(
+            'tee', '/etc/exports.d/manila.exports',
+            process_input='/opt/nfs 10.0.0.2(rw,no_subtree_check)\n',
+            run_as_root=True, check_exit_code=True)
+        self.assertEqual(fake_utils.fake_execute_get_log()[-1],
+                         'exportfs -ra')
+
+    def test_update_access_no_ip(self):
+        self.assertRaises(exception.InvalidShareAccess,
+                          self._helper.update_access, '/opt/nfs', 'share0',
+                          [fake_access(access_type='fake')], [])
+        self.assertEqual(fake_utils.fake_execute_get_log(), [])
 
 
 class CIFSNetConfHelperTestCase(test.TestCase):
@@ -654,6 +930,27 @@ class CIFSNetConfHelperTestCase(test.TestCase):
                           self._helper.deny_access, 'fakelocalpath',
                           share_name, 'ip', '10.0.0.1')
 
+    def test_update_access(self):
+        share_name = self.share['name']
+        self._helper._get_allow_hosts = mock.Mock(return_value=['127.0.0.1',
+                                                                '10.0.0.1'])
+        self._helper._set_allow_hosts = mock.Mock()
+        self._helper.update_access('fakelocalpath', share_name,
+                                   [fake_access(access_to='10.0.0.2'),
+                                    fake_access(access_to='10.0.0.3')],
+                                   [fake_access(access_to='10.0.0.1')])
+        self._helper._set_allow_hosts.assert_called_once_with(
+            ['127.0.0.1', '10.0.0.2', '10.0.0.3'], share_name)
+
+    def test_update_access_nothing_changed(self):
+        share_name = self.share['name']
+        self._helper._get_allow_hosts = mock.Mock(return_value=['127.0.0.1',
+                                                                '10.0.0.1'])
+        self._helper._set_allow_hosts = mock.Mock()
+        self._helper.update_access('fakelocalpath', share_name,
+                                   [fake_access(access_to='10.0.0.1')], [])
+        self.assertFalse(self._helper._set_allow_hosts.called)
+
     def test_get_allow_hosts(self):
         share_name = self.share['name']
         self._helper._execute = mock.Mock(return_value=(
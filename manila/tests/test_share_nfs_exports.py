@@ -0,0 +1,73 @@
+# Copyright 2014 Mirantis Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Unit tests for the NFS export table."""
+
+import mock
+
+from manila.share.drivers import nfs_exports
+from manila import test
+
+
+EXPORTFS_V = ('/opt/nfs/share1\t10.0.0.2(rw,wdelay,no_subtree_check)\n'
+              '/opt/nfs/share1\t10.0.0.3(rw,wdelay,no_subtree_check)\n'
+              '/opt/nfs/a_very_long_name_of_share_wrapped_by_exportfs\n'
+              '\t\t<world>(ro,wdelay)\n'
+              '/srv\t\t192.168.0.0/24(rw)\n')
+
+
+class ExportTableTestCase(test.TestCase):
+    """Tests ExportTable."""
+
+    def setUp(self):
+        super(ExportTableTestCase, self).setUp()
+        self.list_exports = mock.Mock(return_value=EXPORTFS_V)
+        self.table = nfs_exports.ExportTable(self.list_exports)
+
+    def test_parse_exports(self):
+        self.assertEqual(nfs_exports.parse_exports(EXPORTFS_V), {
+            '/opt/nfs/share1': set(['10.0.0.2', '10.0.0.3']),
+            '/opt/nfs/a_very_long_name_of_share_wrapped_by_exportfs':
+                set(['*']),
+            '/srv': set(['192.168.0.0/24']),
+        })
+
+    def test_loaded_once(self):
+        self.assertTrue(self.table.has_client('/opt/nfs/share1', '10.0.0.2'))
+        self.assertFalse(self.table.has_client('/opt/nfs/share1', '10.0.0.'))
+        self.assertEqual(self.table.clients('/none'), set())
+        self.list_exports.assert_called_once_with()
+
+    def test_update(self):
+        self.table.update('/opt/nfs/share1', add=['10.0.0.4'],
+                          remove=['10.0.0.2'])
+        self.table.update('/srv', remove=['192.168.0.0/24'])
+
+        self.assertEqual(self.table.clients('/opt/nfs/share1'),
+                         set(['10.0.0.3', '10.0.0.4']))
+        self.assertEqual(self.table.render('/srv'), '\n')
+
+    def test_invalidate(self):
+        self.table.clients('/srv')
+        self.table.invalidate()
+        self.table.clients('/srv')
+        self.assertEqual(self.list_exports.call_count, 2)
+
+    def test_render(self):
+        self.assertEqual(self.table.render('/opt/nfs/'),
+            '/opt/nfs/a_very_long_name_of_share_wrapped_by_exportfs '
+            '*(rw,no_subtree_check)\n'
+            '/opt/nfs/share1 10.0.0.2(rw,no_subtree_check) '
+            '10.0.0.3(rw,no_subtree_check)\n')
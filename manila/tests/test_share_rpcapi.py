@@ -121,6 +121,16 @@ class ShareRpcAPITestCase(test.TestCase):
                              filter_properties=None,
                              request_spec=None)
 
+    def test_create_shares(self):
+        self._test_share_api('create_shares',
+                             rpc_method='cast',
+                             host='fake_host1',
+                             shares=[{'share_id': self.fake_share['id'],
+                                      'request_spec': None,
+                                      'filter_properties': None,
+                                      'snapshot_id': None}],
+                             version='1.3')
+
     def test_delete_share(self):
         self._test_share_api('delete_share',
                              rpc_method='cast',
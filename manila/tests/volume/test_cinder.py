@@ -17,12 +17,16 @@
 import mock
 
 from cinderclient import exceptions as cinder_exception
+from oslo.config import cfg
 
+from manila.common import client_auth
 from manila import context
 from manila import exception
 from manila import test
 from manila.volume import cinder
 
+CONF = cfg.CONF
+
 
 class FakeCinderClient(object):
     class Volumes(object):
@@ -211,3 +215,33 @@ class CinderApiTestCase(test.TestCase):
         self.api.delete_snapshot(self.ctx, 'id1')
         self.cinderclient.volume_snapshots.delete.\
                 assert_called_once_with('id1')
+
+
+class CinderclientTestCase(test.TestCase):
+
+    def setUp(self):
+        super(CinderclientTestCase, self).setUp()
+        self.stubs.Set(client_auth, 'admin_clients',
+                       client_auth.AdminClientCache())
+
+    def test_cinderclient_admin_client_is_cached(self):
+        fake_client = mock.Mock(spec=['client'])
+        fake_client.client = mock.Mock(spec=['auth_token', 'authenticate',
+                                             'service_catalog'])
+        fake_client.client.auth_token = None
+
+        def authenticate():
+            fake_client.client.auth_token = 'fake_token'
+
+        fake_client.client.authenticate.side_effect = authenticate
+        ctx = context.get_admin_context()
+        with mock.patch.object(cinder.cinder_client, 'Client',
+                               mock.Mock(return_value=fake_client)):
+            self.assertIs(fake_client, cinder.cinderclient(ctx))
+            self.assertIs(fake_client, cinder.cinderclient(ctx))
+
+            cinder.cinder_client.Client.assert_called_once_with(
+                CONF.cinder_admin_username, CONF.cinder_admin_password,
+                CONF.cinder_admin_tenant_name, CONF.cinder_admin_auth_url)
+        fake_client.client.authenticate.assert_called_once_with()
+        self.assertEqual(1, client_auth.admin_clients.auth_calls)
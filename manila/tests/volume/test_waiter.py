@@ -0,0 +1,150 @@
+# Copyright 2014 Mirantis Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+import mock
+
+from manila import context
+from manila import exception
+from manila import test
+from manila.tests import fake_volume
+from manila.volume import waiter
+
+
+def _available(volume):
+    return volume['status'] == 'available'
+
+
+class VolumeStatusWaiterTestCase(test.TestCase):
+
+    def setUp(self):
+        super(VolumeStatusWaiterTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.volume_api = fake_volume.API()
+        self.waiter = waiter.VolumeStatusWaiter(self.volume_api,
+                                                interval=0, max_interval=0)
+
+    def test_wait_single_volume_uses_get(self):
+        volumes = [fake_volume.FakeVolume(status='available'),
+                   fake_volume.FakeVolume(status='creating')]
+        self.stubs.Set(self.volume_api, 'get',
+                       mock.Mock(side_effect=lambda ctx, vid: volumes.pop()))
+        self.stubs.Set(self.volume_api, 'get_all', mock.Mock())
+
+        result = self.waiter.wait(self.context, 'fake_vol_id', _available, 10)
+
+        self.assertEqual('available', result['status'])
+        self.assertEqual(2, self.volume_api.get.call_count)
+        self.assertFalse(self.volume_api.get_all.called)
+
+    def test_wait_many_volumes_batched(self):
+        ids = ['vol%d' % i for i in range(5)]
+        rounds = [[fake_volume.FakeVolume(id=vid, status='available')
+                   for vid in ids],
+                  [fake_volume.FakeVolume(id=vid, status='creating')
+                   for vid in ids]]
+        self.stubs.Set(self.volume_api, 'get_all',
+                       mock.Mock(side_effect=lambda ctx: rounds.pop()))
+        self.stubs.Set(self.volume_api, 'get', mock.Mock())
+
+        pool = eventlet.GreenPool()
+        results = list(pool.imap(
+            lambda vid: self.waiter.wait(self.context, vid, _available, 10),
+            ids))
+
+        self.assertEqual(ids, [volume['id'] for volume in results])
+        self.assertEqual(2, self.volume_api.get_all.call_count)
+        self.volume_api.get_all.assert_called_with(self.context)
+        self.assertFalse(self.volume_api.get.called)
+
+    def test_wait_lists_volumes_per_project(self):
+        contexts = dict((project_id, context.RequestContext(
+            'fake_user', project_id, is_admin=True))
+            for project_id in ('project1', 'project2', 'project3'))
+        waits = [('project1', 'vol1'), ('project1', 'vol2'),
+                 ('project2', 'vol3'), ('project2', 'vol4'),
+                 ('project3', 'vol5')]
+
+        def get_all(ctxt):
+            return [fake_volume.FakeVolume(id=vid, status='available')
+                    for project_id, vid in waits
+                    if project_id == ctxt.project_id]
+
+        self.stubs.Set(self.volume_api, 'get_all',
+                       mock.Mock(side_effect=get_all))
+        self.stubs.Set(self.volume_api, 'get', mock.Mock(
+            side_effect=lambda ctxt, vid: fake_volume.FakeVolume(
+                id=vid, status='available')))
+
+        pool = eventlet.GreenPool()
+        results = list(pool.imap(
+            lambda wait: self.waiter.wait(contexts[wait[0]], wait[1],
+                                          _available, 10),
+            waits))
+
+        self.assertEqual([vid for project_id, vid in waits],
+                         [volume['id'] for volume in results])
+        self.assertEqual(
+            ['project1', 'project2'],
+            sorted(call[0][0].project_id
+                   for call in self.volume_api.get_all.call_args_list))
+        self.volume_api.get.assert_called_once_with(contexts['project3'],
+                                                    'vol5')
+
+    def test_wait_volume_missing_from_list(self):
+        listed = fake_volume.FakeVolume(id='vol1', status='available')
+        self.stubs.Set(self.volume_api, 'get_all',
+                       mock.Mock(return_value=[listed]))
+        self.stubs.Set(self.volume_api, 'get', mock.Mock(
+            side_effect=exception.VolumeNotFound(volume_id='vol2')))
+
+        pool = eventlet.GreenPool()
+        deleted = pool.spawn(self.waiter.wait, self.context, 'vol2',
+                             lambda v: v is None, 10)
+        available = pool.spawn(self.waiter.wait, self.context, 'vol1',
+                               _available, 10)
+
+        self.assertIsNone(deleted.wait())
+        self.assertEqual(listed, available.wait())
+        self.volume_api.get.assert_called_once_with(self.context, 'vol2')
+
+    def test_wait_timeout(self):
+        self.stubs.Set(self.volume_api, 'get', mock.Mock(
+            return_value=fake_volume.FakeVolume(status='creating')))
+
+        self.assertRaises(exception.VolumeWaitTimeout, self.waiter.wait,
+                          self.context, 'fake_vol_id', _available, 0)
+
+    def test_wait_api_error(self):
+        self.stubs.Set(self.volume_api, 'get', mock.Mock(
+            side_effect=exception.ManilaException))
+
+        self.assertRaises(exception.ManilaException, self.waiter.wait,
+                          self.context, 'fake_vol_id', _available, 10)
+        self.assertIsNone(self.waiter._poller)
+
+    def test_poll_interval_backs_off(self):
+        self.waiter = waiter.VolumeStatusWaiter(self.volume_api,
+                                                interval=1, max_interval=4)
+        statuses = ['available', 'creating', 'creating', 'creating']
+        self.stubs.Set(self.volume_api, 'get', mock.Mock(
+            side_effect=lambda ctx, vid: fake_volume.FakeVolume(
+                status=statuses.pop())))
+        sleeps = []
+        self.stubs.Set(waiter.eventlet, 'sleep', sleeps.append)
+
+        self.waiter.wait(self.context, 'fake_vol_id', _available, 60)
+
+        self.assertEqual([1, 2, 4], sleeps)
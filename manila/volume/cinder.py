@@ -27,6 +27,7 @@ from cinderclient import service_catalog
 from cinderclient.v1 import client as cinder_client
 from oslo.config import cfg
 
+from manila.common import client_auth
 from manila.db import base
 from manila import exception
 from manila.openstack.common.gettextutils import _
@@ -75,12 +76,11 @@ LOG = logging.getLogger(__name__)
 
 def cinderclient(context):
     if context.is_admin and context.project_id is None:
-        c = cinder_client.Client(CONF.cinder_admin_username,
-                                 CONF.cinder_admin_password,
-                                 CONF.cinder_admin_tenant_name,
-                                 CONF.cinder_admin_auth_url)
-        c.authenticate()
-        return c
+        key = ('cinder', CONF.cinder_admin_username,
+               CONF.cinder_admin_password, CONF.cinder_admin_tenant_name,
+               CONF.cinder_admin_auth_url)
+        return client_auth.admin_clients.get(
+            key, lambda: cinder_client.Client(*key[1:]))
 
     compat_catalog = {
         'access': {'serviceCatalog': context.service_catalog or []}
@@ -0,0 +1,148 @@
+# Copyright 2014 Mirantis Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Waits for cinder volumes to change state, polling them in batches.
+"""
+
+import time
+
+import eventlet
+from eventlet import event
+
+from manila import exception
+from manila.openstack.common.gettextutils import _
+from manila.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+class _Wait(object):
+    """Single pending wait for a volume."""
+
+    def __init__(self, context, volume_id, predicate, timeout):
+        self.context = context
+        self.volume_id = volume_id
+        self.predicate = predicate
+        self.timeout = timeout
+        self.deadline = time.time() + timeout
+        self.event = event.Event()
+
+
+class VolumeStatusWaiter(object):
+    """Resolves waits for volume states with a single poller.
+
+    Callers block in wait() until a predicate holds for a volume. One
+    greenthread polls every volume being waited for. Volumes of a project
+    with several waits are fetched with a single get_all() listing of that
+    project per interval, any other volume with its own get(). The
+    interval doubles up to max_interval while nothing changes and drops
+    back to interval as soon as a wait is added or resolved.
+    """
+
+    def __init__(self, volume_api, interval=1, max_interval=8):
+        self.volume_api = volume_api
+        self.min_interval = interval
+        self.max_interval = max(interval, max_interval)
+        self._interval = interval
+        self._waits = []
+        self._poller = None
+
+    def wait(self, context, volume_id, predicate, timeout):
+        """Blocks until predicate(volume) is true and returns the volume.
+
+        The volume passed to the predicate and returned is None once the
+        volume has been deleted. Errors from the volume API are raised to
+        the caller, VolumeWaitTimeout if the predicate does not hold in
+        timeout seconds.
+        """
+        wait = _Wait(context, volume_id, predicate, timeout)
+        self._waits.append(wait)
+        self._interval = self.min_interval
+        if self._poller is None:
+            self._poller = eventlet.spawn(self._poll_loop)
+        return wait.event.wait()
+
+    def _poll_loop(self):
+        try:
+            while self._waits:
+                if self._poll():
+                    self._interval = self.min_interval
+                if self._waits:
+                    deadline = min(w.deadline for w in self._waits)
+                    eventlet.sleep(max(0, min(self._interval,
+                                              deadline - time.time())))
+                    self._interval = min(self._interval * 2,
+                                         self.max_interval)
+        finally:
+            self._poller = None
+
+    def _poll(self):
+        """Checks all pending waits once, returns True if any resolved."""
+        waits = list(self._waits)
+        volumes = self._list_volumes(waits)
+        resolved = False
+        for wait in waits:
+            try:
+                if wait.volume_id in volumes:
+                    volume = volumes[wait.volume_id]
+                else:
+                    volume = self._get_volume(wait)
+                    volumes[wait.volume_id] = volume
+                if wait.predicate(volume):
+                    self._resolve(wait, volume)
+                    resolved = True
+                elif time.time() >= wait.deadline:
+                    self._resolve(wait, exc=exception.VolumeWaitTimeout(
+                        volume_id=wait.volume_id, timeout=wait.timeout))
+                    resolved = True
+            except Exception as e:
+                self._resolve(wait, exc=e)
+                resolved = True
+        return resolved
+
+    def _list_volumes(self, waits):
+        """Lists volumes of projects with several waits, once per project."""
+        projects = {}
+        for wait in waits:
+            projects.setdefault(wait.context.project_id, []).append(wait)
+        volumes = {}
+        for project_waits in projects.values():
+            volume_ids = set(wait.volume_id for wait in project_waits)
+            if len(volume_ids) < 2:
+                continue
+            try:
+                listed = self.volume_api.get_all(project_waits[0].context)
+            except Exception:
+                LOG.exception(_('Failed to list volumes, polling them '
+                                'one by one.'))
+                continue
+            volumes.update((volume['id'], volume) for volume in listed
+                           if volume['id'] in volume_ids)
+        return volumes
+
+    def _get_volume(self, wait):
+        try:
+            return self.volume_api.get(wait.context, wait.volume_id)
+        except exception.VolumeNotFound:
+            return None
+
+    def _resolve(self, wait, volume=None, exc=None):
+        self._waits.remove(wait)
+        if exc is not None:
+            wait.event.send_exception(exc)
+        else:
+            wait.event.send(volume)
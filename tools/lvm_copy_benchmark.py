@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2014 Mirantis Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compares the LVM driver volume copy with a plain dd on loop devices.
+
+Creates an ext4 filesystem of the given size on a loop device, fills part
+of it with data and copies it to a second loop device, once with dd as the
+driver did before and once with LVMShareDriver._copy_volume(). Has to be
+run as root, e.g.:
+
+    sudo tools/with_venv.sh python tools/lvm_copy_benchmark.py --size-gb 4
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from manila.openstack.common import gettextutils
+gettextutils.install('manila')
+
+from manila.share import configuration
+from manila.share.drivers import lvm
+from manila import utils
+
+
+def _execute(*cmd, **kwargs):
+    # NOTE: the benchmark runs as root, so no root helper is needed.
+    kwargs.pop('run_as_root', None)
+    return utils.execute(*cmd, **kwargs)
+
+
+def _loop_device(path, size_gb):
+    _execute('truncate', '-s', '%dG' % size_gb, path)
+    out, err = _execute('losetup', '--find', '--show', path)
+    return out.strip()
+
+
+def _timed(func, *args, **kwargs):
+    start = time.time()
+    func(*args, **kwargs)
+    _execute('sync')
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-gb', type=int, default=4,
+                        help='Size of the loop devices.')
+    parser.add_argument('--used-percent', type=int, default=25,
+                        help='Percentage of the filesystem filled with data.')
+    parser.add_argument('--chunk-mb', type=int, default=64,
+                        help='share_lvm_copy_chunk_mb to copy with.')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    devices = []
+    try:
+        src = _loop_device(os.path.join(workdir, 'src'), args.size_gb)
+        devices.append(src)
+        dst = _loop_device(os.path.join(workdir, 'dst'), args.size_gb)
+        devices.append(dst)
+
+        mount_path = os.path.join(workdir, 'mnt')
+        os.mkdir(mount_path)
+        _execute('mkfs.ext4', '-q', src)
+        _execute('mount', src, mount_path)
+        try:
+            used_mb = args.size_gb * 1024 * args.used_percent / 100
+            _execute('dd', 'if=/dev/urandom',
+                     'of=%s' % os.path.join(mount_path, 'data'),
+                     'bs=1M', 'count=%d' % used_mb)
+        finally:
+            _execute('umount', mount_path)
+
+        dd_time = _timed(_execute, 'dd', 'if=%s' % src, 'of=%s' % dst,
+                         'bs=1M', 'count=%d' % (args.size_gb * 1024),
+                         'iflag=direct', 'oflag=direct')
+
+        lvm.CONF.set_override('share_lvm_copy_chunk_mb', args.chunk_mb)
+        driver = lvm.LVMShareDriver(
+            None, execute=_execute,
+            configuration=configuration.Configuration(None))
+        copy_time = _timed(driver._copy_volume, src, dst, args.size_gb)
+
+        print('dd:           %.1fs' % dd_time)
+        print('_copy_volume: %.1fs (%d%% of the filesystem used)' %
+              (copy_time, args.used_percent))
+    finally:
+        for device in devices:
+            _execute('losetup', '-d', device)
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()